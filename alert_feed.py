@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, or_
+from models import Alert, AlertRow
+from db_async import AsyncDB
+from fast_json import row_columns
+
+FEED_DEFAULT_LIMIT = 50
+FEED_MAX_LIMIT = 200
+ALERT_COLUMNS = row_columns(Alert, AlertRow)
+
+
+def encode_cursor(created_at: datetime, alert_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{alert_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, alert_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(alert_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class AlertFeedQuery:
+    """Tham số phân trang keyset (created_at, id) + bộ lọc, dùng chung cho các feed cảnh báo"""
+
+    def __init__(
+        self,
+        limit: int = Query(FEED_DEFAULT_LIMIT, ge=1, le=FEED_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        acknowledged: Optional[bool] = None,
+        severity: Optional[int] = None,
+        alert_type: Optional[str] = None,
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.acknowledged = acknowledged
+        self.severity = severity
+        self.alert_type = alert_type
+
+    def apply(self, stmt):
+        if self.acknowledged is not None:
+            stmt = stmt.where(Alert.acknowledged == self.acknowledged)
+        if self.severity is not None:
+            stmt = stmt.where(Alert.severity == self.severity)
+        if self.alert_type is not None:
+            stmt = stmt.where(Alert.alert_type == self.alert_type)
+        if self.cursor:
+            created_at, alert_id = decode_cursor(self.cursor)
+            stmt = stmt.where(or_(
+                Alert.created_at < created_at,
+                and_(Alert.created_at == created_at, Alert.id < alert_id),
+            ))
+        return stmt.order_by(Alert.created_at.desc(), Alert.id.desc()).limit(self.limit + 1)
+
+    async def page(self, db: AsyncDB, stmt) -> dict:
+        """stmt: select(Alert) đã join/lọc theo phạm vi người dùng; items là dict (AlertRow)"""
+        stmt = stmt.with_only_columns(*ALERT_COLUMNS, maintain_column_froms=True)
+        alerts = await db.dicts(self.apply(stmt))
+        has_more = len(alerts) > self.limit
+        alerts = alerts[:self.limit]
+        return {
+            "items": alerts,
+            "next_cursor": encode_cursor(alerts[-1]["created_at"], alerts[-1]["id"]) if has_more else None,
+        }
@@ -1,25 +1,41 @@
 import urllib.parse
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List
+import time
 import uuid
 import asyncio
 from fastapi import (
-    BackgroundTasks, Depends, FastAPI, HTTPException, status,
-    WebSocket, WebSocketDisconnect, UploadFile, File, Form
+    Depends, FastAPI, HTTPException, status,
+    WebSocket, WebSocketDisconnect, UploadFile, File, Form, Request
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
 import jwt
 from jwt import DecodeError as JWTError
-from sqlmodel import SQLModel, create_engine, Session, select
-from sqlalchemy import text
+from sqlmodel import create_engine, Session, select
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from cache import TTLCache, CounterCache
+from db_pool import TimedQueuePool, TimedAsyncQueuePool, attach_pool_stats
+from db_async import AsyncDB
+from query_counter import QueryCountMiddleware, attach_query_counter
+from sql_stats import attach_sql_stats
+from metrics import MetricsMiddleware, registry as metrics_registry
+import migrations
+import retention
+import rollups
+from audit_log import audit_writer
+from etags import resource_versions
+from fast_json import FastJSONResponse
+from ws_hub import alerts_hub, camera_hub, ALL_TOPIC, alert_topics, camera_topic, class_topic, parent_topic
+from passwords import hash_password, hash_password_async, verify_and_update_password_async, hash_pool
 from models import (
     RegisterIn, User, Child, ClassRoom, Camera, DangerZone, Alert,
-    BehaviorLog, FaceRecognitionData, AuditLog, Token, AuthIn, ResetPasswordIn,
-    TokenWithRole
+    BehaviorLog, FaceRecognitionData, Token, AuthIn, ResetPasswordIn,
+    TokenWithRole, BehaviorBatchIn, AlertIn
 )
 
 # CONFIGURATION
@@ -29,6 +45,12 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SAFENEST_SECRET", "dev-secret-changeme")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+PRINCIPAL_CACHE_SIZE = int(os.getenv("SAFENEST_PRINCIPAL_CACHE_SIZE", "2048"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("SAFENEST_PRINCIPAL_CACHE_TTL", "60"))
+# nếu đặt, /metrics yêu cầu header Authorization: Bearer <token>
+METRICS_TOKEN = os.getenv("SAFENEST_METRICS_TOKEN")
+DASHBOARD_CACHE_TTL = float(os.getenv("SAFENEST_DASHBOARD_CACHE_TTL", "15"))
+INGEST_MAX_BATCH = int(os.getenv("SAFENEST_INGEST_MAX_BATCH", "5000"))
 
 params = urllib.parse.quote_plus(
     "DRIVER={ODBC Driver 17 for SQL Server};"
@@ -37,9 +59,27 @@ params = urllib.parse.quote_plus(
     "Trusted_Connection=yes;"
     "charset=utf8;"
 )
-DB_URL = f"mssql+pyodbc:///?odbc_connect={params}"
+# VD: sqlite:///./safenest.db cho site chạy 1 máy
+DB_URL = os.getenv("SAFENEST_DB_URL", f"mssql+pyodbc:///?odbc_connect={params}")
+IS_SQLITE = DB_URL.startswith("sqlite")
+SQLITE_MMAP_SIZE = int(os.getenv("SAFENEST_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SAFENEST_SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SAFENEST_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Tắt nếu muốn chạy migration bằng tay: python migrations.py upgrade
+AUTO_MIGRATE = os.getenv("SAFENEST_AUTO_MIGRATE", "1") == "1"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+DB_POOL_SIZE = int(os.getenv("SAFENEST_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("SAFENEST_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("SAFENEST_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("SAFENEST_DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("SAFENEST_DB_POOL_PRE_PING", "1") == "1"
+DB_FAST_EXECUTEMANY = os.getenv("SAFENEST_DB_FAST_EXECUTEMANY", "1") == "1"
+# Handler async dùng driver async (aioodbc) thay vì threadpool
+DB_ASYNC = os.getenv("SAFENEST_DB_ASYNC", "0") == "1"
+ASYNC_DB_URL = os.getenv(
+    "SAFENEST_ASYNC_DB_URL",
+    DB_URL.replace("mssql+pyodbc", "mssql+aioodbc", 1).replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
 
 app = FastAPI(title="SafeNest AI - Demo API")
 app.add_middleware(
@@ -49,64 +89,140 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(QueryCountMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+engine_options = dict(
+    echo=False,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+if DB_URL.startswith("mssql+pyodbc"):
+    engine_options["fast_executemany"] = DB_FAST_EXECUTEMANY
+if IS_SQLITE:
+    engine_options["connect_args"] = {"check_same_thread": False}
+
+def sqlite_pragmas(engine):
+    """WAL + synchronous=NORMAL + mmap: đọc không chặn ghi, fsync ít hơn, đọc qua page cache"""
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def _set_pragmas(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
 
-engine = create_engine(DB_URL, echo=False)
+engine = create_engine(DB_URL, **engine_options)
+attach_pool_stats(engine)
+attach_query_counter(engine)
+attach_sql_stats(engine)
+resource_versions.bind(engine)
+if IS_SQLITE:
+    sqlite_pragmas(engine)
+
+async_engine = None
+async_session_factory = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    try:
+        async_engine = create_async_engine(ASYNC_DB_URL, **{**engine_options, "poolclass": TimedAsyncQueuePool})
+    except ModuleNotFoundError as e:
+        # driver async (aioodbc / aiosqlite) chỉ cần khi bật cờ này
+        raise RuntimeError(
+            f"SAFENEST_DB_ASYNC=1 needs the async driver '{e.name}' for {ASYNC_DB_URL.split(':', 1)[0]} "
+            f"(pip install {e.name}), or set SAFENEST_DB_ASYNC=0"
+        ) from e
+    attach_pool_stats(async_engine)
+    attach_query_counter(async_engine)
+    attach_sql_stats(async_engine)
+    if IS_SQLITE:
+        sqlite_pragmas(async_engine)
+    async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 # DATABASE INIT
 def init_db():
-    """Chỉ thêm dữ liệu mẫu nếu chưa có"""
-    with engine.connect() as conn:
+    """Tạo bảng gốc (mọi dialect), chạy migration nếu bật và chỉ thêm dữ liệu mẫu nếu chưa có"""
+    migrations.create_baseline(engine)
+    if AUTO_MIGRATE:
+        migrations.upgrade(engine)
+    else:
+        waiting = migrations.pending(engine)
+        if waiting:
+            # rollup / archive / ResourceVersion chưa có cho tới khi chạy migration
+            print(f"Schema migrations pending ({', '.join(f'{m.version}: {m.name}' for m in waiting)}); "
+                  "run: python migrations.py upgrade")
+    with Session(engine) as session:
         # User
-        result = conn.execute(text("SELECT COUNT(*) FROM [User]"))
-        if result.scalar() == 0:
-            admin_pw = hash_password('admin123')
-            parent_pw = hash_password('parent123')
-            teacher_pw = hash_password('teacher123')
-            conn.execute(text("""
-                INSERT INTO [User] (email, full_name, hashed_password, role, phone, address, emergency_contact, experience, relationship, education_level)
-                VALUES 
-                ('admin@example.com', N'Admin User', :admin_pw, 'admin', '+8400000000', N'1 Admin St, City', NULL, NULL, NULL, NULL),
-                ('parent@example.com', N'Nguyễn Văn A', :parent_pw, 'parent', '+84123456789', N'123 Lê Lợi, Q1, HCM', N'Nguyễn Thị B - 0909123456', NULL, N'Bố', NULL),
-                ('teacher@example.com', N'Teacher Admin', :teacher_pw, 'teacher', '+84987654321', N'456 Trần Hưng Đạo, Q1, HCM', NULL, N'5 năm kinh nghiệm', NULL, N'Tốt nghiệp Đại học Sư phạm')
-            """), {
-                "admin_pw": admin_pw,
-                "parent_pw": parent_pw,
-                "teacher_pw": teacher_pw
-            })
-            conn.commit()
+        if session.exec(select(func.count(User.id))).one() == 0:
+            session.add_all([
+                User(email='admin@example.com', full_name='Admin User', hashed_password=hash_password('admin123'),
+                     role='admin', phone='+8400000000', address='1 Admin St, City'),
+                User(email='parent@example.com', full_name='Nguyễn Văn A', hashed_password=hash_password('parent123'),
+                     role='parent', phone='+84123456789', address='123 Lê Lợi, Q1, HCM',
+                     emergency_contact='Nguyễn Thị B - 0909123456', relationship='Bố'),
+                User(email='teacher@example.com', full_name='Teacher Admin', hashed_password=hash_password('teacher123'),
+                     role='teacher', phone='+84987654321', address='456 Trần Hưng Đạo, Q1, HCM',
+                     experience='5 năm kinh nghiệm', education_level='Tốt nghiệp Đại học Sư phạm'),
+            ])
+            session.commit()
         # ClassRoom
-        result = conn.execute(text("SELECT COUNT(*) FROM ClassRoom"))
-        if result.scalar() == 0:
-            conn.execute(text("""
-                INSERT INTO ClassRoom (name, teacher_id)
-                SELECT 'Class A', id FROM [User] WHERE email = 'teacher@example.com'
-            """))
-            conn.commit()
+        if session.exec(select(func.count(ClassRoom.id))).one() == 0:
+            teacher = session.exec(select(User).where(User.email == 'teacher@example.com')).first()
+            session.add(ClassRoom(name='Class A', teacher_id=teacher.id if teacher else None))
+            session.commit()
         # Child
-        result = conn.execute(text("SELECT COUNT(*) FROM Child"))
-        if result.scalar() == 0:
-            conn.execute(text("""
-                INSERT INTO Child (name, date_of_birth, class_id, parent_id)
-                SELECT N'Alice', '2013-05-26', cr.id, u.id
-                FROM ClassRoom cr, [User] u
-                WHERE cr.name = 'Class A' AND u.email = 'parent@example.com'
-            """))
-            conn.commit()
+        if session.exec(select(func.count(Child.id))).one() == 0:
+            classroom = session.exec(select(ClassRoom).where(ClassRoom.name == 'Class A')).first()
+            parent = session.exec(select(User).where(User.email == 'parent@example.com')).first()
+            if classroom and parent:
+                session.add(Child(name='Alice', date_of_birth=datetime(2013, 5, 26), class_id=classroom.id, parent_id=parent.id))
+                session.commit()
+
+retention_stop = None
+rollup_stop = None
 
 @app.on_event("startup")
 def on_startup():
+    global retention_stop, rollup_stop
     init_db()
+    retention_stop = retention.start_scheduler(engine)
+    rollup_stop = rollups.start_scheduler(engine)
+    audit_writer.start(engine)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for stop in (retention_stop, rollup_stop):
+        if stop is not None:
+            stop.set()
+    # ghi nốt audit log đang chờ trước khi đóng engine
+    await asyncio.to_thread(audit_writer.stop)
+    for hub in (alerts_hub, camera_hub):
+        await hub.close()
+    hash_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # UTILITIES
 def get_session():
     with Session(engine) as session:
         yield session
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def get_db():
+    """Session cho handler async: AsyncSession nếu bật SAFENEST_DB_ASYNC, không thì Session sync qua threadpool"""
+    db = AsyncDB(async_session_factory() if async_session_factory else Session(engine))
+    try:
+        yield db
+    finally:
+        await db.close()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -114,84 +230,147 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def audit(user_id: Optional[int], action: str, details: Optional[str] = None):
-    try:
-        with Session(engine) as s:
-            s.add(AuditLog(user_id=user_id, action=action, details=details))
-            s.commit()
-    except Exception as e:
-        print("Audit log failed:", e)
+def audit(user_id: Optional[int], action: str, details: Optional[str] = None):
+    """Không chặn: đưa vào hàng đợi của audit_writer, ghi theo lô ở thread nền"""
+    audit_writer.log(user_id, action, details)
 
 # AUTHENTICATION DEPENDENCIES
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_session),
-) -> User:
-    token = credentials.credentials
+# user_id -> User (detached); token -> user_id (chữ ký đã kiểm tra, hết hạn theo exp)
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+token_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# số liệu dashboard admin; các endpoint ghi cộng/trừ tại chỗ (adjust), TTL ngắn bắt kịp phần còn lại
+dashboard_counters = CounterCache(ttl=DASHBOARD_CACHE_TTL)
+
+def active_cameras_in_class(session: Session, class_id: Optional[int]) -> int:
+    if class_id is None:
+        return 0
+    return session.exec(
+        select(func.count(Camera.id)).where(Camera.class_id == class_id, Camera.active == True)
+    ).one()
+
+def _adjust_active_camera(session: Session, class_id: Optional[int], delta: int):
+    # lớp vừa có camera active đầu tiên / vừa mất camera active cuối cùng
+    remaining = active_cameras_in_class(session, class_id)
+    class_changed = class_id is not None and remaining == (1 if delta > 0 else 0)
+    dashboard_counters.adjust(active_cameras=delta, active_classes=delta if class_changed else 0)
+
+def adjust_camera_counters(session: Session, before: Optional[tuple], after: Optional[tuple]):
+    """Gọi sau commit khi camera được thêm / sửa / xóa; before, after = (class_id, active), None nếu
+    camera chưa có / đã xóa. Camera active đổi lớp = bớt ở lớp cũ rồi thêm ở lớp mới."""
+    if before == after:
+        return
+    if before is not None and before[1]:
+        _adjust_active_camera(session, before[0], -1)
+    if after is not None and after[1]:
+        _adjust_active_camera(session, after[0], +1)
+
+def invalidate_principal(user_id: Optional[int]):
+    if user_id is not None:
+        principal_cache.pop(user_id)
+
+def decode_user_id(token: str) -> int:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
+        user_id = payload.get("user_id")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    exp = payload.get("exp")
+    token_cache.set(token, user_id, ttl=exp - time.time() if exp else None)
+    return user_id
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: Session = Depends(get_session),
+) -> User:
+    user_id = decode_user_id(credentials.credentials)
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
 
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    session.expunge(user)
+    principal_cache.set(user_id, user)
     return user
 
-def require_role(required_role: str):
+def require_role(*required_roles: str):
     def role_checker(user: User = Depends(get_current_user)) -> User:
-        if user.role != required_role:
+        if user.role not in required_roles:
             raise HTTPException(status_code=403, detail="Permission denied")
         return user
     return role_checker
 
 # AUTH ENDPOINTS
+# async: bcrypt chạy trên hash pool, handler chờ kết quả mà không giữ thread của threadpool chung
 @app.post('/api/auth/register')
-def register(payload: RegisterIn, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
-    existing = session.exec(select(User).where(User.email == payload.email)).first()
-    if existing:
+async def register(payload: RegisterIn, db: AsyncDB = Depends(get_db)):
+    # email đã có -> báo ngay, không tốn một lượt bcrypt
+    if await db.scalar(select(User.id).where(User.email == payload.email)) is not None:
         raise HTTPException(status_code=400, detail="Email already registered")
+    hashed_password = await hash_password_async(payload.password)
+    user_id = await db.run_sync(_register_user, payload, hashed_password)
+    dashboard_counters.adjust(users=1)
+    audit(user_id, "register", f"role={payload.role}")
+    return {"msg": "registered", "user_id": user_id}
 
-    user = User(
-        email=payload.email,
-        full_name=payload.fullName,
-        hashed_password=hash_password(payload.password),
-        role=payload.role
-    )
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    background_tasks.add_task(audit, user.id, "register", f"role={user.role}")
-    return {"msg": "registered", "user_id": user.id}
+def _register_user(session: Session, payload: RegisterIn, hashed_password: str) -> int:
+    try:
+        user_id = session.execute(
+            insert(User).values(
+                email=payload.email, full_name=payload.fullName,
+                hashed_password=hashed_password, role=payload.role,
+            ).returning(User.id)
+        ).scalar_one()
+        session.commit()
+    except IntegrityError:
+        # đăng ký trùng email chen vào giữa lúc hash
+        session.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return user_id
 
 @app.post('/api/auth/login', response_model=TokenWithRole)
-def login(payload: AuthIn, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == payload.email)).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: AuthIn, db: AsyncDB = Depends(get_db)):
+    user = await db.one_or_none(select(User.id, User.role, User.hashed_password).where(User.email == payload.email))
+    if not user:
+        raise HTTPException(status_code=401, detail='Invalid email or password')
+    valid, new_hash = await verify_and_update_password_async(payload.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail='Invalid email or password')
-    
+    if new_hash:
+        # cost factor đã đổi -> lưu lại hash mới
+        await db.run_sync(_save_password_hash, user.id, new_hash)
+        invalidate_principal(user.id)
+
     token = create_access_token({"user_id": user.id, "role": user.role})
-    background_tasks.add_task(audit, user.id, "login")
+    audit(user.id, "login")
     return {
         "access_token": token,
         "token_type": "bearer",
         "role": user.role
     }
 
+def _save_password_hash(session: Session, user_id: int, hashed_password: str):
+    session.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+    session.commit()
+
 @app.post('/api/auth/forgot-password')
-def forgot_password(background_tasks: BackgroundTasks, email: str = Form(...), session: Session = Depends(get_session)):
+def forgot_password(email: str = Form(...), session: Session = Depends(get_session)):
     user = session.exec(select(User).where(User.email == email)).first()
     if not user:
         return {"msg": "If the email exists, a reset link was sent"}
     reset_token = create_access_token({"user_id": user.id, "pw": True}, expires_delta=timedelta(minutes=15))
-    background_tasks.add_task(audit, user.id, "forgot_password")
+    audit(user.id, "forgot_password")
     return {"reset_token": reset_token}
 
 @app.put('/api/auth/reset-password')
-def reset_password(payload: ResetPasswordIn, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+async def reset_password(payload: ResetPasswordIn, db: AsyncDB = Depends(get_db)):
     try:
         payload_decoded = jwt.decode(payload.token, SECRET_KEY, algorithms=[ALGORITHM])
     except Exception:
@@ -199,57 +378,87 @@ def reset_password(payload: ResetPasswordIn, background_tasks: BackgroundTasks,
     if not payload_decoded.get('pw'):
         raise HTTPException(status_code=400, detail='Invalid reset token')
     user_id = payload_decoded.get('user_id')
-    user = session.get(User, user_id)
-    if not user:
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
         raise HTTPException(status_code=404, detail='User not found')
-    user.hashed_password = hash_password(payload.newPassword)
-    session.add(user)
-    session.commit()
-    background_tasks.add_task(audit, user.id, "reset_password")
+    await db.run_sync(_save_password_hash, user_id, await hash_password_async(payload.newPassword))
+    invalidate_principal(user_id)
+    audit(user_id, "reset_password")
     return {"msg": "Password updated"}
 
 # WEBSOCKETS
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-    
-    async def broadcast(self, message: str):
-        for conn in list(self.active_connections):
-            try:
-                await conn.send_text(message)
-            except Exception:
-                pass
-
-camera_manager = ConnectionManager()
-alerts_manager = ConnectionManager()
+# alerts: ?token=<JWT>; admin nhận mọi cảnh báo, phụ huynh theo con, giáo viên theo lớp (ws_hub.py)
+metrics_registry.gauge(
+    "websocket_connections", "Open websocket connections by channel.",
+    lambda: {f'channel="{hub.name}"': len(hub.subscribers) for hub in (alerts_hub, camera_hub)},
+)
+metrics_registry.gauge(
+    "websocket_queued_messages", "Messages waiting in websocket send queues by channel.",
+    lambda: {f'channel="{hub.name}"': hub.stats()["queued"] for hub in (alerts_hub, camera_hub)},
+)
+for _name, _key, _help in (
+    ("websocket_messages_total", "delivered", "Websocket messages delivered by channel."),
+    ("websocket_evictions_total", "evicted", "Slow websocket subscribers disconnected by channel."),
+    ("websocket_send_errors_total", "send_errors", "Failed websocket sends (dead sockets) by channel."),
+):
+    metrics_registry.counter(
+        _name, _help, lambda key=_key: {f'channel="{hub.name}"': hub.stats()[key] for hub in (alerts_hub, camera_hub)},
+    )
+metrics_registry.gauge(
+    "audit_log_queue_depth", "Audit events waiting to be written.",
+    lambda: {"": audit_writer.stats()["queue_depth"]},
+)
+metrics_registry.counter(
+    "audit_log_events_total", "Audit events written, dropped, rejected or abandoned.",
+    lambda: {f'state="{k}"': v for k, v in audit_writer.stats().items() if k in ("written", "dropped", "rejected", "abandoned")},
+)
+
+def _ws_topics(token: Optional[str]) -> Optional[list]:
+    """Topic một kết nối được nhận theo vai trò; None nếu token không hợp lệ"""
+    if not token:
+        return None
+    try:
+        user_id = decode_user_id(token)
+    except HTTPException:
+        return None
+    with Session(engine) as session:
+        user = principal_cache.get(user_id) or session.get(User, user_id)
+        if user is None:
+            return None
+        if user.role == "admin":
+            return [ALL_TOPIC]
+        if user.role == "parent":
+            return [parent_topic(user.id)]
+        if user.role == "teacher":
+            class_ids = session.exec(select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)).all()
+            return [class_topic(class_id) for class_id in class_ids]
+    return None
 
 @app.websocket('/api/streaming/alerts')
-async def ws_alerts(ws: WebSocket):
-    await alerts_manager.connect(ws)
+async def ws_alerts(ws: WebSocket, token: Optional[str] = None):
+    topics = await asyncio.to_thread(_ws_topics, token)
+    if topics is None:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    sub = await alerts_hub.connect(ws, topics)
     try:
         while True:
             data = await ws.receive_text()
-            await ws.send_text(f"pong: {data}")
+            alerts_hub.send(sub, f"pong: {data}")
     except WebSocketDisconnect:
-        alerts_manager.disconnect(ws)
+        pass
+    finally:
+        alerts_hub.disconnect(sub)
 
 @app.websocket('/api/streaming/camera/{camera_id}')
 async def ws_camera(ws: WebSocket, camera_id: int):
-    await camera_manager.connect(ws)
+    sub = await camera_hub.connect(ws, [camera_topic(camera_id)])
     try:
-        while True:
+        # writer gỡ subscriber khi socket đóng hoặc client đọc không kịp
+        while not sub.closed:
             await asyncio.sleep(1)
-            await ws.send_text(f"camera:{camera_id} ts={datetime.utcnow().isoformat()}")
-    except WebSocketDisconnect:
-        camera_manager.disconnect(ws)
+            camera_hub.send(sub, f"camera:{camera_id} ts={datetime.utcnow().isoformat()}")
+    finally:
+        camera_hub.disconnect(sub)
 
 # AI ENDPOINTS
 @app.post('/api/ai/face-recognition')
@@ -269,7 +478,7 @@ def ai_face_recognition(
     session.add(fr)
     session.commit()
     session.refresh(fr)
-    asyncio.create_task(audit(user.id if user else None, "upload_face", details=f"{fr.id}"))
+    audit(user.id if user else None, "upload_face", details=f"{fr.id}")
     return {"id": fr.id, "path": fpath}
 
 @app.post('/api/ai/analyze-behavior')
@@ -280,11 +489,96 @@ def ai_analyze_behavior(video_file: UploadFile = File(...), user: User = Depends
 def ai_danger_detection(stream_id: Optional[int] = Form(None), user: User = Depends(get_current_user)):
     return {"danger": False, "note": "not implemented"}
 
+# Detection node gửi BehaviorLog theo lô (tài khoản role "detector" hoặc admin)
+@app.post('/api/ai/behavior-logs')
+async def ai_ingest_behavior_logs(
+    payload: BehaviorBatchIn,
+    user: User = Depends(require_role("detector", "admin")),
+    db: AsyncDB = Depends(get_db)
+):
+    if len(payload.records) > INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {INGEST_MAX_BATCH} records)")
+    accepted, rejected = await db.run_sync(_ingest_behavior_logs, payload)
+    return {"batch_id": payload.batch_id, "accepted": accepted, "rejected": rejected}
+
+def _ingest_behavior_logs(session: Session, payload: BehaviorBatchIn):
+    records = payload.records
+    child_ids = {r.child_id for r in records}
+    camera_ids = {r.camera_id for r in records if r.camera_id is not None}
+    known_children = set(session.exec(select(Child.id).where(Child.id.in_(child_ids))).all()) if child_ids else set()
+    known_cameras = set(session.exec(select(Camera.id).where(Camera.id.in_(camera_ids))).all()) if camera_ids else set()
+
+    now = datetime.utcnow()
+    rows, rejected = [], []
+    for i, r in enumerate(records):
+        if r.child_id not in known_children:
+            rejected.append({"index": i, "error": f"Unknown child_id {r.child_id}"})
+        elif r.camera_id is not None and r.camera_id not in known_cameras:
+            rejected.append({"index": i, "error": f"Unknown camera_id {r.camera_id}"})
+        else:
+            timestamp = r.timestamp or now
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            rows.append({
+                "child_id": r.child_id,
+                "camera_id": r.camera_id,
+                "behavior_type": r.behavior_type,
+                "confidence": r.confidence,
+                "timestamp": timestamp,
+            })
+    if rows:
+        rollups.write_guard(session)
+        session.execute(insert(BehaviorLog.__table__), rows)
+        rollups.bump_behavior(session, rows)
+        session.commit()
+    return len(rows), rejected
+
+# Detection node báo cảnh báo: ghi Alert rồi đẩy ngay tới phụ huynh / lớp / camera / admin qua websocket
+@app.post('/api/ai/alerts', status_code=201)
+async def ai_create_alert(
+    payload: AlertIn,
+    user: User = Depends(require_role("detector", "admin")),
+    db: AsyncDB = Depends(get_db)
+):
+    alert, topics = await db.run_sync(_create_alert, payload)
+    alerts_hub.publish(topics, {"event": "alert", "alert": alert})
+    if alert["created_at"] >= datetime.utcnow() - timedelta(hours=24):
+        dashboard_counters.adjust(alerts=1, alerts_today=1)
+    else:
+        dashboard_counters.adjust(alerts=1)
+    return FastJSONResponse(alert, status_code=201)
+
+def _create_alert(session: Session, payload: AlertIn):
+    child = session.exec(select(Child.parent_id, Child.class_id).where(Child.id == payload.child_id)).first()
+    if child is None:
+        raise HTTPException(status_code=404, detail="Child not found")
+    created_at = payload.created_at or datetime.utcnow()
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    values = payload.model_dump(exclude={"created_at"})
+    try:
+        rollups.write_guard(session)
+        row = session.execute(
+            insert(Alert).values(**values, created_at=created_at).returning(*Alert.__table__.c)
+        ).one()
+        rollups.bump_alerts(session, [row._asdict()])
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=400, detail="Unknown camera_id or danger_zone_id")
+    return row._asdict(), alert_topics(child.parent_id, child.class_id, payload.camera_id)
+
 # MISC
 @app.get('/')
 def index():
     return {"ok": True, "time": datetime.utcnow().isoformat()}
 
+@app.get('/metrics', include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ROUTERS
 from api_parent import router as parent_router
 from api_admin import router as admin_router
@@ -31,7 +31,7 @@ params = urllib.parse.quote_plus(
     "DATABASE=api_db;"
     "Trusted_Connection=yes;"
 )
-DB_URL = f"mssql+pyodbc:///?odbc_connect={params}"
+DB_URL = os.getenv("SAFENEST_DB_URL", f"mssql+pyodbc:///?odbc_connect={params}")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
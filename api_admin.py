@@ -1,75 +1,203 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Form, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from sqlalchemy import func, text
+from sqlalchemy import case, func, insert, text, update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime as dt, timedelta
-from typing import Optional
-from models import User, ClassRoom, Camera, DangerZone, Alert, Child
-from apiSQL import get_session, require_role, audit, hash_password
+from typing import Optional, List
+from models import (
+    User, ClassRoom, Camera, DangerZone, Alert, Child,
+    UserRow, AdminChildPage, AdminCameraRow, CameraRow, ClassRow, DangerZoneRow, AlertPage
+)
+from apiSQL import get_session, get_db, require_role, audit, invalidate_principal, principal_cache, token_cache, dashboard_counters, engine, async_engine, active_cameras_in_class, adjust_camera_counters
+from db_pool import pool_status
+from db_async import AsyncDB
+import migrations
+import retention
+import rollups
+import exports
+import reports
+from reports import ReportQuery, AlertsByClassQuery, ALERTS_BY_CLASS_RESOURCES, report_cache, alerts_by_class_cache
+from exports import ExportQuery
+from alert_feed import AlertFeedQuery
+from child_list import ChildListQuery
+from passwords import hash_pool, hash_password_async
+from audit_log import audit_writer
+from ws_hub import alerts_hub, camera_hub
+from query_counter import query_budget, route_stats
+from sql_stats import sql_stats
+from etags import conditional_get, etag_headers, resource_versions
+from fast_json import FastJSONResponse, row_columns, parse_fields, doc
+from bulk_import import parse_roster, import_roster
+import csv
 import asyncio
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 # ADMIN DASHBOARD
 @router.get('/dashboard')
-def admin_dashboard(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    total_children = session.exec(select(func.count(Child.id))).one()
-    total_class = session.exec(select(func.count(ClassRoom.id))).one()
-    active_classes = session.exec(
-        select(func.count(func.distinct(ClassRoom.id)))
-        .join(Camera, ClassRoom.id == Camera.class_id)
-        .where(Camera.active == True)
-    ).one()
-    active_cameras = session.exec(select(func.count(Camera.id)).where(Camera.active == True)).one()
+@query_budget(2)
+async def admin_dashboard(user: User = Depends(require_role('admin')), db: AsyncDB = Depends(get_db)):
+    counters = dashboard_counters.get()
+    if counters is None:
+        generation = dashboard_counters.begin_load()
+        counters = await db.run_sync(_admin_dashboard)
+        dashboard_counters.set(counters, generation)
+    return counters
+
+def _admin_dashboard(session: Session):
+    # mọi COUNT gộp thành subquery vô hướng của một câu SELECT -> 1 round trip
     today_start = dt.utcnow() - timedelta(hours=24)
-    alerts_today = session.exec(select(func.count(Alert.id)).where(Alert.created_at >= today_start)).one()
-    total_users = session.exec(select(func.count(User.id))).one()
-    total_alerts = session.exec(select(func.count(Alert.id))).one()
-
+    row = session.exec(select(
+        select(func.count(User.id)).scalar_subquery().label("users"),
+        select(func.count(Child.id)).scalar_subquery().label("children"),
+        select(func.count(Alert.id)).scalar_subquery().label("alerts"),
+        select(func.count(ClassRoom.id)).scalar_subquery().label("total_classes"),
+        select(func.count(func.distinct(Camera.class_id)))
+        .where(Camera.active == True, Camera.class_id.is_not(None))
+        .scalar_subquery().label("active_classes"),
+        select(func.count(Camera.id)).where(Camera.active == True).scalar_subquery().label("active_cameras"),
+        select(func.count(Alert.id)).where(Alert.created_at >= today_start).scalar_subquery().label("alerts_today"),
+    )).one()
+    return dict(row._mapping)
+
+# SYSTEM
+@router.get('/system/principal-cache')
+def admin_principal_cache_stats(user: User = Depends(require_role('admin'))):
     return {
-        "users": total_users,
-        "children": total_children,
-        "alerts": total_alerts,
-        "total_classes": total_class,
-        "active_classes": active_classes,
-        "active_cameras": active_cameras,
-        "alerts_today": alerts_today        
+        "principals": principal_cache.stats(), "tokens": token_cache.stats(),
+        "dashboard": dashboard_counters.stats(), "reports": report_cache.stats(),
+        "alerts_by_class": alerts_by_class_cache.stats(),
     }
 
+@router.get('/system/db-pool')
+def admin_db_pool_stats(user: User = Depends(require_role('admin'))):
+    status = pool_status(engine)
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine)
+    return status
+
+@router.get('/system/audit-writer')
+def admin_audit_writer_stats(user: User = Depends(require_role('admin'))):
+    return audit_writer.stats()
+
+@router.get('/system/websockets')
+def admin_websocket_stats(user: User = Depends(require_role('admin'))):
+    return {hub.name: hub.stats() for hub in (alerts_hub, camera_hub)}
+
+@router.get('/system/schema')
+def admin_schema_status(user: User = Depends(require_role('admin'))):
+    return {**migrations.status(engine), "query_plans": migrations.explain(engine)}
+
+@router.get('/system/retention')
+def admin_retention_status(user: User = Depends(require_role('admin'))):
+    return retention.status(engine)
+
+@router.post('/system/retention/run')
+def admin_retention_run(user: User = Depends(require_role('admin'))):
+    moved = retention.run(engine)
+    if moved.get("alerts"):
+        dashboard_counters.adjust(alerts=-moved["alerts"])
+    audit(user.id, "retention_run", str(moved))
+    return moved
+
+@router.get('/system/rollups')
+def admin_rollup_status(user: User = Depends(require_role('admin'))):
+    return rollups.status(engine)
+
+@router.post('/system/rollups/refresh')
+def admin_rollup_refresh(
+    hours: int = Query(rollups.ROLLUP_LOOKBACK_HOURS, ge=1, le=24 * 7),
+    user: User = Depends(require_role('admin'))
+):
+    return rollups.refresh(engine, hours)
+
+@router.get('/archive/{kind}')
+def admin_get_archive(
+    kind: str,
+    since: Optional[dt] = None,
+    until: Optional[dt] = None,
+    child_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    user: User = Depends(require_role('admin')),
+    session: Session = Depends(get_session)
+):
+    """Đọc dữ liệu đã archive (chậm hơn, không nằm trong bảng nóng), phân trang theo id"""
+    policy = retention.POLICY_BY_NAME.get(kind)
+    if not policy:
+        raise HTTPException(status_code=404, detail=f"Unknown archive '{kind}'")
+    model = policy.archive
+    ts = getattr(model, policy.time_column)
+    stmt = select(model)
+    if since is not None:
+        stmt = stmt.where(ts >= since)
+    if until is not None:
+        stmt = stmt.where(ts < until)
+    if child_id is not None:
+        if not hasattr(model, "child_id"):
+            raise HTTPException(status_code=400, detail="child_id filter not supported for this archive")
+        stmt = stmt.where(model.child_id == child_id)
+    if after_id is not None:
+        stmt = stmt.where(model.id > after_id)
+    rows = session.exec(stmt.order_by(model.id).limit(limit)).all()
+    return {"items": rows, "next_after_id": rows[-1].id if len(rows) == limit else None}
+
+@router.get('/system/query-counts')
+def admin_query_counts(user: User = Depends(require_role('admin'))):
+    return route_stats.snapshot()
+
+@router.get('/system/sql-stats')
+def admin_sql_stats(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: str = Query("total_ms", pattern="^(total_ms|max_ms|avg_ms|calls|rows)$"),
+    user: User = Depends(require_role('admin'))
+):
+    """Top-N câu SQL (đã chuẩn hóa) từ lúc khởi động, kèm các câu chậm gần nhất"""
+    return sql_stats.top(limit, order_by)
+
+@router.get('/system/hash-pool')
+def admin_hash_pool_stats(user: User = Depends(require_role('admin'))):
+    return hash_pool.stats()
+
 # CHILDREN CRUD
-@router.get('/children')
-def admin_get_children(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    children_with_info = session.exec(
-        select(Child, User, ClassRoom)
-        .join(User, Child.parent_id == User.id, isouter=True)
-        .join(ClassRoom, Child.class_id == ClassRoom.id, isouter=True)
-    ).all()
-    
-    result = []
-    for child, parent, classroom in children_with_info:
-        age = None
-        if child.date_of_birth:
-            today = dt.utcnow()
-            dob = child.date_of_birth
-            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-        
-        result.append({
-            "id": child.id,
-            "name": child.name,
-            "date_of_birth": child.date_of_birth.strftime("%d/%m/%Y") if child.date_of_birth else None,
-            "age": age,
-            "class_id": child.class_id,
-            "class_name": classroom.name if classroom else None,
-            "parent_id": child.parent_id,
-            "parent_name": parent.full_name if parent else None,
-            "parent_email": parent.email if parent else None,
-            "parent_phone": parent.phone if parent else None,
-            "parent_address": parent.address if parent else None,
-            "parent_emergency_contact": parent.emergency_contact if parent else None,
-        })
-    return result
+@router.get('/children', responses=doc(AdminChildPage))
+@query_budget(4)
+async def admin_get_children(
+    query: ChildListQuery = Depends(),
+    user: User = Depends(require_role('admin')),
+    db: AsyncDB = Depends(get_db),
+):
+    return FastJSONResponse(await query.page(db))
+
+# Ghi bằng INSERT/UPDATE ... RETURNING (OUTPUT INSERTED.* trên SQL Server) trên session của request:
+# lấy lại dòng vừa ghi ngay trong câu ghi, không SELECT lại và không mượn thêm connection
+CHILD_COLUMNS = tuple(Child.__table__.c)
+USER_COLUMNS = row_columns(User, UserRow)
+
+def _child_refs(session: Session, parent_email: Optional[str], class_name: Optional[str]) -> dict:
+    """parent_id / class_id theo email phụ huynh / tên lớp, gộp trong một câu SELECT"""
+    lookups = {}
+    if parent_email is not None:
+        lookups["parent_id"] = select(User.id).where(User.email == parent_email, User.role == "parent").scalar_subquery()
+    if class_name is not None:
+        lookups["class_id"] = select(func.min(ClassRoom.id)).where(ClassRoom.name == class_name).scalar_subquery()
+    if not lookups:
+        return {}
+    refs = session.execute(select(*(q.label(k) for k, q in lookups.items()))).one()._asdict()
+    if parent_email is not None and refs["parent_id"] is None:
+        raise HTTPException(status_code=400, detail=f"Parent with email '{parent_email}' not found")
+    if class_name is not None and refs["class_id"] is None:
+        raise HTTPException(status_code=404, detail=f"Class '{class_name}' not found")
+    return refs
+
+def _parse_dob(date_of_birth: str) -> dt:
+    try:
+        return dt.strptime(date_of_birth, "%d/%m/%Y")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use DD/MM/YYYY")
 
 @router.post('/children')
 def admin_create_child(
-    background_tasks: BackgroundTasks,
     name: str = Form(...),
     date_of_birth: str = Form(...),
     class_name: str = Form(...),
@@ -77,41 +205,21 @@ def admin_create_child(
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)
 ):
-    parent = session.exec(select(User).where(User.email == parent_email, User.role == "parent")).first()
-    if not parent:
-        raise HTTPException(status_code=400, detail=f"Parent with email '{parent_email}' not found")
-    parent_id = parent.id
-
-    classroom = session.exec(select(ClassRoom).where(ClassRoom.name == class_name)).first()
-    if not classroom:
-        raise HTTPException(status_code=404, detail=f"Class '{class_name}' not found")
-    class_id = classroom.id
-
-    try:
-        dob = dt.strptime(date_of_birth, "%d/%m/%Y")
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format. Use DD/MM/YYYY")
-
-    with session.bind.connect() as conn:
-        conn.execute(text("""
-            INSERT INTO Child (name, date_of_birth, class_id, parent_id)
-            VALUES (:name, :date_of_birth, :class_id, :parent_id)
-        """), {
-            "name": name,
-            "date_of_birth": dob,
-            "class_id": class_id,
-            "parent_id": parent_id
-        })
-        conn.commit()
+    dob = _parse_dob(date_of_birth)
+    refs = _child_refs(session, parent_email, class_name)
+    child = session.execute(
+        insert(Child).values(name=name, date_of_birth=dob, **refs).returning(*CHILD_COLUMNS)
+    ).one()._asdict()
+    resource_versions.bump(session, "children")
+    session.commit()
 
-    child = session.exec(select(Child).where(Child.name == name, Child.parent_id == parent_id)).first()
-    background_tasks.add_task(audit, user.id, "create_child", f"child_id={child.id}")    
+    dashboard_counters.adjust(children=1)
+    audit(user.id, "create_child", f"child_id={child['id']}")
     return child
 
 @router.put('/children/{child_id}')
 def admin_update_child(
     child_id: int,
-    background_tasks: BackgroundTasks,
     name: Optional[str] = Form(None),
     date_of_birth: Optional[str] = Form(None),
     class_name: Optional[str] = Form(None),
@@ -119,57 +227,25 @@ def admin_update_child(
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)
 ):
-    child = session.get(Child, child_id)
-    if not child:
-        raise HTTPException(status_code=404, detail="Child not found")
-
-    parent_id = None
-    if parent_email is not None:
-        parent = session.exec(select(User).where(User.email == parent_email, User.role == "parent")).first()
-        if not parent:
-            raise HTTPException(status_code=400, detail=f"Parent with email '{parent_email}' not found")
-        parent_id = parent.id
-
-    class_id = None
-    if class_name is not None:
-        classroom = session.exec(select(ClassRoom).where(ClassRoom.name == class_name)).first()
-        if not classroom:
-            raise HTTPException(status_code=404, detail=f"Class '{class_name}' not found")
-        class_id = classroom.id
-
-    dob = None
+    values = {}
+    if name is not None:
+        values["name"] = name
     if date_of_birth is not None:
-        try:
-            dob = dt.strptime(date_of_birth, "%d/%m/%Y")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use DD/MM/YYYY")
-
-    with session.bind.connect() as conn:
-        updates = []
-        params = {"child_id": child_id}
-        if name is not None:
-            updates.append("name = :name")
-            params["name"] = name
-        if dob is not None:
-            updates.append("date_of_birth = :date_of_birth")
-            params["date_of_birth"] = dob
-        if class_id is not None:
-            updates.append("class_id = :class_id")
-            params["class_id"] = class_id
-        if parent_id is not None:
-            updates.append("parent_id = :parent_id")
-            params["parent_id"] = parent_id
-
-        if not updates:
-            raise HTTPException(status_code=400, detail="No fields to update")
-
-        query = f"UPDATE Child SET {', '.join(updates)} WHERE id = :child_id"
-        conn.execute(text(query), params)
-        conn.commit()
+        values["date_of_birth"] = _parse_dob(date_of_birth)
+    if not values and parent_email is None and class_name is None:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    values.update(_child_refs(session, parent_email, class_name))
+
+    child = session.execute(
+        update(Child).where(Child.id == child_id).values(**values).returning(*CHILD_COLUMNS)
+    ).first()
+    if child is None:
+        raise HTTPException(status_code=404, detail="Child not found")
+    resource_versions.bump(session, "children")
+    session.commit()
 
-    updated_child = session.exec(select(Child).where(Child.id == child_id)).first()
-    background_tasks.add_task(audit, user.id, "update_child", f"child_id={child_id}")
-    return updated_child
+    audit(user.id, "update_child", f"child_id={child_id}")
+    return child._asdict()
 
 @router.delete('/children/{child_id}')
 def admin_delete_child(
@@ -185,18 +261,54 @@ def admin_delete_child(
     # Dùng raw SQL để xóa (tránh lỗi foreign key)
     with session.bind.connect() as conn:
         conn.execute(text("DELETE FROM Child WHERE id = :child_id"), {"child_id": child_id})
+        resource_versions.bump(conn, "children")
         conn.commit()
+    dashboard_counters.adjust(children=-1)
 
     return {"msg": "Child deleted"}
 
+# USER LISTS
+# cột mặc định của danh sách; cần thêm (vd. address, experience) thì gọi ?fields=... hoặc ?fields=*
+PARENT_LIST_FIELDS = ("email", "full_name", "phone", "relationship")
+TEACHER_LIST_FIELDS = ("email", "full_name", "phone", "education_level")
+FIELDS_QUERY = Query(None, description="Danh sách field cách nhau bởi dấu phẩy, hoặc * để lấy mọi field của UserRow")
+
+def _list_users(session: Session, role: str, fields: Optional[str], default) -> FastJSONResponse:
+    names = parse_fields(fields, UserRow, default)
+    rows = session.execute(select(*row_columns(User, UserRow, names)).where(User.role == role).order_by(User.id))
+    return FastJSONResponse([row._asdict() for row in rows])
+
 # PARENTS CRUD
-@router.get('/parents')
-def admin_get_parents(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    return session.exec(select(User).where(User.role == "parent")).all()
+@router.get('/parents', responses=doc(List[UserRow]))
+@query_budget(2)
+def admin_get_parents(
+    fields: Optional[str] = FIELDS_QUERY,
+    user: User = Depends(require_role('admin')),
+    session: Session = Depends(get_session),
+):
+    return _list_users(session, "parent", fields, PARENT_LIST_FIELDS)
+
+def _insert_user(session: Session, **values) -> dict:
+    try:
+        row = session.execute(insert(User).values(**values).returning(*USER_COLUMNS)).one()._asdict()
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=400, detail="Email exists")
+    return row
+
+def _update_user(session: Session, where, values: dict):
+    values = {k: v for k, v in values.items() if v is not None}
+    if not values:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    row = session.execute(update(User).where(*where).values(**values).returning(*USER_COLUMNS)).first()
+    if row is not None:
+        session.commit()
+        row = row._asdict()
+    return row
 
 @router.post('/parents')
-def admin_create_parent(
-    background_tasks: BackgroundTasks,
+async def admin_create_parent(
     email: str = Form(...),
     full_name: str = Form(...),
     password: str = Form(...),
@@ -205,37 +317,21 @@ def admin_create_parent(
     emergency_contact: Optional[str] = Form(None),
     address: Optional[str] = Form(None),
     user: User = Depends(require_role('admin')),
-    session: Session = Depends(get_session)
+    db: AsyncDB = Depends(get_db)
 ):
-    if session.exec(select(User).where(User.email == email)).first():
-        raise HTTPException(status_code=400, detail="Email exists")
-
-    hashed_pw = hash_password(password)
-
-    with session.bind.connect() as conn:
-        conn.execute(text("""
-            INSERT INTO [User] (email, full_name, hashed_password, role, phone, address, emergency_contact, relationship)
-            VALUES (:email, :full_name, :hashed_password, :role, :phone, :address, :emergency_contact, :relationship)
-        """), {
-            "email": email,
-            "full_name": full_name,
-            "hashed_password": hashed_pw,
-            "role": "parent",
-            "phone": phone,
-            "address": address,
-            "emergency_contact": emergency_contact,
-            "relationship": relationship
-        })
-        conn.commit()
-
-    parent = session.exec(select(User).where(User.email == email)).first()
-    background_tasks.add_task(audit, user.id, "create_parent", details=f"parent_id={parent.id}")
+    # trùng email -> unique index báo IntegrityError, không cần SELECT kiểm tra trước
+    values = dict(
+        email=email, full_name=full_name, hashed_password=await hash_password_async(password), role="parent",
+        phone=phone, address=address, emergency_contact=emergency_contact, relationship=relationship,
+    )
+    parent = await db.run_sync(lambda session: _insert_user(session, **values))
+    dashboard_counters.adjust(users=1)
+    audit(user.id, "create_parent", details=f"parent_id={parent['id']}")
     return parent
 
 @router.put('/parents/{email}')
 def admin_update_parent(
     email: str,
-    background_tasks: BackgroundTasks,
     full_name: Optional[str] = Form(None),
     phone: Optional[str] = Form(None),
     relationship: Optional[str] = Form(None),
@@ -244,44 +340,20 @@ def admin_update_parent(
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)
 ):
-    parent = session.exec(select(User).where(User.email == email, User.role == "parent")).first()
-    if not parent:
+    parent = _update_user(session, (User.email == email, User.role == "parent"), {
+        "full_name": full_name, "phone": phone, "relationship": relationship,
+        "emergency_contact": emergency_contact, "address": address,
+    })
+    if parent is None:
         raise HTTPException(status_code=404, detail='Parent not found')
 
-    with session.bind.connect() as conn:
-        updates = []
-        params = {"email": email}
-        if full_name is not None:
-            updates.append("full_name = :full_name")
-            params["full_name"] = full_name
-        if phone is not None:
-            updates.append("phone = :phone")
-            params["phone"] = phone
-        if relationship is not None:
-            updates.append("relationship = :relationship")
-            params["relationship"] = relationship
-        if emergency_contact is not None:
-            updates.append("emergency_contact = :emergency_contact")
-            params["emergency_contact"] = emergency_contact
-        if address is not None:
-            updates.append("address = :address")
-            params["address"] = address
-
-        if not updates:
-            raise HTTPException(status_code=400, detail="No fields to update")
-
-        query = f"UPDATE [User] SET {', '.join(updates)} WHERE email = :email AND role = 'parent'"
-        conn.execute(text(query), params)
-        conn.commit()
-
-    updated_parent = session.exec(select(User).where(User.email == email, User.role == "parent")).first()
-    background_tasks.add_task(audit, user.id, "update_parent", details=f"parent_email={email}")
-    return updated_parent
+    invalidate_principal(parent["id"])
+    audit(user.id, "update_parent", details=f"parent_email={email}")
+    return parent
 
 @router.delete('/parents/{email}')
 def admin_delete_parent(
     email: str,
-    background_tasks: BackgroundTasks,
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)    
 ):
@@ -289,18 +361,46 @@ def admin_delete_parent(
     if not parent:
         raise HTTPException(status_code=404, detail='Parent not found')
     session.delete(parent)
+    resource_versions.bump(session, "children")  # Child.parent_id -> NULL
     session.commit()
-    background_tasks.add_task(audit, user.id, "delete_parent", details=f"{email}")
+    invalidate_principal(parent.id)
+    dashboard_counters.adjust(users=-1)
+    audit(user.id, "delete_parent", details=f"{email}")
     return {"msg": "Parent deleted"}
 
+# BULK IMPORT
+@router.post('/import')
+def admin_bulk_import(
+    file: UploadFile = File(...),
+    user: User = Depends(require_role('admin')),
+    session: Session = Depends(get_session)
+):
+    """Import roster (CSV/JSON) gồm các dòng type=parent|teacher|child, lỗi từng dòng không chặn cả lô"""
+    try:
+        rows = parse_roster(file.filename, file.file.read())
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid roster file: {e}")
+    result = import_roster(session, rows)
+    created = result["created"]
+    dashboard_counters.adjust(users=created["parent"] + created["teacher"], children=created["child"])
+    audit(
+        user.id, "bulk_import",
+        f"parents={created['parent']} teachers={created['teacher']} children={created['child']} failed={result['failed']}"
+    )
+    return result
+
 # TEACHERS CRUD
-@router.get('/teachers')
-def admin_get_teachers(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    return session.exec(select(User).where(User.role == "teacher")).all()
+@router.get('/teachers', responses=doc(List[UserRow]))
+@query_budget(2)
+def admin_get_teachers(
+    fields: Optional[str] = FIELDS_QUERY,
+    user: User = Depends(require_role('admin')),
+    session: Session = Depends(get_session),
+):
+    return _list_users(session, "teacher", fields, TEACHER_LIST_FIELDS)
 
 @router.post('/teachers')
-def admin_create_teacher(
-    background_tasks: BackgroundTasks,
+async def admin_create_teacher(
     email: str = Form(...),
     full_name: str = Form(...),
     password: str = Form(...),
@@ -310,46 +410,34 @@ def admin_create_teacher(
     education_level: Optional[str] = Form(None),
     class_name: Optional[str] = Form(None),
     user: User = Depends(require_role('admin')),
-    session: Session = Depends(get_session)
+    db: AsyncDB = Depends(get_db)
 ):
-    if session.exec(select(User).where(User.email == email)).first():
-        raise HTTPException(status_code=400, detail="Email exists")
-
-    hashed_pw = hash_password(password)
-
-    # Dùng raw SQL để insert (SQLAlchemy tự xử lý Unicode)
-    with session.bind.connect() as conn:
-        conn.execute(text("""
-            INSERT INTO [User] (email, full_name, hashed_password, role, phone, address, experience, education_level)
-            VALUES (:email, :full_name, :hashed_password, :role, :phone, :address, :experience, :education_level)
-        """), {
-            "email": email,
-            "full_name": full_name,
-            "hashed_password": hashed_pw,
-            "role": "teacher",
-            "phone": phone,
-            "address": address,
-            "experience": experience,
-            "education_level": education_level
-        })
-        conn.commit()
+    values = dict(
+        email=email, full_name=full_name, hashed_password=await hash_password_async(password), role="teacher",
+        phone=phone, address=address, experience=experience, education_level=education_level,
+    )
+    teacher = await db.run_sync(_create_teacher, values, class_name)
+    audit(user.id, "create_teacher", details=f"teacher_id={teacher['id']}")
+    return teacher
 
-    teacher = session.exec(select(User).where(User.email == email, User.role == "teacher")).first()
+def _create_teacher(session: Session, values: dict, class_name: Optional[str]) -> dict:
+    teacher = _insert_user(session, **values)
+    dashboard_counters.adjust(users=1)
 
     if class_name is not None:
-        classroom = session.exec(select(ClassRoom).where(ClassRoom.name == class_name)).first()
-        if classroom:
-            classroom.teacher_id = teacher.id
-            session.add(classroom)
-            session.commit()
-
-    background_tasks.add_task(audit, user.id, "create_teacher", details=f"teacher_id={teacher.id}")
+        assigned = session.execute(
+            update(ClassRoom)
+            .where(ClassRoom.id == select(func.min(ClassRoom.id)).where(ClassRoom.name == class_name).scalar_subquery())
+            .values(teacher_id=teacher["id"])
+        ).rowcount
+        if assigned:
+            resource_versions.bump(session, "classes")
+        session.commit()
     return teacher
 
 @router.put('/teachers/{id}')
 def admin_update_teacher(
     id: int,
-    background_tasks: BackgroundTasks,
     full_name: Optional[str] = Form(None),
     phone: Optional[str] = Form(None),
     address: Optional[str] = Form(None),
@@ -358,44 +446,20 @@ def admin_update_teacher(
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)
 ):
-    teacher = session.get(User, id)
-    if not teacher or teacher.role != "teacher":
+    teacher = _update_user(session, (User.id == id, User.role == "teacher"), {
+        "full_name": full_name, "phone": phone, "address": address,
+        "experience": experience, "education_level": education_level,
+    })
+    if teacher is None:
         raise HTTPException(status_code=404, detail='Teacher not found')
 
-    with session.bind.connect() as conn:
-        updates = []
-        params = {"id": id}
-        if full_name is not None:
-            updates.append("full_name = :full_name")
-            params["full_name"] = full_name
-        if phone is not None:
-            updates.append("phone = :phone")
-            params["phone"] = phone
-        if address is not None:
-            updates.append("address = :address")
-            params["address"] = address
-        if experience is not None:
-            updates.append("experience = :experience")
-            params["experience"] = experience
-        if education_level is not None:
-            updates.append("education_level = :education_level")
-            params["education_level"] = education_level
-
-        if not updates:
-            raise HTTPException(status_code=400, detail="No fields to update")
-
-        query = f"UPDATE [User] SET {', '.join(updates)} WHERE id = :id AND role = 'teacher'"
-        conn.execute(text(query), params)
-        conn.commit()
-
-    updated_teacher = session.get(User, id)
-    background_tasks.add_task(audit, user.id, "update_teacher", details=f"teacher_id={id}")
-    return updated_teacher
+    invalidate_principal(id)
+    audit(user.id, "update_teacher", details=f"teacher_id={id}")
+    return teacher
 
 @router.delete('/teachers/{id}')
 def admin_delete_teacher(
     id: int,
-    background_tasks: BackgroundTasks,
     user: User = Depends(require_role('admin')),
     session: Session = Depends(get_session)
 ):
@@ -403,22 +467,37 @@ def admin_delete_teacher(
     if not teacher or teacher.role != "teacher":
         raise HTTPException(status_code=404, detail='Teacher not found')
     session.delete(teacher)
+    resource_versions.bump(session, "classes")
     session.commit()
-    background_tasks.add_task(audit, user.id, "delete_teacher", details=f"{id}")
+    invalidate_principal(id)
+    dashboard_counters.adjust(users=-1)
+    audit(user.id, "delete_teacher", details=f"{id}")
     return {"msg": "Teacher deleted"}
 
-@router.get('/classes')
-def admin_get_classes(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    classes = session.exec(select(ClassRoom)).all()
+@router.get('/classes', responses=doc(List[ClassRow]))
+@query_budget(3)
+async def admin_get_classes(
+    user: User = Depends(require_role('admin')),
+    etag: str = Depends(conditional_get("classes", "cameras")),
+    db: AsyncDB = Depends(get_db)
+):
+    classes = await db.all(
+        select(
+            ClassRoom.id,
+            ClassRoom.name,
+            func.count(Camera.id),
+            func.coalesce(func.sum(case((Camera.active == True, 1), else_=0)), 0),
+        )
+        .join(Camera, ClassRoom.id == Camera.class_id, isouter=True)
+        .group_by(ClassRoom.id, ClassRoom.name)
+        .order_by(ClassRoom.id)
+    )
     result = []
-    for cls in classes:
-        cameras = session.exec(select(Camera).where(Camera.class_id == cls.id)).all()
-        active_count = sum(1 for cam in cameras if cam.active)
-        total = len(cameras)
+    for class_id, name, total, active_count in classes:
         percent = round((active_count / total) * 100, 1) if total > 0 else 0
         result.append({
-            "id": cls.id,
-            "name": cls.name,
+            "id": class_id,
+            "name": name,
             "camera_status": {
                 "active_percent": percent,
                 "status": "Hoạt động" if percent > 0 else "Ngừng"
@@ -426,14 +505,16 @@ def admin_get_classes(user: User = Depends(require_role('admin')), session: Sess
             "total_cameras": total,
             "active_cameras": active_count
         })
-    return result
+    return FastJSONResponse(result, headers=etag_headers(etag))
 
 @router.post('/classes')
 def admin_create_class(name: str = Form(...), user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
     c = ClassRoom(name=name)
     session.add(c)
+    resource_versions.bump(session, "classes")
     session.commit()
     session.refresh(c)
+    dashboard_counters.adjust(total_classes=1)
     return c
 
 @router.put('/classes/{id}')
@@ -448,6 +529,7 @@ def admin_update_class(
         raise HTTPException(status_code=404, detail='Not found')
     c.name = name
     session.add(c)
+    resource_versions.bump(session, "classes")
     session.commit()
     return c
 
@@ -460,28 +542,26 @@ def admin_delete_class(
     c = session.get(ClassRoom, id)
     if not c:
         raise HTTPException(status_code=404, detail='Not found')
+    had_active_cameras = active_cameras_in_class(session, id) > 0
     session.delete(c)
+    resource_versions.bump(session, "classes", "cameras", "children")
     session.commit()
+    dashboard_counters.adjust(total_classes=-1, active_classes=-1 if had_active_cameras else 0)
     return {"msg": "deleted"}
 
 # CAMERAS CRUD
-@router.get('/cameras')
-def admin_get_cameras(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    cameras_with_class = session.exec(
-        select(Camera, ClassRoom.name.label("class_name"))
+@router.get('/cameras', responses=doc(List[AdminCameraRow]))
+@query_budget(3)
+async def admin_get_cameras(
+    user: User = Depends(require_role('admin')),
+    etag: str = Depends(conditional_get("cameras", "classes")),
+    db: AsyncDB = Depends(get_db)
+):
+    cameras = await db.dicts(
+        select(*row_columns(Camera, CameraRow), ClassRoom.name.label("class_name"))
         .join(ClassRoom, Camera.class_id == ClassRoom.id, isouter=True)
-    ).all()
-    result = []
-    for cam, class_name in cameras_with_class:
-        result.append({
-            "id": cam.id,
-            "name": cam.name,
-            "class_id": cam.class_id,
-            "class_name": class_name,
-            "rtsp_url": cam.rtsp_url,
-            "active": cam.active
-        })
-    return result
+    )
+    return FastJSONResponse(cameras, headers=etag_headers(etag))
 
 @router.post('/cameras')
 def admin_create_camera(
@@ -493,8 +573,10 @@ def admin_create_camera(
 ):
     cam = Camera(name=name, class_id=class_id, rtsp_url=rtsp_url)
     session.add(cam)
+    resource_versions.bump(session, "cameras")
     session.commit()
     session.refresh(cam)
+    adjust_camera_counters(session, None, (cam.class_id, cam.active))
     return cam
 
 @router.put('/cameras/{id}')
@@ -508,12 +590,15 @@ def admin_update_camera(
     cam = session.get(Camera, id)
     if not cam:
         raise HTTPException(status_code=404, detail='Not found')
+    before = (cam.class_id, cam.active)
     if name is not None:
         cam.name = name
     if active is not None:
         cam.active = active
     session.add(cam)
+    resource_versions.bump(session, "cameras")
     session.commit()
+    adjust_camera_counters(session, before, (cam.class_id, cam.active))
     return cam
 
 @router.delete('/cameras/{id}')
@@ -525,14 +610,23 @@ def admin_delete_camera(
     cam = session.get(Camera, id)
     if not cam:
         raise HTTPException(status_code=404, detail='Not found')
+    before = (cam.class_id, cam.active)
     session.delete(cam)
+    resource_versions.bump(session, "cameras")
     session.commit()
+    adjust_camera_counters(session, before, None)
     return {"msg": "deleted"}
 
 # DANGER ZONES CRUD
-@router.get('/danger-zones')
-def admin_get_zones(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    return session.exec(select(DangerZone)).all()
+@router.get('/danger-zones', responses=doc(List[DangerZoneRow]))
+@query_budget(3)
+def admin_get_zones(
+    user: User = Depends(require_role('admin')),
+    etag: str = Depends(conditional_get("danger_zones")),
+    session: Session = Depends(get_session)
+):
+    rows = session.exec(select(*row_columns(DangerZone, DangerZoneRow)))
+    return FastJSONResponse([row._asdict() for row in rows], headers=etag_headers(etag))
 
 @router.post('/danger-zones')
 def admin_create_zone(
@@ -544,6 +638,7 @@ def admin_create_zone(
 ):
     z = DangerZone(name=name, coords_json=coords_json, severity=severity)
     session.add(z)
+    resource_versions.bump(session, "danger_zones")
     session.commit()
     session.refresh(z)
     return z
@@ -567,6 +662,7 @@ def admin_update_zone(
     if severity is not None:
         z.severity = severity
     session.add(z)
+    resource_versions.bump(session, "danger_zones")
     session.commit()
     return z
 
@@ -580,35 +676,73 @@ def admin_delete_zone(
     if not z:
         raise HTTPException(status_code=404, detail='Not found')
     session.delete(z)
+    resource_versions.bump(session, "danger_zones")
     session.commit()
     return {"msg": "deleted"}
 
+# EXPORTS
+@router.get('/export/{dataset}')
+def admin_export(
+    dataset: str,
+    query: ExportQuery = Depends(),
+    user: User = Depends(require_role('admin')),
+):
+    """Stream NDJSON/CSV (tùy chọn gzip) -- không giữ cả kết quả trong bộ nhớ"""
+    if dataset not in exports.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset. Use one of: {', '.join(exports.DATASETS)}")
+    body = exports.stream(engine, exports.DATASETS[dataset], query)
+    audit(user.id, "export", f"{dataset} {query.start.isoformat()}..{query.end.isoformat()} format={query.format}")
+    return StreamingResponse(body, media_type=query.media_type(), headers={
+        "Content-Disposition": f'attachment; filename="{query.filename(dataset)}"',
+        "Cache-Control": "no-store",
+    })
+
 # REPORTS & ALERTS
 @router.get('/reports')
-def admin_reports(
-    type: Optional[str] = None,
-    timeRange: Optional[str] = None,
+@query_budget(3)
+async def admin_reports(
+    query: ReportQuery = Depends(),
     user: User = Depends(require_role('admin')),
-    session: Session = Depends(get_session)
+    db: AsyncDB = Depends(get_db)
 ):
-    return {"alerts_count": session.exec(select(Alert)).count()}
+    key = query.cache_key()
+    result = report_cache.get(key)
+    if result is None:
+        result = await db.run_sync(reports.run, query)
+        report_cache.set(key, result)
+    return FastJSONResponse(result)
 
 @router.get('/alerts-by-class')
-def admin_get_alerts_by_class(user: User = Depends(require_role('admin')), session: Session = Depends(get_session)):
-    alerts_by_class = session.exec(
-        select(
-            ClassRoom.name,
-            func.count(Alert.id).label("alert_count")
-        )
-        .join(Child, ClassRoom.id == Child.class_id)
-        .join(Alert, Child.id == Alert.child_id)
-        .group_by(ClassRoom.name)
-        .order_by(func.count(Alert.id).desc())
-    ).all()
-    return [
-        {"class_name": name, "alert_count": count}
-        for name, count in alerts_by_class
-    ]
+@query_budget(4)
+async def admin_get_alerts_by_class(
+    query: AlertsByClassQuery = Depends(),
+    user: User = Depends(require_role('admin')),
+    db: AsyncDB = Depends(get_db)
+):
+    versions = await db.run_sync(resource_versions.read, ALERTS_BY_CLASS_RESOURCES)
+    key = query.cache_key(tuple(versions.values()))
+    result = alerts_by_class_cache.get(key) if key else None
+    if result is None:
+        result = await db.run_sync(reports.alerts_by_class, query)
+        if key:
+            alerts_by_class_cache.set(key, result)
+    return FastJSONResponse(result)
+
+@router.get('/alerts', responses=doc(AlertPage))
+@query_budget(2)
+async def admin_get_alerts(
+    feed: AlertFeedQuery = Depends(),
+    class_id: Optional[int] = None,
+    child_id: Optional[int] = None,
+    user: User = Depends(require_role('admin')),
+    db: AsyncDB = Depends(get_db)
+):
+    stmt = select(Alert)
+    if child_id is not None:
+        stmt = stmt.where(Alert.child_id == child_id)
+    if class_id is not None:
+        stmt = stmt.join(Child, Alert.child_id == Child.id).where(Child.class_id == class_id)
+    return FastJSONResponse(await feed.page(db, stmt))
 
 @router.put('/alerts/{id}')
 def admin_update_alert(
@@ -1,35 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Optional
-from models import User, Child, Alert
-from apiSQL import require_role, get_session
+from models import User, Child, Alert, ChildRow, AlertPage
+from apiSQL import require_role, get_session, get_db
+from db_async import AsyncDB
+from alert_feed import AlertFeedQuery
+from fast_json import FastJSONResponse, row_columns, doc
+from query_counter import query_budget
+from sqlalchemy import func
 from sqlmodel import Session, select
 router = APIRouter(prefix="/api/parent", tags=["Parent"])
 
 # PARENT DASHBOARD
 @router.get("/dashboard")
-def parent_dashboard(user: User = Depends(require_role("parent")), session: Session = Depends(get_session)):
-    children = session.exec(select(Child).where(Child.parent_id == user.id)).all()
-    child_ids = [c.id for c in children]
-    alerts = session.exec(
-        select(Alert)
-        .where(Alert.child_id.in_(child_ids))
-        .order_by(Alert.created_at.desc())
-    ).all() if child_ids else []
+@query_budget(4)
+async def parent_dashboard(user: User = Depends(require_role("parent")), db: AsyncDB = Depends(get_db)):
+    children = await db.scalars(select(Child).where(Child.parent_id == user.id))
+    alerts_count = await db.scalar(
+        select(func.count(Alert.id))
+        .join(Child, Alert.child_id == Child.id)
+        .where(Child.parent_id == user.id)
+    )
+    recent_alerts = await db.scalars(
+        _parent_alerts(user).order_by(Alert.created_at.desc(), Alert.id.desc()).limit(5)
+    )
 
     return {
         "msg": f"Chào mừng phụ huynh {user.full_name}",
         "children_count": len(children),
-        "recent_alerts_count": len(alerts),
+        "recent_alerts_count": alerts_count,
         "children": children,
-        "recent_alerts": alerts[:5]
+        "recent_alerts": recent_alerts
     }
 
 # QUẢN LÝ CON
-@router.get("/children")
-def parent_get_children(user: User = Depends(require_role("parent")), session: Session = Depends(get_session)):
-    return session.exec(select(Child).where(Child.parent_id == user.id)).all()
+@router.get("/children", responses=doc(List[ChildRow]))
+@query_budget(2)
+async def parent_get_children(user: User = Depends(require_role("parent")), db: AsyncDB = Depends(get_db)):
+    return FastJSONResponse(await db.dicts(select(*row_columns(Child, ChildRow)).where(Child.parent_id == user.id)))
 
 @router.get("/children/{child_id}")
+@query_budget(2)
 def parent_get_child(child_id: int, user: User = Depends(require_role("parent")), session: Session = Depends(get_session)):
     child = session.get(Child, child_id)
     if not child:
@@ -39,20 +49,20 @@ def parent_get_child(child_id: int, user: User = Depends(require_role("parent"))
     return child
 
 # QUẢN LÝ CẢNH BÁO
-@router.get("/alerts")
-def parent_get_alerts(user: User = Depends(require_role("parent")), session: Session = Depends(get_session)):
-    children = session.exec(select(Child).where(Child.parent_id == user.id)).all()
-    child_ids = [c.id for c in children]
-    if not child_ids:
-        return []
-    alerts = session.exec(
-        select(Alert)
-        .where(Alert.child_id.in_(child_ids))
-        .order_by(Alert.created_at.desc())
-    ).all()
-    return alerts
+def _parent_alerts(user: User):
+    return select(Alert).join(Child, Alert.child_id == Child.id).where(Child.parent_id == user.id)
+
+@router.get("/alerts", responses=doc(AlertPage))
+@query_budget(2)
+async def parent_get_alerts(
+    feed: AlertFeedQuery = Depends(),
+    user: User = Depends(require_role("parent")),
+    db: AsyncDB = Depends(get_db)
+):
+    return FastJSONResponse(await feed.page(db, _parent_alerts(user)))
 
 @router.get("/alerts/{alert_id}")
+@query_budget(3)
 def parent_get_alert(alert_id: int, user: User = Depends(require_role("parent")), session: Session = Depends(get_session)):
     alert = session.get(Alert, alert_id)
     if not alert:
@@ -1,15 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Form
 from sqlmodel import Session, select
-from typing import Optional
-from models import User, ClassRoom, Camera, Child, Alert, BehaviorLog
-from apiSQL import get_session, require_role
+from typing import Optional, List
+from models import User, ClassRoom, Camera, Child, Alert, BehaviorHourly, AlertHourly, ChildRow, CameraRow, AlertPage
+from apiSQL import get_session, get_db, require_role, dashboard_counters, adjust_camera_counters
+from db_async import AsyncDB
+from alert_feed import AlertFeedQuery
+from query_counter import query_budget
+from etags import conditional_get, etag_headers, resource_versions
+from fast_json import FastJSONResponse, row_columns, doc
+from time_buckets import floor_datetime
 from sqlalchemy import func
 from datetime import datetime, timedelta
+import os
 router = APIRouter(prefix="/api/teacher", tags=["Teacher"])
+SCORE_WINDOW_DAYS = int(os.getenv("SAFENEST_TEACHER_SCORE_DAYS", "7"))
 
 # TEACHER DASHBOARD
 @router.get("/dashboard")
-def teacher_dashboard(user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
+@query_budget(6)
+async def teacher_dashboard(user: User = Depends(require_role("teacher")), db: AsyncDB = Depends(get_db)):
+    return await db.run_sync(_teacher_dashboard, user)
+
+def _teacher_dashboard(session: Session, user: User):
     classes = session.exec(select(ClassRoom).where(ClassRoom.teacher_id == user.id)).all()
     class_ids = [c.id for c in classes]
 
@@ -24,31 +36,35 @@ def teacher_dashboard(user: User = Depends(require_role("teacher")), session: Se
             }
         }
 
-    students = session.exec(select(Child).where(Child.class_id.in_(class_ids))).all()
-    today_start = datetime.utcnow() - timedelta(hours=24)
-    present_students = session.exec(
-        select(func.distinct(BehaviorLog.child_id))
-        .join(Child, BehaviorLog.child_id == Child.id)
-        .where(Child.class_id.in_(class_ids), BehaviorLog.timestamp >= today_start)
-    ).all()
-    present_count = len(present_students)
-
-    avg_behavior_score = session.exec(
-        select(func.avg(BehaviorLog.confidence))
-        .join(Child, BehaviorLog.child_id == Child.id)
-        .where(Child.class_id.in_(class_ids))
-    ).first() or 0
-
-    avg_class_score = session.exec(
-        select(func.avg(Alert.severity))
-        .join(Child, Alert.child_id == Child.id)
-        .where(Child.class_id.in_(class_ids))
-    ).first() or 0
+    students = session.exec(select(func.count(Child.id)).where(Child.class_id.in_(class_ids))).one()
+    # đọc từ rollup theo giờ (rollups.py) thay vì quét BehaviorLog / Alert
+    today_start = floor_datetime(datetime.utcnow() - timedelta(hours=24), "hour")
+    present_count = session.exec(
+        select(func.count(func.distinct(BehaviorHourly.child_id)))
+        .join(Child, BehaviorHourly.child_id == Child.id)
+        .where(Child.class_id.in_(class_ids), BehaviorHourly.hour_start >= today_start)
+    ).one()
+
+    # điểm trung bình trong SCORE_WINDOW_DAYS ngày gần nhất -> số dòng rollup quét có giới hạn
+    score_start = floor_datetime(datetime.utcnow() - timedelta(days=SCORE_WINDOW_DAYS), "hour")
+    behavior_sum, behavior_count = session.exec(
+        select(func.sum(BehaviorHourly.confidence_sum), func.sum(BehaviorHourly.count))
+        .join(Child, BehaviorHourly.child_id == Child.id)
+        .where(Child.class_id.in_(class_ids), BehaviorHourly.hour_start >= score_start)
+    ).one()
+    avg_behavior_score = behavior_sum / behavior_count if behavior_count else 0
+
+    severity_sum, alert_count = session.exec(
+        select(func.sum(AlertHourly.severity_sum), func.sum(AlertHourly.count))
+        .join(Child, AlertHourly.child_id == Child.id)
+        .where(Child.class_id.in_(class_ids), AlertHourly.hour_start >= score_start)
+    ).one()
+    avg_class_score = severity_sum / alert_count if alert_count else 0
 
     return {
         "msg": f"Chào mừng giáo viên {user.email}",
         "stats": {
-            "students": len(students),
+            "students": students,
             "present_today": present_count,
             "avg_behavior_score": round(avg_behavior_score, 2),
             "avg_class_score": round(avg_class_score, 2)
@@ -57,23 +73,26 @@ def teacher_dashboard(user: User = Depends(require_role("teacher")), session: Se
 
 # QUẢN LÝ LỚP HỌC
 @router.get("/classes")
+@query_budget(2)
 def teacher_get_classes(user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
     return session.exec(select(ClassRoom).where(ClassRoom.teacher_id == user.id)).all()
 
 # QUẢN LÝ HỌC SINH
-@router.get("/children")
-def teacher_get_children(user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
-    class_ids = session.exec(
-        select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)
-    ).all()
-    if not class_ids:
-        return []
-    children = session.exec(
-        select(Child).where(Child.class_id.in_(class_ids))
-    ).all()
-    return children
+@router.get("/children", responses=doc(List[ChildRow]))
+@query_budget(4)
+async def teacher_get_children(
+    user: User = Depends(require_role("teacher")),
+    etag: str = Depends(conditional_get("children", "classes", per_user=True)),
+    db: AsyncDB = Depends(get_db)
+):
+    children = await db.dicts(
+        select(*row_columns(Child, ChildRow))
+        .where(Child.class_id.in_(select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)))
+    )
+    return FastJSONResponse(children, headers=etag_headers(etag))
 
 @router.get("/children/{child_id}")
+@query_budget(3)
 def teacher_get_child(child_id: int, user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
     child = session.get(Child, child_id)
     if not child:
@@ -107,7 +126,9 @@ def teacher_create_child(
 
     child = Child(name=name, class_id=class_id, parent_id=parent_id)
     session.add(child)
+    resource_versions.bump(session, "children")
     session.commit()
+    dashboard_counters.adjust(children=1)
     session.refresh(child)
     return child
 
@@ -129,6 +150,7 @@ def teacher_update_child(
     if parent_id is not None:
         child.parent_id = parent_id
     session.add(child)
+    resource_versions.bump(session, "children")
     session.commit()
     session.refresh(child)
     return child
@@ -143,21 +165,24 @@ def teacher_delete_child(
     if not child:
         raise HTTPException(status_code=404, detail="Không tìm thấy trẻ")
     session.delete(child)
+    resource_versions.bump(session, "children")
     session.commit()
+    dashboard_counters.adjust(children=-1)
     return {"msg": "Đã xóa trẻ"}
 
 # QUẢN LÝ CAMERA
-@router.get("/cameras")
-def teacher_get_cameras(user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
-    class_ids = session.exec(
-        select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)
-    ).all()
-    if not class_ids:
-        return []
-    cameras = session.exec(
-        select(Camera).where(Camera.class_id.in_(class_ids))
-    ).all()
-    return cameras
+@router.get("/cameras", responses=doc(List[CameraRow]))
+@query_budget(4)
+async def teacher_get_cameras(
+    user: User = Depends(require_role("teacher")),
+    etag: str = Depends(conditional_get("cameras", "classes", per_user=True)),
+    db: AsyncDB = Depends(get_db)
+):
+    cameras = await db.dicts(
+        select(*row_columns(Camera, CameraRow))
+        .where(Camera.class_id.in_(select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)))
+    )
+    return FastJSONResponse(cameras, headers=etag_headers(etag))
 
 @router.post("/cameras")
 def teacher_create_camera(
@@ -176,8 +201,10 @@ def teacher_create_camera(
 
     cam = Camera(name=name, class_id=class_id, rtsp_url=rtsp_url)
     session.add(cam)
+    resource_versions.bump(session, "cameras")
     session.commit()
     session.refresh(cam)
+    adjust_camera_counters(session, None, (cam.class_id, cam.active))
     return cam
 
 @router.put("/cameras/{camera_id}")
@@ -193,6 +220,7 @@ def teacher_update_camera(
     camera = session.get(Camera, camera_id)
     if not camera:
         raise HTTPException(status_code=404, detail="Không tìm thấy camera")
+    before = (camera.class_id, camera.active)
 
     if name is not None:
         camera.name = name
@@ -211,8 +239,10 @@ def teacher_update_camera(
             camera.class_id = classroom.id
 
     session.add(camera)
+    resource_versions.bump(session, "cameras")
     session.commit()
     session.refresh(camera)
+    adjust_camera_counters(session, before, (camera.class_id, camera.active))
     return camera
 
 @router.delete("/cameras/{camera_id}")
@@ -224,28 +254,25 @@ def teacher_delete_camera(
     camera = session.get(Camera, camera_id)
     if not camera:
         raise HTTPException(status_code=404, detail="Không tìm thấy camera")
+    before = (camera.class_id, camera.active)
     session.delete(camera)
+    resource_versions.bump(session, "cameras")
     session.commit()
+    adjust_camera_counters(session, before, None)
     return {"msg": "Đã xóa camera"}
 
 # XEM CẢNH BÁO
-@router.get("/alerts")
-def teacher_get_alerts(user: User = Depends(require_role("teacher")), session: Session = Depends(get_session)):
-    class_ids = session.exec(
-        select(ClassRoom.id).where(ClassRoom.teacher_id == user.id)
-    ).all()
-    if not class_ids:
-        return []
-
-    child_ids = session.exec(
-        select(Child.id).where(Child.class_id.in_(class_ids))
-    ).all()
-    if not child_ids:
-        return []
-
-    alerts = session.exec(
+@router.get("/alerts", responses=doc(AlertPage))
+@query_budget(2)
+async def teacher_get_alerts(
+    feed: AlertFeedQuery = Depends(),
+    user: User = Depends(require_role("teacher")),
+    db: AsyncDB = Depends(get_db)
+):
+    return FastJSONResponse(await feed.page(
+        db,
         select(Alert)
-        .where(Alert.child_id.in_(child_ids))
-        .order_by(Alert.created_at.desc())
-    ).all()
-    return alerts
\ No newline at end of file
+        .join(Child, Alert.child_id == Child.id)
+        .join(ClassRoom, Child.class_id == ClassRoom.id)
+        .where(ClassRoom.teacher_id == user.id)
+    ))
@@ -0,0 +1,224 @@
+"""Ghi AuditLog theo lô: audit() chỉ đưa sự kiện vào hàng đợi trong bộ nhớ, một thread nền ghi
+bằng một câu INSERT nhiều dòng mỗi SAFENEST_AUDIT_FLUSH_MS ms hoặc khi đủ SAFENEST_AUDIT_BATCH_SIZE sự kiện.
+
+Hàng đợi có giới hạn (SAFENEST_AUDIT_QUEUE_SIZE): khi DB chậm/lỗi và hàng đợi đầy, sự kiện mới bị bỏ
+và được đếm ở `dropped` (GET /api/admin/system/audit-writer, /metrics).
+
+Lô ghi lỗi vì dữ liệu (IntegrityError / DataError) được ghi lại từng dòng trên một connection, mỗi
+dòng một savepoint; dòng tự nó lỗi bị bỏ và đếm ở `rejected`. Lỗi khác (DB mất kết nối, quá tải) thì
+cả lô được thử lại nguyên vẹn với backoff tăng dần (tối đa SAFENEST_AUDIT_MAX_BACKOFF_MS), sau
+SAFENEST_AUDIT_MAX_ATTEMPTS lần thì bỏ lô, đếm ở `abandoned`. Khi shutdown, stop() ghi nốt những gì còn lại.
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from models import AuditLog
+
+AUDIT_QUEUE_SIZE = int(os.getenv("SAFENEST_AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("SAFENEST_AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_MS = int(os.getenv("SAFENEST_AUDIT_FLUSH_MS", "500"))
+AUDIT_MAX_ATTEMPTS = int(os.getenv("SAFENEST_AUDIT_MAX_ATTEMPTS", "8"))
+AUDIT_MAX_BACKOFF_MS = int(os.getenv("SAFENEST_AUDIT_MAX_BACKOFF_MS", "30000"))
+# SQL Server giới hạn 2100 tham số mỗi câu; AuditLog ghi 4 cột mỗi dòng
+_MAX_ROWS_PER_INSERT = 500
+_DETAILS_MAX_LEN = 500
+
+
+class AuditWriter:
+    def __init__(self, maxsize: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_ms: int = AUDIT_FLUSH_MS, max_attempts: int = AUDIT_MAX_ATTEMPTS,
+                 max_backoff_ms: int = AUDIT_MAX_BACKOFF_MS):
+        self.maxsize = maxsize
+        self.batch_size = max(1, min(batch_size, _MAX_ROWS_PER_INSERT))
+        self.flush_interval = flush_ms / 1000
+        self.max_attempts = max(1, max_attempts)
+        self.max_backoff = max(max_backoff_ms / 1000, self.flush_interval)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._in_flight = 0
+        self._retry: list = []  # lô đang chờ thử lại (DB lỗi)
+        self._attempts = 0  # số lần lô hiện tại đã lỗi
+        self._failures = 0  # số lần lỗi liên tiếp, quyết định backoff; về 0 khi ghi được
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.abandoned = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_ms = 0.0
+
+    def log(self, user_id: Optional[int], action: str, details: Optional[str] = None) -> bool:
+        """Không chặn; False nếu hàng đợi đầy và sự kiện bị bỏ"""
+        row = {
+            "user_id": user_id,
+            "action": action,
+            "details": details[:_DETAILS_MAX_LEN] if details else details,
+            "created_at": datetime.utcnow(),
+        }
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                return False
+            self._queue.append(row)
+            self.enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def start(self, engine):
+        if self._thread is not None:
+            return
+        self._engine = engine
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Dừng thread nền sau khi ghi hết hàng đợi"""
+        thread = self._thread
+        if thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread.join(timeout)
+        self._thread = None
+
+    def _take(self) -> list:
+        if self._retry:
+            self._in_flight = len(self._retry)
+            return self._retry
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while not self._stopping and len(self._queue) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.batch_size)
+            self._in_flight = n
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _insert(self, rows: list):
+        with self._engine.begin() as conn:
+            conn.execute(insert(AuditLog.__table__).values(rows))
+
+    def _write(self, rows: list) -> bool:
+        """False: DB lỗi, lô được giữ lại để thử lại sau backoff"""
+        started = time.perf_counter()
+        try:
+            self._insert(rows)
+        except (IntegrityError, DataError) as e:
+            self.last_error = str(e)[:200]
+            print("Audit log batch rejected, writing rows one by one:", self.last_error)
+            try:
+                self._write_each(rows)
+            except Exception as e:
+                return self._failed(rows, e)
+        except Exception as e:
+            return self._failed(rows, e)
+        else:
+            self.written += len(rows)
+        self._retry, self._attempts, self._failures = [], 0, 0
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def _failed(self, rows: list, error: Exception) -> bool:
+        self.failed_batches += 1
+        self.last_error = str(error)[:200]
+        self._attempts += 1
+        self._failures += 1
+        if self._attempts >= self.max_attempts:
+            print(f"Audit log: abandoning {len(rows)} events after {self._attempts} failed attempts:", self.last_error)
+            self.abandoned += len(rows)
+            self._retry, self._attempts = [], 0
+        else:
+            print("Audit log flush failed:", self.last_error)
+            self._retry = rows
+        return False
+
+    def _write_each(self, rows: list):
+        """Lô lỗi vì dữ liệu: một connection, mỗi dòng một savepoint -- dòng hỏng (vd. user_id đã bị xóa)
+        bị bỏ, các dòng còn lại vẫn được ghi"""
+        table = AuditLog.__table__
+        written, rejected = 0, []
+        with self._engine.begin() as conn:
+            for row in rows:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(table).values([row]))
+                    written += 1
+                except (IntegrityError, DataError):
+                    rejected.append(row)
+        self.written += written
+        self.rejected += len(rejected)
+        for row in rejected:
+            print("Audit log row rejected:", row)
+
+    def _backoff(self) -> float:
+        return min(self.flush_interval * 2 ** min(self._failures, 16), self.max_backoff)
+
+    def _run(self):
+        while True:
+            rows = self._take()
+            if rows:
+                ok = self._write(rows)
+                self._in_flight = 0
+                if not ok:
+                    if self._stopping:
+                        break  # shutdown: không thử lại mãi
+                    # DB lỗi: chờ lâu dần rồi thử lại cả lô, không dồn thêm request vào DB đang quá tải
+                    with self._cond:
+                        self._cond.wait_for(lambda: self._stopping, self._backoff())
+            elif self._stopping:
+                break
+        pending = len(self._retry)
+        with self._cond:
+            pending += len(self._queue)
+        if pending:
+            print(f"Audit log: {pending} events not written at shutdown")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Chờ tới khi hàng đợi rỗng (dùng cho CLI/kiểm thử)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                if not self._queue and not self._in_flight and not self._retry:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = len(self._queue)
+        return {
+            "running": self._thread is not None,
+            "queue_depth": depth,
+            "queue_size": self.maxsize,
+            "batch_size": self.batch_size,
+            "flush_ms": int(self.flush_interval * 1000),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "retry_pending": len(self._retry),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+
+audit_writer = AuditWriter()
@@ -0,0 +1,60 @@
+"""So sánh handler async (SAFENEST_DB_ASYNC=1) với đường sync qua threadpool (SAFENEST_DB_ASYNC=0).
+
+Chạy API ở từng chế độ rồi chạy script với cùng tham số, ví dụ:
+    SAFENEST_DB_ASYNC=0 uvicorn apiSQL:app --port 8000
+    python benchmarks/bench_async.py --label sync --concurrency 100 --requests 2000
+    SAFENEST_DB_ASYNC=1 uvicorn apiSQL:app --port 8000
+    python benchmarks/bench_async.py --label async --concurrency 100 --requests 2000
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_login import login_request, report, timed_request
+
+ENDPOINTS = {
+    "parent": ["/api/parent/dashboard", "/api/parent/alerts", "/api/parent/children"],
+    "teacher": ["/api/teacher/dashboard", "/api/teacher/alerts", "/api/teacher/children", "/api/teacher/cameras"],
+    "admin": ["/api/admin/dashboard", "/api/admin/children", "/api/admin/cameras"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--role", choices=sorted(ENDPOINTS), default="parent")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    email = args.email or f"{args.role}@example.com"
+    password = args.password or f"{args.role}123"
+    with urllib.request.urlopen(login_request(args.url, email, password)) as resp:
+        token = json.loads(resp.read())["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    paths = ENDPOINTS[args.role]
+    jobs = [paths[i % len(paths)] for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda path: (path, timed_request(urllib.request.Request(f"{args.url}{path}", headers=headers))),
+            jobs,
+        ))
+    elapsed = time.perf_counter() - start
+
+    print(f"[{args.label}] {args.requests} requests, concurrency={args.concurrency}, "
+          f"{args.requests / elapsed:.1f} req/s")
+    report("all", [r for _, r in results])
+    for path in paths:
+        report(path.rsplit("/", 1)[-1], [r for p, r in results if p == path])
+
+
+if __name__ == "__main__":
+    main()
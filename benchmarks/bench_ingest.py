@@ -0,0 +1,73 @@
+"""Đo throughput (rows/s) của POST /api/ai/behavior-logs.
+
+Chạy API trước (uvicorn apiSQL:app), rồi:
+    python benchmarks/bench_ingest.py --batch-size 500 --batches 200 --concurrency 8 --child-ids 1
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench_login import login_request, report, timed_request
+
+BEHAVIORS = ["sitting", "standing", "running", "walking", "lying"]
+
+
+def make_batch(batch_no, size, child_ids, camera_id):
+    now = datetime.utcnow().isoformat()
+    return {
+        "batch_id": f"bench-{batch_no}",
+        "records": [
+            {
+                "child_id": random.choice(child_ids),
+                "camera_id": camera_id,
+                "behavior_type": random.choice(BEHAVIORS),
+                "confidence": round(random.random(), 3),
+                "timestamp": now,
+            }
+            for _ in range(size)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="admin@example.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--child-ids", default="1", help="danh sách id, cách nhau bởi dấu phẩy")
+    parser.add_argument("--camera-id", type=int)
+    args = parser.parse_args()
+
+    with urllib.request.urlopen(login_request(args.url, args.email, args.password)) as resp:
+        token = json.loads(resp.read())["access_token"]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    child_ids = [int(x) for x in args.child_ids.split(",")]
+
+    bodies = [json.dumps(make_batch(i, args.batch_size, child_ids, args.camera_id)).encode()
+              for i in range(args.batches)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(
+            lambda body: timed_request(urllib.request.Request(
+                f"{args.url}/api/ai/behavior-logs", data=body, headers=headers, method="POST")),
+            bodies,
+        ))
+    elapsed = time.perf_counter() - start
+
+    ok = sum(1 for status, _ in results if status == 200)
+    rows = ok * args.batch_size
+    print(f"{rows} rows in {elapsed:.2f}s -> {rows / elapsed:,.0f} rows/s "
+          f"({args.batches} batches x {args.batch_size}, concurrency={args.concurrency})")
+    report("batch", results)
+
+
+if __name__ == "__main__":
+    main()
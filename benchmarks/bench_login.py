@@ -0,0 +1,93 @@
+"""Đo độ trễ login (p50/p95/p99) khi nhiều request đồng thời.
+
+Chạy API trước (uvicorn apiSQL:app), rồi:
+    python benchmarks/bench_login.py --url http://localhost:8000 --concurrency 50 --requests 500
+
+Song song với burst login, script gọi GET / để xem các endpoint khác có bị ảnh hưởng không.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def timed_request(req):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except urllib.error.URLError:
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+
+def login_request(url, email, password):
+    body = json.dumps({"email": email, "password": password}).encode()
+    return urllib.request.Request(
+        f"{url}/api/auth/login", data=body, headers={"Content-Type": "application/json"}, method="POST"
+    )
+
+
+def report(name, results):
+    latencies = [ms for _, ms in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(
+        f"{name:<8} n={len(results):<5} p50={percentile(latencies, 50):8.1f}ms "
+        f"p95={percentile(latencies, 95):8.1f}ms p99={percentile(latencies, 99):8.1f}ms "
+        f"max={max(latencies, default=0):8.1f}ms status={statuses}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="parent@example.com")
+    parser.add_argument("--password", default="parent123")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    probe_results = []
+
+    def probe():
+        while not stop.is_set():
+            probe_results.append(timed_request(urllib.request.Request(f"{args.url}/")))
+            time.sleep(0.05)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        login_results = list(pool.map(
+            lambda _: timed_request(login_request(args.url, args.email, args.password)),
+            range(args.requests),
+        ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    print(f"{args.requests} logins, concurrency={args.concurrency}, {args.requests / elapsed:.1f} req/s")
+    report("login", login_results)
+    report("GET /", probe_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""So sánh thời gian serialize 10k dòng: đường mặc định của FastAPI vs FastJSONResponse.
+
+Không cần chạy API:
+    python benchmarks/bench_serialize.py --rows 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fast_json import FastJSONResponse, orjson
+from models import Alert, User
+
+FIELDS = ("id", "email", "full_name", "role", "phone", "address", "emergency_contact",
+          "experience", "education_level", "relationship")
+
+
+def make_alerts(n):
+    start = datetime(2026, 1, 1)
+    return [Alert(id=i, child_id=i % 300, camera_id=i % 20, alert_type="fall", severity=1 + i % 3,
+                  acknowledged=bool(i % 2), created_at=start + timedelta(seconds=i)) for i in range(n)]
+
+
+def make_users(n):
+    return [User(id=i, email=f"user{i}@example.com", full_name=f"Phụ huynh {i}", hashed_password="x" * 60,
+                 role="parent", phone="+84123456789", address="Hà Nội", relationship="Mẹ") for i in range(n)]
+
+
+def best_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    alerts = make_alerts(args.rows)
+    alert_rows = [{k: getattr(a, k) for k in ("id", "child_id", "camera_id", "danger_zone_id", "alert_type",
+                                              "severity", "acknowledged", "created_at")} for a in alerts]
+    users = make_users(args.rows)
+    user_rows = [{k: getattr(u, k) for k in FIELDS} for u in users]
+
+    cases = [
+        ("alerts: SQLModel -> jsonable_encoder -> JSONResponse", lambda: JSONResponse(jsonable_encoder(alerts))),
+        ("alerts: dict rows -> jsonable_encoder -> JSONResponse", lambda: JSONResponse(jsonable_encoder(alert_rows))),
+        ("alerts: dict rows -> FastJSONResponse", lambda: FastJSONResponse(alert_rows)),
+        ("users: SQLModel -> jsonable_encoder -> JSONResponse", lambda: JSONResponse(jsonable_encoder(users))),
+        ("users: dict rows -> FastJSONResponse", lambda: FastJSONResponse(user_rows)),
+    ]
+    print(f"{args.rows} rows, best of {args.repeat}, orjson={'yes' if orjson else 'no'}")
+    for name, fn in cases:
+        print(f"  {name:<58} {best_ms(fn, args.repeat):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+from datetime import datetime as dt
+from typing import Dict, List, Tuple
+from sqlalchemy import insert, update, bindparam
+from sqlmodel import Session, select
+from models import User, ClassRoom, Child
+from passwords import hash_passwords
+from etags import resource_versions
+
+ROW_TYPES = ("parent", "teacher", "child")
+# SQL Server giới hạn 2100 tham số / câu lệnh
+IN_CHUNK = 1000
+INSERT_CHUNK = 200
+
+USER_FIELDS = (
+    "email", "full_name", "phone", "address", "emergency_contact",
+    "relationship", "experience", "education_level",
+)
+PARENT_FIELDS = ("email", "full_name", "phone", "address", "emergency_contact", "relationship")
+TEACHER_FIELDS = ("email", "full_name", "phone", "address", "experience", "education_level")
+
+
+def parse_roster(filename: str, content: bytes) -> List[dict]:
+    """Đọc file roster (CSV có header hoặc JSON list) thành danh sách dict"""
+    text = content.decode("utf-8-sig")
+    if (filename or "").lower().endswith(".json") or text.lstrip().startswith(("[", "{")):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("rows", [])
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise ValueError("JSON roster must be a list of objects")
+        return data
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _lookup_classes(session: Session, names) -> Dict[str, int]:
+    result = {}
+    for chunk in _chunks(sorted(names), IN_CHUNK):
+        for name, class_id in session.exec(select(ClassRoom.name, ClassRoom.id).where(ClassRoom.name.in_(chunk))):
+            result.setdefault(name, class_id)
+    return result
+
+
+def _lookup_users(session: Session, emails) -> Dict[str, Tuple[int, str]]:
+    result = {}
+    for chunk in _chunks(sorted(emails), IN_CHUNK):
+        for email, user_id, role in session.exec(select(User.email, User.id, User.role).where(User.email.in_(chunk))):
+            result[email] = (user_id, role)
+    return result
+
+
+def _insert_batched(session: Session, table, rows: List[Tuple[int, dict]], errors: List[dict]) -> List[Tuple[int, dict]]:
+    """Insert theo lô nhiều dòng; lô nào lỗi thì thử lại từng dòng để chỉ ra dòng hỏng"""
+    inserted = []
+    for chunk in _chunks(rows, INSERT_CHUNK):
+        try:
+            with session.begin_nested():
+                session.execute(insert(table), [values for _, values in chunk])
+            inserted.extend(chunk)
+            continue
+        except Exception:
+            pass
+        for row_no, values in chunk:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(table), [values])
+                inserted.append((row_no, values))
+            except Exception as e:
+                errors.append({"row": row_no, "error": str(getattr(e, "orig", e)).splitlines()[0]})
+    return inserted
+
+
+def import_roster(session: Session, rows: List[dict]) -> dict:
+    errors: List[dict] = []
+    users: List[Tuple[int, dict]] = []
+    children: List[Tuple[int, dict]] = []
+    passwords: List[str] = []
+    teacher_classes: Dict[str, str] = {}
+
+    # 1. Validate + gom tên lớp / email cần tra cứu
+    class_names, emails = set(), set()
+    seen_emails = set()
+    for row_no, raw in enumerate(rows, start=1):
+        row = {k.strip().lower(): _clean(v) for k, v in raw.items() if k}
+        kind = (row.get("type") or "").lower()
+        if kind not in ROW_TYPES:
+            errors.append({"row": row_no, "error": f"type must be one of {', '.join(ROW_TYPES)}"})
+            continue
+        if kind == "child":
+            missing = [f for f in ("name", "class_name", "parent_email") if not row.get(f)]
+            if missing:
+                errors.append({"row": row_no, "error": f"Missing fields: {', '.join(missing)}"})
+                continue
+            dob = None
+            if row.get("date_of_birth"):
+                try:
+                    dob = dt.strptime(row["date_of_birth"], "%d/%m/%Y")
+                except ValueError:
+                    errors.append({"row": row_no, "error": "Invalid date format. Use DD/MM/YYYY"})
+                    continue
+            children.append((row_no, {
+                "name": row["name"], "date_of_birth": dob,
+                "class_name": row["class_name"], "parent_email": row["parent_email"],
+            }))
+            class_names.add(row["class_name"])
+            emails.add(row["parent_email"])
+            continue
+
+        missing = [f for f in ("email", "full_name", "password") if not row.get(f)]
+        if missing:
+            errors.append({"row": row_no, "error": f"Missing fields: {', '.join(missing)}"})
+            continue
+        if row["email"] in seen_emails:
+            errors.append({"row": row_no, "error": f"Duplicate email '{row['email']}' in file"})
+            continue
+        seen_emails.add(row["email"])
+        fields = PARENT_FIELDS if kind == "parent" else TEACHER_FIELDS
+        # executemany cần cùng bộ cột cho mọi dòng
+        values = {f: row.get(f) if f in fields else None for f in USER_FIELDS}
+        values["role"] = kind
+        users.append((row_no, values))
+        passwords.append(row["password"])
+        emails.add(row["email"])
+        if kind == "teacher" and row.get("class_name"):
+            teacher_classes[row["email"]] = row["class_name"]
+            class_names.add(row["class_name"])
+
+    # 2. Tra cứu lớp + email đã tồn tại trong 1 lượt
+    class_ids = _lookup_classes(session, class_names)
+    existing = _lookup_users(session, emails)
+
+    pending_users, pending_passwords = [], []
+    for (row_no, values), password in zip(users, passwords):
+        if values["email"] in existing:
+            errors.append({"row": row_no, "error": "Email exists"})
+            continue
+        if values["email"] in teacher_classes and teacher_classes[values["email"]] not in class_ids:
+            errors.append({"row": row_no, "error": f"Class '{teacher_classes[values['email']]}' not found"})
+            continue
+        pending_users.append((row_no, values))
+        pending_passwords.append(password)
+
+    # 3. Hash song song trên hash pool, rồi insert theo lô
+    for (_, values), hashed in zip(pending_users, hash_passwords(pending_passwords)):
+        values["hashed_password"] = hashed
+    created_users = _insert_batched(session, User.__table__, pending_users, errors)
+
+    new_emails = {values["email"] for _, values in created_users}
+    existing.update(_lookup_users(session, new_emails))
+
+    assignments = [
+        {"b_class_id": class_ids[teacher_classes[email]], "b_teacher_id": existing[email][0]}
+        for email in new_emails if email in teacher_classes
+    ]
+    if assignments:
+        session.execute(
+            update(ClassRoom.__table__)
+            .where(ClassRoom.__table__.c.id == bindparam("b_class_id"))
+            .values(teacher_id=bindparam("b_teacher_id")),
+            assignments,
+        )
+
+    pending_children = []
+    for row_no, values in children:
+        parent = existing.get(values["parent_email"])
+        if not parent or parent[1] != "parent":
+            errors.append({"row": row_no, "error": f"Parent with email '{values['parent_email']}' not found"})
+            continue
+        if values["class_name"] not in class_ids:
+            errors.append({"row": row_no, "error": f"Class '{values['class_name']}' not found"})
+            continue
+        pending_children.append((row_no, {
+            "name": values["name"],
+            "date_of_birth": values["date_of_birth"],
+            "class_id": class_ids[values["class_name"]],
+            "parent_id": parent[0],
+        }))
+    created_children = _insert_batched(session, Child.__table__, pending_children, errors)
+    resource_versions.bump(session, "children", "classes")
+    session.commit()
+
+    created = {kind: 0 for kind in ROW_TYPES}
+    for _, values in created_users:
+        created[values["role"]] += 1
+    created["child"] = len(created_children)
+    return {
+        "total_rows": len(rows),
+        "created": created,
+        "failed": len(errors),
+        "errors": sorted(errors, key=lambda e: e["row"]),
+    }
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """LRU cache có giới hạn kích thước, mỗi entry hết hạn sau `ttl` giây"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CounterCache:
+    """Một bộ số đếm (dict) dùng chung, hết hạn sau `ttl` giây.
+
+    Các endpoint ghi gọi adjust() để cộng/trừ tại chỗ thay vì đếm lại. Mỗi adjust/invalidate
+    tăng `generation`, nên kết quả đếm bắt đầu trước đó (begin_load) sẽ không được lưu đè.
+    """
+
+    def __init__(self, ttl: float = 15.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.adjustments = 0
+        self.generation = 0
+        self._values: Optional[dict] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[dict]:
+        with self._lock:
+            if self._values is None or self._expires_at <= time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(self._values)
+
+    def begin_load(self) -> int:
+        with self._lock:
+            return self.generation
+
+    def set(self, values: dict, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._values = dict(values)
+            self._expires_at = time.monotonic() + self.ttl
+
+    def adjust(self, **deltas: int):
+        with self._lock:
+            self.generation += 1
+            if self._values is None:
+                return
+            for key, delta in deltas.items():
+                self._values[key] = self._values.get(key, 0) + delta
+            self.adjustments += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._values = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cached": self._values is not None and self._expires_at > time.monotonic(),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "adjustments": self.adjustments,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,175 @@
+"""Lọc / sắp xếp / phân trang danh sách trẻ cho trang quản lý, toàn bộ chạy trong SQL.
+
+Khoảng tuổi được đổi thành khoảng ngày sinh (tính một lần theo ngày hôm nay) nên điều kiện
+lọc dùng được index trên Child.date_of_birth; tuổi trong response chỉ tính cho các dòng của trang.
+Phân trang keyset theo (khóa sắp xếp, id), cursor mã hóa giá trị của dòng cuối trang.
+Sắp theo tuổi đọc thẳng ix_Child_dob (date_of_birth, id): trước hết các trẻ có ngày sinh, hết thì
+nối tiếp các trẻ chưa có ngày sinh (luôn ở cuối, theo id); cursor của đoạn sau mang giá trị null.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, func, or_, select
+from models import Child, ClassRoom, User
+from db_async import AsyncDB
+
+CHILDREN_DEFAULT_LIMIT = 50
+CHILDREN_MAX_LIMIT = 500
+# sort -> (biểu thức, giảm dần?); tuổi tăng dần = ngày sinh giảm dần
+SORT_KEYS = {
+    "name": (Child.name, False),
+    "-name": (Child.name, True),
+    "age": (Child.date_of_birth, True),
+    "-age": (Child.date_of_birth, False),
+    "id": (Child.id, False),
+    "-id": (Child.id, True),
+}
+
+
+def _years_ago(today: datetime, years: int) -> datetime:
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29/2
+        return today.replace(year=today.year - years, day=28)
+
+
+def age_on(dob: Optional[datetime], today: datetime) -> Optional[int]:
+    if dob is None:
+        return None
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+def _encode_cursor(sort: str, value, child_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, child_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        cursor_sort, value, child_id = json.loads(raw)
+        if sort in ("age", "-age") and value is not None:
+            value = datetime.fromisoformat(value)
+        valid = cursor_sort == sort
+    except Exception:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, int(child_id)
+
+
+class ChildListQuery:
+    def __init__(
+        self,
+        class_id: Optional[int] = None,
+        parent_id: Optional[int] = None,
+        name: Optional[str] = Query(None, min_length=1, max_length=255, description="Tiền tố tên"),
+        min_age: Optional[int] = Query(None, ge=0, le=30),
+        max_age: Optional[int] = Query(None, ge=0, le=30),
+        sort: str = Query("name", pattern="^-?(name|age|id)$"),
+        limit: int = Query(CHILDREN_DEFAULT_LIMIT, ge=1, le=CHILDREN_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ):
+        if min_age is not None and max_age is not None and min_age > max_age:
+            raise HTTPException(status_code=400, detail="min_age must not exceed max_age")
+        self.class_id = class_id
+        self.parent_id = parent_id
+        self.name = name
+        self.min_age = min_age
+        self.max_age = max_age
+        self.sort = sort
+        self.limit = limit
+        self.cursor = cursor
+        self.include_total = include_total
+        today = datetime.utcnow()
+        self.today = today.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def filters(self) -> list:
+        conditions = []
+        if self.class_id is not None:
+            conditions.append(Child.class_id == self.class_id)
+        if self.parent_id is not None:
+            conditions.append(Child.parent_id == self.parent_id)
+        if self.name:
+            conditions.append(Child.name.startswith(self.name, autoescape=True))
+        if self.min_age is not None:
+            # tuổi >= n  <=>  sinh trước hoặc đúng ngày này n năm trước
+            conditions.append(Child.date_of_birth < _years_ago(self.today, self.min_age) + timedelta(days=1))
+        if self.max_age is not None:
+            # tuổi <= n  <=>  sinh sau ngày này n + 1 năm trước
+            conditions.append(Child.date_of_birth >= _years_ago(self.today, self.max_age + 1) + timedelta(days=1))
+        return conditions
+
+    def _keyset(self, key, descending: bool, value, child_id: int):
+        if key is Child.id:
+            return Child.id < child_id if descending else Child.id > child_id
+        if descending:
+            return or_(key < value, and_(key == value, Child.id < child_id))
+        return or_(key > value, and_(key == value, Child.id > child_id))
+
+    def _select(self, key, *conditions):
+        return (
+            select(
+                Child.id, Child.name, Child.date_of_birth, Child.class_id,
+                ClassRoom.name.label("class_name"), Child.parent_id,
+                User.full_name.label("parent_name"), User.email.label("parent_email"),
+                User.phone.label("parent_phone"), User.address.label("parent_address"),
+                User.emergency_contact.label("parent_emergency_contact"),
+                key.label("sort_key"),
+            )
+            .join(User, Child.parent_id == User.id, isouter=True)
+            .join(ClassRoom, Child.class_id == ClassRoom.id, isouter=True)
+            .where(*self.filters(), *conditions)
+        )
+
+    @staticmethod
+    def _ordered(stmt, key, descending: bool, limit: int):
+        order = [key.desc(), Child.id.desc()] if descending else [key.asc(), Child.id.asc()]
+        if key is Child.id:
+            order = order[:1]
+        return stmt.order_by(*order).limit(limit)
+
+    async def _rows(self, db: AsyncDB) -> list:
+        key, descending = SORT_KEYS[self.sort]
+        cursor = _decode_cursor(self.cursor, self.sort) if self.cursor else None
+        if key is not Child.date_of_birth:
+            conditions = [self._keyset(key, descending, *cursor)] if cursor else []
+            return await db.dicts(self._ordered(self._select(key, *conditions), key, descending, self.limit + 1))
+        rows = []
+        if cursor is None or cursor[0] is not None:
+            conditions = [key.is_not(None)] + ([self._keyset(key, descending, *cursor)] if cursor else [])
+            rows = await db.dicts(self._ordered(self._select(key, *conditions), key, descending, self.limit + 1))
+        # lọc theo tuổi đã loại trẻ chưa có ngày sinh
+        if len(rows) <= self.limit and self.min_age is None and self.max_age is None:
+            conditions = [key.is_(None)]
+            if cursor is not None and cursor[0] is None:
+                conditions.append(self._keyset(Child.id, descending, None, cursor[1]))
+            rows += await db.dicts(
+                self._ordered(self._select(key, *conditions), Child.id, descending, self.limit + 1 - len(rows)))
+        return rows
+
+    async def page(self, db: AsyncDB) -> dict:
+        rows = await self._rows(db)
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        next_cursor = _encode_cursor(self.sort, rows[-1]["sort_key"], rows[-1]["id"]) if has_more else None
+        items = []
+        for row in rows:
+            dob = row.pop("date_of_birth")
+            del row["sort_key"]
+            items.append({
+                "id": row.pop("id"),
+                "name": row.pop("name"),
+                "date_of_birth": dob.strftime("%d/%m/%Y") if dob else None,
+                "age": age_on(dob, self.today),
+                **row,
+            })
+        result = {"items": items, "next_cursor": next_cursor}
+        if self.include_total:
+            result["total"] = await db.scalar(select(func.count(Child.id)).where(*self.filters()))
+        return result
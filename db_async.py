@@ -0,0 +1,49 @@
+from typing import Any, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+
+class AsyncDB:
+    """Session dùng chung cho handler `async def`.
+
+    Với driver async (SAFENEST_DB_ASYNC=1) bọc AsyncSession, chỉ giữ connection chứ không giữ thread.
+    Ngược lại bọc Session sync và chạy từng truy vấn trong threadpool như handler `def` cũ.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.is_async = isinstance(session, AsyncSession)
+
+    async def run_sync(self, fn: Callable, *args) -> Any:
+        """Chạy fn(sync_session, *args) -- gom nhiều truy vấn vào một lần chuyển ngữ cảnh"""
+        if self.is_async:
+            return await self.session.run_sync(fn, *args)
+        return await run_in_threadpool(fn, self.session, *args)
+
+    async def scalars(self, stmt) -> list:
+        return await self.run_sync(lambda s: s.scalars(stmt).all())
+
+    async def all(self, stmt) -> list:
+        return await self.run_sync(lambda s: s.execute(stmt).all())
+
+    async def dicts(self, stmt) -> list:
+        """Mỗi dòng là dict theo label của cột -- không dựng object ORM"""
+        return await self.run_sync(lambda s: [row._asdict() for row in s.execute(stmt)])
+
+    async def one(self, stmt):
+        return await self.run_sync(lambda s: s.execute(stmt).one())
+
+    async def one_or_none(self, stmt):
+        return await self.run_sync(lambda s: s.execute(stmt).one_or_none())
+
+    async def scalar(self, stmt):
+        return await self.run_sync(lambda s: s.scalar(stmt))
+
+    async def get(self, model, ident):
+        return await self.run_sync(lambda s: s.get(model, ident))
+
+    async def close(self):
+        if self.is_async:
+            await self.session.close()
+        else:
+            await run_in_threadpool(self.session.close)
@@ -0,0 +1,87 @@
+"""ETag / If-None-Match cho các danh sách ít thay đổi, dựa trên bộ đếm version theo tài nguyên.
+
+Handler ghi gọi resource_versions.bump(session, "cameras", ...) ngay trước commit; GET khai báo
+Depends(conditional_get("cameras", "classes")) (sau dependency xác thực) và trả 304 chỉ với
+một truy vấn theo khóa chính vào bảng ResourceVersion, không chạy truy vấn danh sách. Endpoint
+tự trả Response (vd. FastJSONResponse) thì phải tự gắn etag_headers(etag).
+
+Version nằm trong DB nên mọi worker / process cùng thấy: ETag do worker nào tính cũng như nhau
+và một thay đổi ở worker này làm ETag ở mọi worker đổi ngay.
+"""
+import hashlib
+from typing import Dict, Iterable
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import ResourceVersion
+
+_table = ResourceVersion.__table__
+
+
+class ResourceVersions:
+    def __init__(self):
+        self._engine = None
+
+    def bind(self, engine):
+        self._engine = engine
+
+    def bump(self, bind, *resources: str):
+        """+1 cho từng tài nguyên (tạo dòng nếu chưa có) trên Session / Connection đã ghi thay đổi,
+        gọi trước commit: dữ liệu và version cùng commit hoặc cùng rollback"""
+        names = sorted(set(resources))
+        increment = update(_table).values(version=_table.c.version + 1)
+        updated = bind.execute(increment.where(_table.c.resource.in_(names))).rowcount
+        if updated == len(names):
+            return
+        existing = set(bind.execute(select(_table.c.resource).where(_table.c.resource.in_(names))).scalars())
+        missing = [name for name in names if name not in existing]
+        try:
+            with bind.begin_nested():
+                bind.execute(insert(_table), [{"resource": name, "version": 1} for name in missing])
+        except IntegrityError:
+            # worker khác vừa tạo cùng dòng
+            bind.execute(increment.where(_table.c.resource.in_(missing)))
+
+    def read(self, bind, resources: Iterable[str]) -> Dict[str, int]:
+        """bind: Connection / Session (vd. qua AsyncDB.run_sync); tài nguyên chưa bump = 0"""
+        names = list(resources)
+        rows = bind.execute(select(_table.c.resource, _table.c.version).where(_table.c.resource.in_(names)))
+        versions = dict.fromkeys(names, 0)
+        versions.update({resource: version for resource, version in rows})
+        return versions
+
+    def etag(self, resources, scope: str = "") -> str:
+        with self._engine.connect() as conn:
+            versions = self.read(conn, resources)
+        raw = f"{scope}|" + ",".join(f"{r}={versions[r]}" for r in resources)
+        return 'W/"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+
+resource_versions = ResourceVersions()
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    bare = etag[2:]
+    return any(t == etag or t == bare or t[2:] == bare for t in tags)
+
+
+def conditional_get(*resources: str, per_user: bool = False):
+    """per_user: nội dung khác nhau theo người gọi (vd. lớp của giáo viên) -> ETag riêng theo token"""
+    def dependency(request: Request, response: Response) -> str:
+        # tính ETag trước khi đọc DB: ghi xen giữa chỉ làm lần poll sau tải lại, không bao giờ trả dữ liệu cũ
+        scope = request.headers.get("authorization", "") if per_user else ""
+        etag = resource_versions.etag(resources, scope)
+        headers = etag_headers(etag)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return etag
+    return dependency
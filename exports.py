@@ -0,0 +1,162 @@
+"""Export dữ liệu lịch sử (cảnh báo, behavior log, audit log) dạng NDJSON hoặc CSV, stream từng lô.
+
+Mỗi export mở một connection riêng và đọc bằng stream_results + yield_per nên bộ nhớ chỉ giữ
+một lô SAFENEST_EXPORT_CHUNK_ROWS dòng, bất kể khoảng thời gian dài bao nhiêu. include_archived=true
+đọc thêm bảng *Archive (dữ liệu retention.py đã chuyển đi) trước bảng nóng. gzip=true nén ngay khi
+stream và trả file .gz.
+
+    python exports.py alerts 2026-01-01 2026-04-01 > alerts.ndjson
+"""
+import csv
+import io
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, NamedTuple, Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import select
+from models import Child
+from fast_json import dumps
+import retention
+
+EXPORT_CHUNK_ROWS = int(os.getenv("SAFENEST_EXPORT_CHUNK_ROWS", "1000"))
+EXPORT_DEFAULT_DAYS = 30
+_GZIP_LEVEL = 6
+
+
+class Dataset(NamedTuple):
+    policy: retention.Policy
+    child_column: Optional[str]  # None: không lọc được theo trẻ / lớp
+    user_column: Optional[str] = None
+
+
+DATASETS = {
+    "alerts": Dataset(retention.POLICY_BY_NAME["alerts"], "child_id"),
+    "behavior-logs": Dataset(retention.POLICY_BY_NAME["behavior_logs"], "child_id"),
+    "audit-logs": Dataset(retention.POLICY_BY_NAME["audit_logs"], None, "user_id"),
+}
+
+
+class ExportQuery:
+    def __init__(
+        self,
+        start: Optional[datetime] = Query(None, description=f"Mặc định {EXPORT_DEFAULT_DAYS} ngày trước end"),
+        end: Optional[datetime] = Query(None, description="Mặc định là bây giờ (UTC)"),
+        class_id: Optional[int] = None,
+        child_id: Optional[int] = None,
+        user_id: Optional[int] = Query(None, description="Chỉ cho audit-logs"),
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        gzip: bool = False,
+        include_archived: bool = False,
+    ):
+        self.end = end or datetime.utcnow()
+        self.start = start or self.end - timedelta(days=EXPORT_DEFAULT_DAYS)
+        if self.start >= self.end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        self.class_id = class_id
+        self.child_id = child_id
+        self.user_id = user_id
+        self.format = format
+        self.gzip = gzip
+        self.include_archived = include_archived
+
+    def statements(self, dataset: Dataset) -> list:
+        policy = dataset.policy
+        if dataset.child_column is None and (self.class_id is not None or self.child_id is not None):
+            raise HTTPException(status_code=400, detail=f"{policy.name} cannot be filtered by class or child")
+        if dataset.user_column is None and self.user_id is not None:
+            raise HTTPException(status_code=400, detail=f"{policy.name} cannot be filtered by user")
+        # bảng archive trước (dữ liệu cũ hơn) để file ra gần như theo thứ tự thời gian
+        models = [policy.archive, policy.source] if self.include_archived else [policy.source]
+        statements = []
+        for model in models:
+            table = model.__table__
+            columns = [c for c in table.c if c.name != "archived_at"]
+            time_column = table.c[policy.time_column]
+            stmt = select(*columns).where(time_column >= self.start, time_column < self.end)
+            if self.child_id is not None:
+                stmt = stmt.where(table.c[dataset.child_column] == self.child_id)
+            if self.class_id is not None:
+                stmt = stmt.where(table.c[dataset.child_column].in_(
+                    select(Child.id).where(Child.class_id == self.class_id)))
+            if self.user_id is not None:
+                stmt = stmt.where(table.c[dataset.user_column] == self.user_id)
+            statements.append(stmt.order_by(time_column, table.c.id))
+        return statements
+
+    def filename(self, name: str) -> str:
+        stamp = f"{self.start:%Y%m%d}-{self.end:%Y%m%d}"
+        return f"{name}_{stamp}.{self.format}" + (".gz" if self.gzip else "")
+
+    def media_type(self) -> str:
+        if self.gzip:
+            return "application/gzip"
+        return "application/x-ndjson" if self.format == "ndjson" else "text/csv; charset=utf-8"
+
+
+def _rows(engine, statements: list) -> Iterator[tuple]:
+    """(tên cột, lô dòng) -- server-side cursor, mỗi lần fetch EXPORT_CHUNK_ROWS dòng"""
+    with engine.connect() as conn:
+        for stmt in statements:
+            result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(stmt)
+            keys = list(result.keys())
+            for rows in result.partitions():
+                yield keys, rows
+
+
+def _ndjson(chunks) -> Iterator[bytes]:
+    for keys, rows in chunks:
+        yield b"".join(dumps(dict(zip(keys, row))) + b"\n" for row in rows)
+
+
+def _csv(chunks) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for keys, rows in chunks:
+        if not header_written:
+            buffer.write("\ufeff")  # BOM để Excel đọc đúng tiếng Việt
+            writer.writerow(keys)
+            header_written = True
+        writer.writerows(
+            [v.isoformat() if isinstance(v, datetime) else v for v in row] for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(engine, dataset: Dataset, query: ExportQuery) -> Iterator[bytes]:
+    """Generator đồng bộ cho StreamingResponse (Starlette chạy nó trong threadpool)"""
+    chunks = _rows(engine, query.statements(dataset))
+    body = _ndjson(chunks) if query.format == "ndjson" else _csv(chunks)
+    return _gzip(body) if query.gzip else body
+
+
+def main(argv):
+    from apiSQL import engine
+    if len(argv) < 2 or argv[1] not in DATASETS:
+        print(f"usage: python exports.py {{{'|'.join(DATASETS)}}} [start] [end] [--csv] [--archived]")
+        return
+    dates = [datetime.fromisoformat(a) for a in argv[2:] if not a.startswith("--")]
+    query = ExportQuery(
+        start=dates[0] if dates else None, end=dates[1] if len(dates) > 1 else None,
+        class_id=None, child_id=None, user_id=None,
+        format="csv" if "--csv" in argv else "ndjson", gzip=False, include_archived="--archived" in argv,
+    )
+    for chunk in stream(engine, DATASETS[argv[1]], query):
+        sys.stdout.buffer.write(chunk)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
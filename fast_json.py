@@ -0,0 +1,67 @@
+"""JSONResponse serialize bằng orjson (nếu cài) cho các endpoint trả danh sách lớn.
+
+Endpoint trả thẳng FastJSONResponse(rows) nên FastAPI bỏ qua jsonable_encoder và việc validate
+response_model; schema *Row trong models.py chỉ dùng để mô tả OpenAPI qua `responses=doc(...)`.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # chạy được nhưng chậm hơn
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def row_columns(table_model, schema, names: Optional[Iterable[str]] = None) -> list:
+    """Các cột của table_model trùng tên field của schema (hoặc chỉ các field trong names),
+    để select(*cols) khớp đúng schema"""
+    return [getattr(table_model, name) for name in (schema.model_fields if names is None else names)]
+
+
+def parse_fields(fields: Optional[str], schema, default: Iterable[str]) -> List[str]:
+    """Tham số ?fields=a,b,c -> danh sách field (luôn có id). Bỏ trống -> default, "*" -> mọi field của schema"""
+    names = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    if not names:
+        names = list(default)
+    elif names == ["*"]:
+        names = list(schema.model_fields)
+    else:
+        unknown = [f for f in names if f not in schema.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(schema.model_fields)}",
+            )
+    if "id" in schema.model_fields:
+        names.insert(0, "id")
+    return list(dict.fromkeys(names))
+
+
+def doc(model) -> dict:
+    """responses= cho OpenAPI khi endpoint trả FastJSONResponse trực tiếp"""
+    return {200: {"model": model}}
@@ -0,0 +1,157 @@
+"""Metrics dạng Prometheus text (không cần prometheus_client).
+
+Theo route template (vd. /api/parent/alerts/{alert_id}), không theo URL thật, để số series có hạn:
+    http_requests_total{method,route,status}
+    http_request_duration_seconds{method,route}     histogram
+    http_response_size_bytes{method,route}          histogram
+    http_requests_in_flight                         gauge (route chỉ biết sau khi routing)
+cùng gauge / counter của websocket hub (ws_hub.py) và audit writer.
+
+Mọi cập nhật chạy trên thread của event loop (trong ASGI middleware), nên không cần lock:
+mỗi request chỉ là vài phép cộng và một bisect.
+"""
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # ô cuối là +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        out, cumulative = [], 0
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class RouteMetrics:
+    __slots__ = ("statuses", "latency", "size")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+    def record(self, status: int, seconds: float, size: int):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latency.observe(seconds)
+        self.size.observe(size)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+        self.started_at = time.time()
+        self._collectors: List[Tuple[str, str, str, Callable[[], Dict[str, float]]]] = []
+
+    def route(self, method: str, route: str) -> RouteMetrics:
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        return metrics
+
+    def gauge(self, name: str, help: str, collect: Callable[[], Dict[str, float]]):
+        """collect() trả về {chuỗi label: giá trị}, gọi lúc scrape"""
+        self._collectors.append((name, "gauge", help, collect))
+
+    def counter(self, name: str, help: str, collect: Callable[[], Dict[str, float]]):
+        """Như gauge nhưng cho giá trị chỉ tăng (tên kết thúc bằng _total)"""
+        if not name.endswith("_total"):
+            raise ValueError(f"counter name must end with _total: {name}")
+        self._collectors.append((name, "counter", help, collect))
+
+    def render(self) -> str:
+        lines = [
+            "# HELP process_start_time_seconds Start time of the process since unix epoch.",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {self.started_at}",
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+        routes = sorted(self.routes.items())
+        lines += ["# HELP http_requests_total Requests by route template and status.",
+                  "# TYPE http_requests_total counter"]
+        for (method, route), m in routes:
+            for status, n in sorted(m.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {n}')
+        for name, attr, help in (
+            ("http_request_duration_seconds", "latency", "Request latency by route template."),
+            ("http_response_size_bytes", "size", "Response body size by route template."),
+        ):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+            for (method, route), m in routes:
+                lines += getattr(m, attr).lines(name, f'method="{method}",route="{_escape(route)}"')
+        for name, kind, help, collect in self._collectors:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in collect().items():
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware ghi metrics cho mọi request HTTP"""
+
+    def __init__(self, app, registry: Registry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        registry = self.registry
+        registry.in_flight += 1
+        started = time.perf_counter()
+        state = {"status": 500, "size": 0, "done": False}
+
+        def finish():
+            # ghi khi gửi xong body (trước background task), hoặc khi lỗi mà chưa có response
+            state["done"] = True
+            registry.in_flight -= 1
+            route = scope.get("route")
+            registry.route(scope["method"], route.path if route is not None else UNMATCHED_ROUTE).record(
+                state["status"], time.perf_counter() - started, state["size"])
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+                if not message.get("more_body", False) and not state["done"]:
+                    finish()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not state["done"]:
+                finish()
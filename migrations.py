@@ -0,0 +1,230 @@
+"""Migration có đánh số version cho schema (chủ yếu là index cho các truy vấn nóng).
+
+    python migrations.py status    # version hiện tại + migration chưa chạy
+    python migrations.py upgrade   # chạy các migration còn thiếu
+    python migrations.py explain   # index mà mỗi truy vấn của router đang dùng
+"""
+import re
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Index, inspect, select, func
+from sqlmodel import SQLModel
+from models import (
+    Alert, BehaviorLog, Child, Camera, ClassRoom, AuditLog, SchemaMigration,
+    AlertArchive, BehaviorLogArchive, AuditLogArchive, BehaviorHourly, AlertHourly, ResourceVersion
+)
+import rollups
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable
+
+
+def _detach(indexes) -> tuple:
+    """Index(name, table.c.x) tự gắn vào metadata của bảng; gỡ ra để create_all (init_db) không tạo
+    trước -- chỉ migration tạo / xóa index, và SAFENEST_AUTO_MIGRATE=0 thật sự không đụng tới schema"""
+    for index in indexes:
+        index.table.indexes.discard(index)
+    return indexes
+
+
+def _create_indexes(*indexes: Index):
+    _detach(indexes)
+
+    def upgrade(conn):
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+    return upgrade
+
+
+def _drop_indexes(*indexes: Index):
+    _detach(indexes)
+
+    def upgrade(conn):
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+    return upgrade
+
+
+def _create_archive_tables(conn):
+    archives = [AlertArchive.__table__, BehaviorLogArchive.__table__, AuditLogArchive.__table__]
+    SQLModel.metadata.create_all(conn, tables=archives)
+    if conn.dialect.name == "mssql":
+        # bảng archive chỉ ghi 1 lần, đọc hiếm -> nén PAGE
+        for table in archives:
+            conn.exec_driver_sql(f"ALTER TABLE [{table.name}] REBUILD WITH (DATA_COMPRESSION = PAGE)")
+
+
+def _create_rollup_tables(conn):
+    SQLModel.metadata.create_all(conn, tables=[BehaviorHourly.__table__, AlertHourly.__table__])
+    rollups.rebuild(conn)
+
+
+def _steps(*steps):
+    def upgrade(conn):
+        for step in steps:
+            step(conn)
+    return upgrade
+
+
+alert = Alert.__table__
+behavior = BehaviorLog.__table__
+child = Child.__table__
+camera = Camera.__table__
+classroom = ClassRoom.__table__
+audit = AuditLog.__table__
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "hot path indexes", _create_indexes(
+        # feed cảnh báo theo trẻ, mới nhất trước; INCLUDE để không phải lookup bảng (SQL Server)
+        Index("ix_Alert_child_created", alert.c.child_id, alert.c.created_at.desc(), alert.c.id.desc(),
+              mssql_include=["alert_type", "severity", "acknowledged", "camera_id", "danger_zone_id"]),
+        Index("ix_Alert_created", alert.c.created_at, mssql_include=["child_id", "severity"]),
+        Index("ix_BehaviorLog_child_ts", behavior.c.child_id, behavior.c.timestamp,
+              mssql_include=["confidence", "behavior_type", "camera_id"]),
+        Index("ix_BehaviorLog_ts", behavior.c.timestamp, mssql_include=["child_id"]),
+        Index("ix_Child_class", child.c.class_id, mssql_include=["parent_id", "name"]),
+        Index("ix_Child_parent", child.c.parent_id, mssql_include=["class_id", "name"]),
+        Index("ix_Camera_class_active", camera.c.class_id, camera.c.active),
+        Index("ix_ClassRoom_teacher", classroom.c.teacher_id),
+    )),
+    Migration(2, "archive tables for retention", _steps(
+        _create_archive_tables,
+        _create_indexes(Index("ix_AuditLog_created", audit.c.created_at)),
+    )),
+    Migration(3, "hourly behavior/alert rollups", _create_rollup_tables),
+    Migration(4, "admin children list filters", _create_indexes(
+        # keyset theo (khóa sắp xếp, id) + lọc tiền tố tên / khoảng ngày sinh
+        Index("ix_Child_name", child.c.name, child.c.id, mssql_include=["class_id", "parent_id", "date_of_birth"]),
+        Index("ix_Child_dob", child.c.date_of_birth, child.c.id, mssql_include=["class_id", "parent_id", "name"]),
+    )),
+    Migration(5, "alerts by class covering index", _steps(
+        # khóa đủ mọi cột của alerts-by-class -> chỉ quét index (kể cả SQLite, không có INCLUDE);
+        # thay ix_Alert_created (cùng cột đầu) để Alert không phải duy trì hai index theo thời gian
+        _create_indexes(Index("ix_Alert_created_dims", alert.c.created_at, alert.c.child_id,
+                              alert.c.severity, alert.c.alert_type, alert.c.acknowledged)),
+        _drop_indexes(Index("ix_Alert_created", alert.c.created_at)),
+    )),
+    Migration(6, "shared resource versions for ETags",
+              lambda conn: SQLModel.metadata.create_all(conn, tables=[ResourceVersion.__table__])),
+]
+
+# bảng do migration tạo (cùng SchemaMigration do upgrade tạo) -- create_baseline không đụng tới
+MIGRATION_TABLES = {
+    SchemaMigration.__table__, AlertArchive.__table__, BehaviorLogArchive.__table__, AuditLogArchive.__table__,
+    BehaviorHourly.__table__, AlertHourly.__table__, ResourceVersion.__table__,
+}
+
+# Truy vấn đại diện cho các route nóng, dùng cho `explain`
+HOT_QUERIES = {
+    "parent/teacher alerts feed": lambda: select(alert).where(alert.c.child_id.in_([1, 2])).order_by(alert.c.created_at.desc()),
+    "alerts by class window": lambda: select(alert.c.child_id, alert.c.severity, alert.c.alert_type, alert.c.acknowledged).where(
+        alert.c.created_at >= datetime(2000, 1, 1), alert.c.created_at < datetime(2000, 2, 1)),
+    "alerts today": lambda: select(func.count(alert.c.id)).where(alert.c.created_at >= datetime(2000, 1, 1)),
+    "behavior by child since": lambda: select(behavior.c.child_id).where(
+        behavior.c.child_id.in_([1, 2]), behavior.c.timestamp >= datetime(2000, 1, 1)),
+    "children by class": lambda: select(child).where(child.c.class_id.in_([1, 2])),
+    "children by parent": lambda: select(child).where(child.c.parent_id == 1),
+    "children by name prefix": lambda: select(child).where(child.c.name.startswith("Ng")).order_by(child.c.name, child.c.id),
+    "children by age": lambda: select(child.c.id).where(child.c.date_of_birth.is_not(None)).order_by(
+        child.c.date_of_birth.desc(), child.c.id.desc()).limit(50),
+    "children by age range": lambda: select(child).where(
+        child.c.date_of_birth >= datetime(2019, 1, 1), child.c.date_of_birth < datetime(2021, 1, 1)),
+    "active cameras by class": lambda: select(camera).where(camera.c.class_id == 1, camera.c.active == True),
+    "classes by teacher": lambda: select(classroom.c.id).where(classroom.c.teacher_id == 1),
+    "behavior rollup since": lambda: select(BehaviorHourly.__table__.c.child_id).where(
+        BehaviorHourly.__table__.c.child_id.in_([1, 2]), BehaviorHourly.__table__.c.hour_start >= datetime(2000, 1, 1)),
+}
+
+
+def create_baseline(engine):
+    """Bảng gốc có từ trước khi có migration (User, Child, Alert, ...); phần còn lại thuộc về migration"""
+    SQLModel.metadata.create_all(engine, tables=[t for t in SQLModel.metadata.sorted_tables if t not in MIGRATION_TABLES])
+
+
+def current_version(conn) -> int:
+    if not inspect(conn).has_table(SchemaMigration.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+
+def pending(engine) -> List[Migration]:
+    with engine.connect() as conn:
+        version = current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def upgrade(engine) -> List[int]:
+    SQLModel.metadata.create_all(engine, tables=[SchemaMigration.__table__])
+    applied = []
+    for migration in pending(engine):
+        with engine.begin() as conn:
+            if conn.execute(select(SchemaMigration.version).where(SchemaMigration.version == migration.version)).first():
+                continue  # worker khác vừa chạy xong
+            migration.upgrade(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow()))
+        applied.append(migration.version)
+    return applied
+
+
+def _plan_indexes(conn, sql: str) -> List[str]:
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+        return [row[-1] for row in rows]
+    if dialect == "mssql":
+        conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+        try:
+            plan = conn.exec_driver_sql(sql).scalar()
+        finally:
+            conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+        ops = re.findall(r'PhysicalOp="([^"]+)"', plan)
+        indexes = re.findall(r'Index="\[([^\]]+)\]"', plan)
+        return sorted(set(indexes)) + [f"ops: {', '.join(dict.fromkeys(ops))}"]
+    return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}").all()]
+
+
+def explain(engine) -> dict:
+    """Kế hoạch thực thi (index được dùng) cho từng truy vấn nóng"""
+    report = {}
+    with engine.connect() as conn:
+        for name, build in HOT_QUERIES.items():
+            sql = str(build().compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            try:
+                report[name] = _plan_indexes(conn, sql)
+            except Exception as e:
+                report[name] = [f"error: {e}"]
+    return report
+
+
+def status(engine) -> dict:
+    with engine.connect() as conn:
+        version = current_version(conn)
+    return {
+        "version": version,
+        "latest": MIGRATIONS[-1].version if MIGRATIONS else 0,
+        "pending": [f"{m.version}: {m.name}" for m in MIGRATIONS if m.version > version],
+    }
+
+
+def main(argv):
+    from apiSQL import engine
+    command = argv[1] if len(argv) > 1 else "status"
+    if command == "upgrade":
+        create_baseline(engine)
+        print("applied:", upgrade(engine) or "nothing")
+    elif command == "explain":
+        for name, plan in explain(engine).items():
+            print(f"{name}:")
+            for line in plan:
+                print(f"    {line}")
+    else:
+        print(status(engine))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,23 +1,24 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 from sqlmodel import SQLModel, Field
-from pydantic import BaseModel
+from sqlalchemy import Unicode
+from pydantic import BaseModel, Field as PydanticField
 
 # USER & AUTHENTICATION
 class User(SQLModel, table=True):
     __tablename__ = "User"
     id: Optional[int] = Field(default=None, primary_key=True)
-    email: str = Field(unique=True, index=True)
-    full_name: str
-    hashed_password: str
-    role: str  # "admin", "teacher", "parent"
-    phone: Optional[str] = None
-    address: Optional[str] = None
-    emergency_contact: Optional[str] = None
-    experience: Optional[str] = None
-    education_level: Optional[str] = None
-    relationship: Optional[str] = None  # "Mẹ", "Bố"
+    email: str = Field(unique=True, index=True, sa_type=Unicode(255))
+    full_name: str = Field(sa_type=Unicode(255))
+    hashed_password: str = Field(sa_type=Unicode(255))
+    role: str = Field(sa_type=Unicode(50))  # "admin", "teacher", "parent"
+    phone: Optional[str] = Field(default=None, sa_type=Unicode(20))
+    address: Optional[str] = Field(default=None, sa_type=Unicode(500))
+    emergency_contact: Optional[str] = Field(default=None, sa_type=Unicode(255))
+    experience: Optional[str] = Field(default=None, sa_type=Unicode)
+    education_level: Optional[str] = Field(default=None, sa_type=Unicode(255))
+    relationship: Optional[str] = Field(default=None, sa_type=Unicode(50))  # "Mẹ", "Bố"
 
 # Pydantic Models
 class Token(BaseModel):
@@ -66,60 +67,230 @@ class TeacherCreate(BaseModel):
     education_level: Optional[str] = None
     class_id: Optional[int] = None
 
+class BehaviorLogIn(BaseModel):
+    child_id: int
+    camera_id: Optional[int] = None
+    behavior_type: str = PydanticField(min_length=1, max_length=100)
+    confidence: float = PydanticField(ge=0, le=1)
+    timestamp: Optional[datetime] = None
+
+class BehaviorBatchIn(BaseModel):
+    batch_id: Optional[str] = None
+    records: List[BehaviorLogIn]
+
+class AlertIn(BaseModel):
+    child_id: int
+    camera_id: Optional[int] = None
+    danger_zone_id: Optional[int] = None
+    alert_type: str = PydanticField(min_length=1, max_length=100)
+    severity: int = PydanticField(1, ge=1, le=5)
+    created_at: Optional[datetime] = None
+
+# RESPONSE SCHEMAS (mô tả OpenAPI cho các list trả FastJSONResponse, xem fast_json.py)
+class UserRow(BaseModel):
+    id: int
+    email: str
+    full_name: str
+    role: str
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    emergency_contact: Optional[str] = None
+    experience: Optional[str] = None
+    education_level: Optional[str] = None
+    relationship: Optional[str] = None
+
+class ChildRow(BaseModel):
+    id: int
+    name: str
+    date_of_birth: Optional[datetime] = None
+    class_id: Optional[int] = None
+    parent_id: Optional[int] = None
+
+class AdminChildRow(BaseModel):
+    id: int
+    name: str
+    date_of_birth: Optional[str] = None  # DD/MM/YYYY
+    age: Optional[int] = None
+    class_id: Optional[int] = None
+    class_name: Optional[str] = None
+    parent_id: Optional[int] = None
+    parent_name: Optional[str] = None
+    parent_email: Optional[str] = None
+    parent_phone: Optional[str] = None
+    parent_address: Optional[str] = None
+    parent_emergency_contact: Optional[str] = None
+
+class AdminChildPage(BaseModel):
+    items: List[AdminChildRow]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None  # chỉ khi include_total=true
+
+class CameraRow(BaseModel):
+    id: int
+    name: str
+    class_id: Optional[int] = None
+    rtsp_url: Optional[str] = None
+    active: bool
+
+class AdminCameraRow(CameraRow):
+    class_name: Optional[str] = None
+
+class CameraStatus(BaseModel):
+    active_percent: float
+    status: str
+
+class ClassRow(BaseModel):
+    id: int
+    name: str
+    camera_status: CameraStatus
+    total_cameras: int
+    active_cameras: int
+
+class DangerZoneRow(BaseModel):
+    id: int
+    name: str
+    coords_json: str
+    severity: int
+
+class AlertRow(BaseModel):
+    id: int
+    child_id: int
+    camera_id: Optional[int] = None
+    danger_zone_id: Optional[int] = None
+    alert_type: str
+    severity: int
+    acknowledged: bool
+    created_at: datetime
+
+class AlertPage(BaseModel):
+    items: List[AlertRow]
+    next_cursor: Optional[str] = None
+
 # CLASSROOM & CHILDREN
 class ClassRoom(SQLModel, table=True):
+    __tablename__ = "ClassRoom"
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(sa_type=Unicode(255))
     teacher_id: Optional[int] = Field(default=None, foreign_key="User.id")
 
 class Child(SQLModel, table=True):
+    __tablename__ = "Child"
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(sa_type=Unicode(255))
     date_of_birth: Optional[datetime] = Field(default=None)
-    class_id: Optional[int] = Field(default=None, foreign_key="ClassRoom.id")
-    parent_id: Optional[int] = Field(default=None, foreign_key="User.id")
+    class_id: Optional[int] = Field(default=None, foreign_key="ClassRoom.id", ondelete="SET NULL")
+    parent_id: Optional[int] = Field(default=None, foreign_key="User.id", ondelete="SET NULL")
 
 # CAMERAS & DANGER ZONES
 class Camera(SQLModel, table=True):
+    __tablename__ = "Camera"
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    class_id: Optional[int] = Field(default=None, foreign_key="ClassRoom.id")
-    rtsp_url: Optional[str] = None
+    name: str = Field(sa_type=Unicode(255))
+    class_id: Optional[int] = Field(default=None, foreign_key="ClassRoom.id", ondelete="SET NULL")
+    rtsp_url: Optional[str] = Field(default=None, sa_type=Unicode(500))
     active: bool = True
 
 class DangerZone(SQLModel, table=True):
+    __tablename__ = "DangerZone"
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    coords_json: str  # JSON string: "[[x1,y1],[x2,y2],...]"
+    name: str = Field(sa_type=Unicode(255))
+    coords_json: str = Field(sa_type=Unicode)  # JSON string: "[[x1,y1],[x2,y2],...]"
     severity: int = 1  # 1: low, 2: medium, 3: high
 
 # ALERTS & SYSTEM LOGS
 class Alert(SQLModel, table=True):
+    __tablename__ = "Alert"
     id: Optional[int] = Field(default=None, primary_key=True)
-    child_id: int = Field(foreign_key="Child.id")
-    camera_id: Optional[int] = Field(default=None, foreign_key="Camera.id")
-    danger_zone_id: Optional[int] = Field(default=None, foreign_key="DangerZone.id")
-    alert_type: str  # "intrusion", "fall", "running", etc.
+    child_id: int = Field(foreign_key="Child.id", ondelete="CASCADE")
+    camera_id: Optional[int] = Field(default=None, foreign_key="Camera.id", ondelete="SET NULL")
+    danger_zone_id: Optional[int] = Field(default=None, foreign_key="DangerZone.id", ondelete="SET NULL")
+    alert_type: str = Field(sa_type=Unicode(100))  # "intrusion", "fall", "running", etc.
     severity: int = 1
     acknowledged: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class BehaviorLog(SQLModel, table=True):
+    __tablename__ = "BehaviorLog"
     id: Optional[int] = Field(default=None, primary_key=True)
-    child_id: int = Field(foreign_key="Child.id")
-    camera_id: Optional[int] = Field(default=None, foreign_key="Camera.id")
-    behavior_type: str  # "sitting", "standing", "running", etc.
+    child_id: int = Field(foreign_key="Child.id", ondelete="CASCADE")
+    camera_id: Optional[int] = Field(default=None, foreign_key="Camera.id", ondelete="SET NULL")
+    behavior_type: str = Field(sa_type=Unicode(100))  # "sitting", "standing", "running", etc.
     confidence: float
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class FaceRecognitionData(SQLModel, table=True):
+    __tablename__ = "FaceRecognitionData"
     id: Optional[int] = Field(default=None, primary_key=True)
-    child_id: Optional[int] = Field(default=None, foreign_key="Child.id")
-    encoding_path: str  # Đường dẫn file face encoding
+    child_id: Optional[int] = Field(default=None, foreign_key="Child.id", ondelete="SET NULL")
+    encoding_path: str = Field(sa_type=Unicode(500))  # Đường dẫn file face encoding
 
 class AuditLog(SQLModel, table=True):
+    __tablename__ = "AuditLog"
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: Optional[int] = Field(default=None, foreign_key="User.id")
-    action: str  # "login", "register", "delete_account", etc.
-    details: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    user_id: Optional[int] = Field(default=None, foreign_key="User.id", ondelete="SET NULL")
+    action: str = Field(sa_type=Unicode(100))  # "login", "register", "delete_account", etc.
+    details: Optional[str] = Field(default=None, sa_type=Unicode(500))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "SchemaMigration"
+    version: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    name: str = Field(sa_type=Unicode(255))
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+# version theo tài nguyên cho ETag (etags.py), dùng chung giữa các worker
+class ResourceVersion(SQLModel, table=True):
+    __tablename__ = "ResourceVersion"
+    resource: str = Field(primary_key=True, sa_type=Unicode(50))
+    version: int = 0
+
+# ARCHIVE (dữ liệu cũ chuyển khỏi bảng nóng, xem retention.py)
+class AlertArchive(SQLModel, table=True):
+    __tablename__ = "AlertArchive"
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    child_id: int = Field(index=True)
+    camera_id: Optional[int] = None
+    danger_zone_id: Optional[int] = None
+    alert_type: str = Field(sa_type=Unicode(100))
+    severity: int = 1
+    acknowledged: bool = False
+    created_at: datetime = Field(index=True)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BehaviorLogArchive(SQLModel, table=True):
+    __tablename__ = "BehaviorLogArchive"
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    child_id: int = Field(index=True)
+    camera_id: Optional[int] = None
+    behavior_type: str = Field(sa_type=Unicode(100))
+    confidence: float
+    timestamp: datetime = Field(index=True)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AuditLogArchive(SQLModel, table=True):
+    __tablename__ = "AuditLogArchive"
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    user_id: Optional[int] = Field(default=None, index=True)
+    action: str = Field(sa_type=Unicode(100))
+    details: Optional[str] = Field(default=None, sa_type=Unicode(500))
+    created_at: datetime = Field(index=True)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+# ROLLUP theo giờ (xem rollups.py)
+class BehaviorHourly(SQLModel, table=True):
+    __tablename__ = "BehaviorHourly"
+    child_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    hour_start: datetime = Field(primary_key=True)
+    count: int = 0
+    confidence_sum: float = 0
+    confidence_min: Optional[float] = None
+    confidence_max: Optional[float] = None
+
+class AlertHourly(SQLModel, table=True):
+    __tablename__ = "AlertHourly"
+    child_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    hour_start: datetime = Field(primary_key=True)
+    count: int = 0
+    severity_sum: int = 0
+    severity_min: Optional[int] = None
+    severity_max: Optional[int] = None
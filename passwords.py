@@ -0,0 +1,132 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# CONFIGURATION
+BCRYPT_ROUNDS = int(os.getenv("SAFENEST_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("SAFENEST_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_SIZE = int(os.getenv("SAFENEST_HASH_QUEUE_SIZE", "16"))
+HASH_QUEUE_TIMEOUT = float(os.getenv("SAFENEST_HASH_QUEUE_TIMEOUT", "0.05"))
+# bulk import chờ chỗ trong pool tối đa chừng này giây mỗi item rồi báo 503
+HASH_BULK_TIMEOUT = float(os.getenv("SAFENEST_HASH_BULK_TIMEOUT", "30"))
+
+# min/max = rounds để hash cũ (cost khác) bị đánh dấu cần rehash khi login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class HashPool:
+    """Executor riêng cho bcrypt, hàng đợi có giới hạn, từ chối nhanh khi quá tải"""
+
+    def __init__(self, workers: int, queue_size: int, queue_timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.completed = 0
+        self.rejected = 0
+        self._pending = 0
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    def submit(self, fn, *args, timeout: float = 0) -> Future:
+        """Giữ một chỗ trong pool (chờ tối đa timeout giây, 0 = không chờ) rồi đưa fn vào executor"""
+        admitted = self._slots.acquire(timeout=timeout) if timeout > 0 else self._slots.acquire(blocking=False)
+        if not admitted:
+            self._reject()
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._done()
+            raise
+        future.add_done_callback(lambda _f: self._done())
+        return future
+
+    def run(self, fn, *args):
+        """Cho code đồng bộ: chờ chỗ tối đa queue_timeout"""
+        return self.submit(fn, *args, timeout=self.queue_timeout).result()
+
+    async def run_async(self, fn, *args):
+        """Cho handler async: nhận hoặc từ chối ngay, chờ kết quả mà không giữ thread nào"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def map(self, fn, items, timeout: float = HASH_BULK_TIMEOUT):
+        """Chạy fn song song cho nhiều item (bulk import), chỉ chiếm tối đa nửa số worker"""
+        window = threading.Semaphore(max(1, self.workers // 2))
+        futures = []
+        try:
+            for item in items:
+                if not window.acquire(timeout=timeout):
+                    self._reject()
+                try:
+                    future = self.submit(fn, item, timeout=timeout)
+                except BaseException:
+                    window.release()
+                    raise
+                future.add_done_callback(lambda _f: window.release())
+                futures.append(future)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return [f.result() for f in futures]
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+hash_pool = HashPool(HASH_WORKERS, HASH_QUEUE_SIZE, HASH_QUEUE_TIMEOUT)
+
+
+def hash_password(password: str) -> str:
+    return hash_pool.run(pwd_context.hash, password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run_async(pwd_context.hash, password)
+
+
+def hash_passwords(passwords) -> list:
+    return hash_pool.map(pwd_context.hash, passwords)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Trả về (hợp lệ, hash mới nếu cost factor đã thay đổi)"""
+    return await hash_pool.run_async(pwd_context.verify_and_update, plain_password, hashed_password)
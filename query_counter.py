@@ -0,0 +1,150 @@
+"""Đếm số câu SQL của mỗi request (event before_cursor_execute) và so với ngân sách của route.
+
+    @router.get("/classes")
+    @query_budget(3)
+    def admin_get_classes(...): ...
+
+SAFENEST_QUERY_BUDGET_STRICT=1 (bật khi test): request vượt ngân sách -> QueryBudgetExceeded
+(500), để N+1 bị bắt ngay. Mặc định chỉ in cảnh báo. Số câu SQL luôn trả về ở header X-Query-Count.
+Câu SQL của background task chạy sau khi response đã gửi nên không được tính.
+Nếu sql_stats được gắn vào engine, header Server-Timing còn tách thời gian DB / Python.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+
+QUERY_BUDGET_STRICT = os.getenv("SAFENEST_QUERY_BUDGET_STRICT", "0") == "1"
+# ngân sách cho route không khai báo (0 = không giới hạn)
+QUERY_BUDGET_DEFAULT = int(os.getenv("SAFENEST_QUERY_BUDGET_DEFAULT", "0"))
+
+
+class RequestQueries:
+    __slots__ = ("scope", "count", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.count = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> Optional[str]:
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {route.path}" if route is not None else None
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit: int):
+    """Số câu SQL tối đa cho một request tới endpoint (tính cả xác thực)"""
+    def decorate(fn):
+        fn.query_budget = limit
+        return fn
+    return decorate
+
+
+def attach_query_counter(engine):
+    @event.listens_for(getattr(engine, "sync_engine", engine), "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        request = _current.get()
+        if request is not None:
+            request.count += 1
+
+
+def current_request() -> Optional[RequestQueries]:
+    return _current.get()
+
+
+class RouteQueryStats:
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, count: int, budget: Optional[int], elapsed: float = 0.0, db_seconds: float = 0.0):
+        with self._lock:
+            s = self._routes.setdefault(route, {
+                "requests": 0, "queries": 0, "max": 0, "budget": budget, "over_budget": 0,
+                "total_ms": 0.0, "db_ms": 0.0,
+            })
+            s["requests"] += 1
+            s["queries"] += count
+            s["max"] = max(s["max"], count)
+            s["total_ms"] += elapsed * 1000
+            s["db_ms"] += db_seconds * 1000
+            if budget and count > budget:
+                s["over_budget"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    **s,
+                    "total_ms": round(s["total_ms"], 1),
+                    "db_ms": round(s["db_ms"], 1),
+                    "avg": round(s["queries"] / s["requests"], 2),
+                    "avg_ms": round(s["total_ms"] / s["requests"], 2),
+                    "avg_db_ms": round(s["db_ms"] / s["requests"], 2),
+                }
+                for route, s in self._routes.items()
+            }
+        return dict(sorted(routes.items(), key=lambda item: item[1]["max"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteQueryStats()
+
+
+class QueryCountMiddleware:
+    """ASGI middleware: mở bộ đếm cho request, kiểm tra ngân sách khi endpoint bắt đầu trả response"""
+
+    def __init__(self, app, strict: bool = QUERY_BUDGET_STRICT):
+        self.app = app
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = RequestQueries(scope)
+        token = _current.set(request)
+        started = time.perf_counter()
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                self._check(request, elapsed)
+                db_ms = request.db_seconds * 1000
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-query-count", str(request.count).encode()),
+                    (b"server-timing", f"db;dur={db_ms:.1f}, app;dur={elapsed * 1000 - db_ms:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _current.reset(token)
+
+    def _check(self, request: RequestQueries, elapsed: float):
+        name = request.route
+        if name is None:
+            return
+        count = request.count
+        endpoint = request.scope.get("endpoint")
+        budget = getattr(endpoint, "query_budget", None) or QUERY_BUDGET_DEFAULT or None
+        route_stats.record(name, count, budget, elapsed, request.db_seconds)
+        if budget and count > budget:
+            message = f"{name} ran {count} SQL statements (budget {budget})"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            print("Query budget exceeded:", message)
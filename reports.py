@@ -0,0 +1,286 @@
+"""Báo cáo cảnh báo / hành vi theo bucket thời gian (giờ / ngày / tuần), tách theo một chiều.
+
+    GET /api/admin/reports?type=alerts&timeRange=30d&bucket=day&group_by=class
+
+Khoảng dài (>= SAFENEST_REPORT_CUBE_MIN_HOURS) và chiều có sẵn trong rollup (none / class / child)
+đọc bảng *Hourly (rollups.py) cho các giờ đã qua, cộng thêm giờ hiện tại từ bảng gốc; còn lại
+GROUP BY thẳng trên bảng gốc. Kết quả cache theo bộ tham số đã chuẩn hóa trong
+SAFENEST_REPORT_CACHE_TTL giây. Mốc thời gian là UTC.
+
+AlertsByClassQuery (GET /api/admin/alerts-by-class): số cảnh báo theo ClassRoom.id trong một khoảng,
+tách thêm theo severity / alert_type / acknowledged nếu cần, luôn đọc thẳng bảng Alert. Khoảng đã đóng
+(end trong quá khứ) được memo SAFENEST_ALERTS_BY_CLASS_MEMO_TTL giây: đổi lớp / trẻ làm memo mất hiệu
+lực ngay (version trong khóa cache), còn cảnh báo ghi lùi ngày, acknowledge, retention thì hiện ra sau
+tối đa TTL -- không bump version trên đường ghi cảnh báo.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import func, literal, select
+from models import Alert, Child, ClassRoom, Camera, DangerZone
+from cache import TTLCache
+from time_buckets import BUCKETS, floor_datetime
+import rollups
+
+REPORT_CACHE_TTL = float(os.getenv("SAFENEST_REPORT_CACHE_TTL", "60"))
+REPORT_CUBE_MIN_HOURS = int(os.getenv("SAFENEST_REPORT_CUBE_MIN_HOURS", "48"))
+ALERTS_BY_CLASS_MEMO_TTL = float(os.getenv("SAFENEST_ALERTS_BY_CLASS_MEMO_TTL", "60"))
+REPORT_MAX_BUCKETS = 2000
+DEFAULT_TIME_RANGE = "7d"
+OTHER_LABEL = "(other)"
+
+_RANGE = re.compile(r"^(\d+)([hdw])$")
+_RANGE_UNITS = {"h": timedelta(hours=1), "d": timedelta(days=1), "w": timedelta(weeks=1)}
+_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+# chiều có trong rollup theo (trẻ, giờ)
+CUBE_DIMENSIONS = {"none", "class", "child"}
+
+
+class ReportType(NamedTuple):
+    rollup: rollups.Rollup
+    type_column: str
+    dimensions: frozenset
+
+
+REPORT_TYPES = {
+    "alerts": ReportType(rollups.ROLLUPS[1], "alert_type",
+                         frozenset({"none", "class", "child", "camera", "zone", "type"})),
+    "behaviors": ReportType(rollups.ROLLUPS[0], "behavior_type",
+                            frozenset({"none", "class", "child", "camera", "type"})),
+}
+
+report_cache = TTLCache(maxsize=256, ttl=REPORT_CACHE_TTL)
+alerts_by_class_cache = TTLCache(maxsize=512, ttl=ALERTS_BY_CLASS_MEMO_TTL)
+
+
+def resolve_window(time_range: Optional[str], start: Optional[datetime], end: Optional[datetime], now: datetime):
+    """(start, end) từ start/end tường minh hoặc timeRange tính ngược từ end (mặc định bây giờ)"""
+    end = end or now
+    if start is None and time_range is not None:
+        match = _RANGE.match(time_range)
+        if not match:
+            raise HTTPException(status_code=400, detail="timeRange must look like 24h, 7d or 12w")
+        start = end - int(match.group(1)) * _RANGE_UNITS[match.group(2)]
+    if start is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+class ReportQuery:
+    def __init__(
+        self,
+        type: str = Query("alerts", pattern="^(alerts|behaviors)$"),
+        timeRange: Optional[str] = Query(None, description="vd. 24h, 7d, 12w; bỏ qua nếu có start"),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket: Optional[str] = Query(None, pattern="^(hour|day|week)$", description="Mặc định theo độ dài khoảng"),
+        group_by: str = Query("none", pattern="^(none|class|child|camera|zone|type)$"),
+        class_id: Optional[int] = None,
+        top: int = Query(20, ge=1, le=100, description="Số series tối đa, phần còn lại gộp vào (other)"),
+    ):
+        report = REPORT_TYPES[type]
+        if group_by not in report.dimensions:
+            raise HTTPException(status_code=400, detail=f"{type} cannot be grouped by {group_by}")
+        self.relative = start is None
+        self.time_range = timeRange or DEFAULT_TIME_RANGE
+        self._end_param = end
+        now = datetime.utcnow()
+        start, end = resolve_window(self.time_range, start, end, now)
+        hours = (end - start).total_seconds() / 3600
+        self.bucket = bucket or ("hour" if hours <= 48 else "day" if hours <= 24 * 92 else "week")
+        self.start = floor_datetime(start, self.bucket)
+        self.end = end
+        if (end - self.start) / _STEPS[self.bucket] > REPORT_MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"Too many {self.bucket} buckets; use a coarser bucket")
+        self.type = type
+        self.report = report
+        self.group_by = group_by
+        self.class_id = class_id
+        self.top = top
+        self.use_cube = group_by in CUBE_DIMENSIONS and hours >= REPORT_CUBE_MIN_HOURS
+        # giờ hiện tại và giờ lẻ cuối khoảng (end không tròn giờ) không lấy từ rollup -> đọc bảng gốc
+        self.cube_until = floor_datetime(min(now, end), "hour") if self.use_cube else self.start
+
+    def cache_key(self) -> tuple:
+        # khoảng tương đối ("7d" tới bây giờ) dùng chung một entry trong suốt TTL
+        window = (self.time_range, self._end_param) if self.relative else (self.start, self.end)
+        return (self.type, self.bucket, self.group_by, self.class_id, self.top, window)
+
+    def _dimension(self, table):
+        """(khóa, nhãn, [(bảng join, điều kiện)]) của chiều group_by"""
+        if self.group_by == "class":
+            return Child.class_id, ClassRoom.name, [
+                (Child, table.c.child_id == Child.id), (ClassRoom, Child.class_id == ClassRoom.id)]
+        if self.group_by == "child":
+            return table.c.child_id, Child.name, [(Child, table.c.child_id == Child.id)]
+        if self.group_by == "camera":
+            return table.c.camera_id, Camera.name, [(Camera, table.c.camera_id == Camera.id)]
+        if self.group_by == "zone":
+            return table.c.danger_zone_id, DangerZone.name, [(DangerZone, table.c.danger_zone_id == DangerZone.id)]
+        if self.group_by == "type":
+            column = table.c[self.report.type_column]
+            return column, column, []
+        return literal(None), literal("all"), []
+
+    def _aggregate(self, table, time_column, measures, start: datetime, end: datetime):
+        key, label, joins = self._dimension(table)
+        bucket = BUCKETS[self.bucket](time_column)
+        stmt = select(bucket.label("bucket_start"), key.label("series_key"), label.label("series_label"), *measures).select_from(table)
+        for model, condition in joins:
+            stmt = stmt.outerjoin(model, condition)
+        stmt = stmt.where(time_column >= start, time_column < end)
+        if self.class_id is not None:
+            stmt = stmt.where(table.c.child_id.in_(select(Child.id).where(Child.class_id == self.class_id)))
+        group = [bucket] if self.group_by == "none" else [bucket, key, label]
+        return stmt.group_by(*group)
+
+    def statements(self) -> list:
+        rollup = self.report.rollup
+        v = rollup.value_column
+        statements = []
+        if self.use_cube and self.cube_until > self.start:
+            cube = rollup.target.__table__
+            statements.append(self._aggregate(cube, cube.c.hour_start, [
+                func.sum(cube.c["count"]).label("n"),
+                func.sum(cube.c[f"{v}_sum"]).label("value_sum"),
+                func.max(cube.c[f"{v}_max"]).label("value_max"),
+            ], self.start, self.cube_until))
+        raw = rollup.source.__table__
+        value = raw.c[v]
+        statements.append(self._aggregate(raw, raw.c[rollup.time_column], [
+            func.count().label("n"), func.sum(value).label("value_sum"), func.max(value).label("value_max"),
+        ], max(self.start, self.cube_until), self.end))
+        return statements
+
+    def build(self, row_sets: list) -> dict:
+        """Gộp kết quả rollup + bảng gốc, thêm bucket rỗng, giữ top series"""
+        series = {}
+        if self.group_by == "none":
+            series[None] = _series(None, "all")
+        for rows in row_sets:
+            for row in rows:
+                s = series.setdefault(row.series_key, _series(row.series_key, row.series_label))
+                _add(s, row.bucket_start, row.n or 0, row.value_sum or 0, row.value_max)
+        ranked = sorted(series.values(), key=lambda s: s["count"], reverse=True)
+        if len(ranked) > self.top:
+            other = _series(None, OTHER_LABEL)
+            for s in ranked[self.top - 1:]:
+                for t, (count, total, peak) in s["points"].items():
+                    _add(other, t, count, total, peak)
+            ranked = ranked[:self.top - 1] + [other]
+
+        buckets = []
+        t, step = self.start, _STEPS[self.bucket]
+        while t < self.end:
+            buckets.append(t)
+            t += step
+        value_name = self.report.rollup.value_column
+        out = []
+        for s in ranked:
+            points = s["points"]
+            out.append({
+                "key": s["key"],
+                "label": s["label"] if s["label"] is not None else f"(no {self.group_by})",
+                "count": s["count"],
+                "points": [
+                    {"t": b, "count": p[0], f"avg_{value_name}": round(p[1] / p[0], 3) if p[0] else None,
+                     f"max_{value_name}": p[2]}
+                    for b, p in ((b, points.get(b, (0, 0, None))) for b in buckets)
+                ],
+            })
+        total = sum(s["count"] for s in ranked)
+        return {
+            "type": self.type,
+            "start": self.start,
+            "end": self.end,
+            "bucket": self.bucket,
+            "group_by": self.group_by,
+            "source": "rollup+raw" if self.use_cube else "raw",
+            "generated_at": datetime.utcnow(),
+            "total": total,
+            "series": out,
+        }
+
+
+def _series(key, label) -> dict:
+    return {"key": key, "label": label, "count": 0, "points": {}}
+
+
+def _add(series: dict, t: datetime, count: int, total, peak):
+    point = series["points"].setdefault(t, [0, 0, None])
+    point[0] += count
+    point[1] += total
+    if peak is not None:
+        point[2] = peak if point[2] is None else max(point[2], peak)
+    series["count"] += count
+
+
+def run(session, query: ReportQuery) -> dict:
+    """Chạy trong một lần chuyển ngữ cảnh (AsyncDB.run_sync)"""
+    return query.build([session.execute(stmt).all() for stmt in query.statements()])
+
+
+# ALERTS BY CLASS
+ALERTS_BY_CLASS_DIMENSIONS = ("severity", "alert_type", "acknowledged")
+# version trong khóa memo: lớp / trẻ (trẻ đổi lớp)
+ALERTS_BY_CLASS_RESOURCES = ("classes", "children")
+
+
+class AlertsByClassQuery:
+    def __init__(
+        self,
+        timeRange: Optional[str] = Query(None, description="vd. 24h, 7d; bỏ trống cùng start = toàn bộ thời gian"),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        dimensions: Optional[str] = Query(None, description="severity, alert_type, acknowledged (cách nhau bởi dấu phẩy)"),
+    ):
+        now = datetime.utcnow()
+        self.start, self.end = resolve_window(timeRange, start, end, now)
+        names = [d.strip() for d in (dimensions or "").split(",") if d.strip()]
+        unknown = [d for d in names if d not in ALERTS_BY_CLASS_DIMENSIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown dimensions: {', '.join(unknown)}. Allowed: {', '.join(ALERTS_BY_CLASS_DIMENSIONS)}",
+            )
+        self.dimensions = tuple(dict.fromkeys(names))
+        self.closed = end is not None and end <= now
+
+    def cache_key(self, versions: tuple) -> Optional[tuple]:
+        """Chỉ khoảng đã đóng mới memo được; versions theo ALERTS_BY_CLASS_RESOURCES"""
+        if not self.closed:
+            return None
+        return (self.start, self.end, self.dimensions, versions)
+
+    def statement(self):
+        # luôn đọc Alert (ix_Alert_created_dims phủ đủ cột) -> có / không có chiều thêm đều cùng tổng
+        window = [Alert.created_at < self.end]
+        if self.start is not None:
+            window.append(Alert.created_at >= self.start)
+        dims = [getattr(Alert, d) for d in self.dimensions]
+        counts = (
+            select(Child.class_id.label("class_id"), *dims, func.count(Alert.id).label("alert_count"))
+            .select_from(Alert)
+            .join(Child, Alert.child_id == Child.id)
+            .where(*window)
+            .group_by(Child.class_id, *dims)
+            .subquery()
+        )
+        # từ ClassRoom để lớp không có cảnh báo vẫn có mặt (alert_count = 0)
+        return (
+            select(ClassRoom.id.label("class_id"), ClassRoom.name.label("class_name"),
+                   *[counts.c[d] for d in self.dimensions],
+                   func.coalesce(counts.c.alert_count, 0).label("alert_count"))
+            .outerjoin(counts, counts.c.class_id == ClassRoom.id)
+        )
+
+    def build(self, rows) -> list:
+        rows = [row._asdict() for row in rows]
+        rows.sort(key=lambda row: (-row["alert_count"], row["class_name"], row["class_id"]))
+        return rows
+
+
+def alerts_by_class(session, query: AlertsByClassQuery) -> list:
+    return query.build(session.execute(query.statement()).all())
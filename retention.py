@@ -0,0 +1,124 @@
+"""Chuyển dữ liệu cũ của Alert / BehaviorLog / AuditLog sang bảng *Archive theo từng lô nhỏ.
+
+    python retention.py run      # chạy một lượt ngay
+    python retention.py status   # số dòng nóng / đã archive
+
+Mỗi lô là một transaction ngắn (INSERT ... SELECT rồi DELETE theo id) nên không giữ lock lâu.
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy import delete, func, insert, literal, select
+from models import Alert, BehaviorLog, AuditLog, AlertArchive, BehaviorLogArchive, AuditLogArchive
+
+RETENTION_BATCH = int(os.getenv("SAFENEST_RETENTION_BATCH", "1000"))
+RETENTION_PAUSE_MS = int(os.getenv("SAFENEST_RETENTION_PAUSE_MS", "50"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("SAFENEST_RETENTION_INTERVAL_HOURS", "0"))
+
+
+class Policy(NamedTuple):
+    name: str
+    source: type
+    archive: type
+    time_column: str
+    days: int
+
+
+POLICIES = [
+    Policy("alerts", Alert, AlertArchive, "created_at", int(os.getenv("SAFENEST_RETENTION_ALERT_DAYS", "180"))),
+    Policy("behavior_logs", BehaviorLog, BehaviorLogArchive, "timestamp", int(os.getenv("SAFENEST_RETENTION_BEHAVIOR_DAYS", "30"))),
+    Policy("audit_logs", AuditLog, AuditLogArchive, "created_at", int(os.getenv("SAFENEST_RETENTION_AUDIT_DAYS", "365"))),
+]
+POLICY_BY_NAME = {p.name: p for p in POLICIES}
+
+last_run = {}
+_run_lock = threading.Lock()
+
+
+def archive_policy(engine, policy: Policy, now: datetime = None) -> int:
+    if policy.days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=policy.days)
+    src = policy.source.__table__
+    dst = policy.archive.__table__
+    columns = [c.name for c in src.columns]
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(
+                select(src.c.id).where(src.c[policy.time_column] < cutoff).order_by(src.c.id).limit(RETENTION_BATCH)
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(insert(dst).from_select(
+                columns + ["archived_at"],
+                select(*[src.c[c] for c in columns], literal(datetime.utcnow(), dst.c.archived_at.type))
+                .where(src.c.id.in_(ids)),
+            ))
+            conn.execute(delete(src).where(src.c.id.in_(ids)))
+        moved += len(ids)
+        if len(ids) < RETENTION_BATCH:
+            break
+        time.sleep(RETENTION_PAUSE_MS / 1000)
+    return moved
+
+
+def run(engine) -> dict:
+    """Một lượt archive cho mọi policy; bỏ qua nếu đang có lượt khác chạy"""
+    if not _run_lock.acquire(blocking=False):
+        return {"skipped": "already running"}
+    try:
+        started = time.perf_counter()
+        moved = {p.name: archive_policy(engine, p) for p in POLICIES}
+        last_run.update({
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "moved": moved,
+        })
+        return moved
+    finally:
+        _run_lock.release()
+
+
+def status(engine) -> dict:
+    result = {"last_run": last_run or None, "tables": {}}
+    with engine.connect() as conn:
+        for p in POLICIES:
+            result["tables"][p.name] = {
+                "retention_days": p.days,
+                "hot_rows": conn.execute(select(func.count()).select_from(p.source.__table__)).scalar(),
+                "archived_rows": conn.execute(select(func.count()).select_from(p.archive.__table__)).scalar(),
+            }
+    return result
+
+
+def start_scheduler(engine):
+    """Chạy định kỳ mỗi SAFENEST_RETENTION_INTERVAL_HOURS giờ (0 = tắt) trên thread nền"""
+    if RETENTION_INTERVAL_HOURS <= 0:
+        return None
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(RETENTION_INTERVAL_HOURS * 3600):
+            try:
+                run(engine)
+            except Exception as e:
+                print("Retention run failed:", e)
+
+    threading.Thread(target=loop, name="retention", daemon=True).start()
+    return stop
+
+
+def main(argv):
+    from apiSQL import engine
+    if len(argv) > 1 and argv[1] == "run":
+        print(run(engine))
+    else:
+        print(status(engine))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,252 @@
+"""Rollup theo (trẻ, giờ) cho BehaviorLog và Alert: count / sum / min / max.
+
+    python rollups.py refresh [hours]   # tính lại N giờ gần nhất từ bảng gốc
+    python rollups.py rebuild           # tính lại mọi giờ còn đầy đủ dữ liệu gốc
+    python rollups.py status
+
+BehaviorLog (ingest) và Alert (POST /api/ai/alerts) được cộng dồn ngay trong transaction ghi
+(bump_behavior / bump_alerts); các dòng ghi ngoài API được bắt kịp bởi refresh định kỳ. Khóa rollup
+không có lớp: số liệu theo lớp join qua Child.class_id hiện tại, nên trẻ chuyển lớp thì lịch sử
+đi theo trẻ sang lớp mới.
+
+refresh (DELETE + INSERT ... SELECT) và các transaction ghi bảng gốc không được chen nhau: trên
+SQL Server cả hai lấy app lock 'safenest_rollups' (refresh Exclusive, ghi Shared, xem write_guard);
+SQLite vốn chỉ cho một transaction ghi tại một thời điểm.
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from sqlalchemy import bindparam, case, delete, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Alert, BehaviorLog, AlertHourly, BehaviorHourly
+from time_buckets import hour_floor, floor_datetime
+
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("SAFENEST_ROLLUP_INTERVAL_SECONDS", "300"))
+# phải nhỏ hơn số ngày giữ dữ liệu gốc (retention.py), nếu không refresh sẽ xóa mất giờ đã archive
+ROLLUP_LOOKBACK_HOURS = int(os.getenv("SAFENEST_ROLLUP_LOOKBACK_HOURS", "48"))
+IN_CHUNK = 1000
+ROLLUP_LOCK_TIMEOUT_MS = int(os.getenv("SAFENEST_ROLLUP_LOCK_TIMEOUT_MS", "30000"))
+_APPLOCK = text(
+    "SET NOCOUNT ON; DECLARE @rc INT; "
+    "EXEC @rc = sp_getapplock @Resource = 'safenest_rollups', @LockMode = :mode, "
+    "@LockOwner = 'Transaction', @LockTimeout = :timeout; SELECT @rc"
+)
+
+
+class Rollup(NamedTuple):
+    name: str
+    source: type
+    target: type
+    time_column: str
+    value_column: str
+
+
+ROLLUPS = [
+    Rollup("behavior", BehaviorLog, BehaviorHourly, "timestamp", "confidence"),
+    Rollup("alerts", Alert, AlertHourly, "created_at", "severity"),
+]
+
+ROLLUP_BY_NAME = {rollup.name: rollup for rollup in ROLLUPS}
+last_refresh = {}
+
+
+def _lock(bind, mode: str):
+    """App lock theo transaction (chỉ SQL Server); giữ tới commit / rollback"""
+    conn = bind.connection() if isinstance(bind, Session) else bind
+    if conn.dialect.name != "mssql":
+        return
+    rc = conn.execute(_APPLOCK, {"mode": mode, "timeout": ROLLUP_LOCK_TIMEOUT_MS}).scalar()
+    if rc is None or rc < 0:
+        raise RuntimeError(f"Could not acquire rollup lock ({mode}): sp_getapplock returned {rc}")
+
+
+def write_guard(session) -> None:
+    """Gọi đầu transaction, TRƯỚC khi insert vào bảng gốc có rollup (BehaviorLog, Alert)"""
+    _lock(session, "Shared")
+
+
+def _aggregate(rollup: Rollup, since: datetime = None):
+    src = rollup.source.__table__
+    value = src.c[rollup.value_column]
+    bucket = hour_floor(src.c[rollup.time_column])
+    query = (
+        select(src.c.child_id, bucket, func.count(), func.sum(value), func.min(value), func.max(value))
+        .group_by(src.c.child_id, bucket)
+    )
+    if since is not None:
+        query = query.where(src.c[rollup.time_column] >= since)
+    return query
+
+
+def refresh_rollup(conn, rollup: Rollup, since: datetime = None) -> int:
+    """Xóa rồi tính lại các giờ >= since (None = toàn bộ) bằng một INSERT ... SELECT GROUP BY"""
+    _lock(conn, "Exclusive")
+    dst = rollup.target.__table__
+    v = rollup.value_column
+    purge = delete(dst)
+    if since is not None:
+        purge = purge.where(dst.c.hour_start >= since)
+    conn.execute(purge)
+    result = conn.execute(insert(dst).from_select(
+        ["child_id", "hour_start", "count", f"{v}_sum", f"{v}_min", f"{v}_max"],
+        _aggregate(rollup, since),
+    ))
+    return result.rowcount
+
+
+def refresh(engine, hours: int = ROLLUP_LOOKBACK_HOURS) -> dict:
+    since = floor_datetime(datetime.utcnow() - timedelta(hours=hours), "hour")
+    counts = {}
+    for rollup in ROLLUPS:
+        with engine.begin() as conn:
+            counts[rollup.name] = refresh_rollup(conn, rollup, since)
+    last_refresh.update({"finished_at": datetime.utcnow().isoformat(), "since": since.isoformat(), "rows": counts})
+    return counts
+
+
+def rebuild(conn) -> dict:
+    """Tính lại mọi giờ mà bảng gốc còn đủ dữ liệu; giờ cũ hơn (đã archive) giữ nguyên.
+    Rollup còn trống (lần đầu) thì backfill toàn bộ."""
+    counts = {}
+    for rollup in ROLLUPS:
+        src, dst = rollup.source.__table__, rollup.target.__table__
+        since = None
+        if conn.execute(select(func.count()).select_from(dst)).scalar():
+            oldest = conn.execute(select(func.min(src.c[rollup.time_column]))).scalar()
+            if oldest is None:
+                continue
+            since = floor_datetime(oldest, "hour")
+            if since < oldest:
+                since += timedelta(hours=1)
+        counts[rollup.name] = refresh_rollup(conn, rollup, since)
+    return counts
+
+
+def _deltas(rollup: Rollup, rows) -> dict:
+    groups = {}
+    for r in rows:
+        key = (r["child_id"], floor_datetime(r[rollup.time_column], "hour"))
+        v = r[rollup.value_column]
+        g = groups.get(key)
+        if g is None:
+            groups[key] = [1, v, v, v]
+        else:
+            g[0] += 1
+            g[1] += v
+            g[2] = min(g[2], v)
+            g[3] = max(g[3], v)
+    return groups
+
+
+def _existing_keys(session, table, keys) -> set:
+    child_ids = sorted({k[0] for k in keys})
+    hours = [k[1] for k in keys]
+    found = set()
+    for i in range(0, len(child_ids), IN_CHUNK):
+        found.update(tuple(row) for row in session.execute(
+            select(table.c.child_id, table.c.hour_start).where(
+                table.c.child_id.in_(child_ids[i:i + IN_CHUNK]),
+                table.c.hour_start.between(min(hours), max(hours)),
+            )
+        ))
+    return found
+
+
+def bump(session, rollup: Rollup, rows) -> None:
+    """Cộng dồn các dòng vừa insert vào bảng gốc vào rollup (cùng transaction, chưa commit)"""
+    groups = _deltas(rollup, rows)
+    if not groups:
+        return
+    write_guard(session)
+    t = rollup.target.__table__
+    v = rollup.value_column
+    total, low, high = t.c[f"{v}_sum"], t.c[f"{v}_min"], t.c[f"{v}_max"]
+    params = [
+        {"b_child_id": child_id, "b_hour_start": hour, "b_count": g[0], "b_sum": g[1], "b_min": g[2], "b_max": g[3]}
+        for (child_id, hour), g in groups.items()
+    ]
+    stmt = (
+        update(t)
+        .where(t.c.child_id == bindparam("b_child_id"), t.c.hour_start == bindparam("b_hour_start"))
+        .values({
+            t.c.count: t.c.count + bindparam("b_count"),
+            total: total + bindparam("b_sum"),
+            low: case((low <= bindparam("b_min"), low), else_=bindparam("b_min")),
+            high: case((high >= bindparam("b_max"), high), else_=bindparam("b_max")),
+        })
+    )
+    existing = _existing_keys(session, t, groups.keys())
+    updates = [p for p in params if (p["b_child_id"], p["b_hour_start"]) in existing]
+    inserts = [p for p in params if (p["b_child_id"], p["b_hour_start"]) not in existing]
+    if updates:
+        session.execute(stmt, updates)
+    if not inserts:
+        return
+    new_rows = [
+        {"child_id": p["b_child_id"], "hour_start": p["b_hour_start"], "count": p["b_count"],
+         total.name: p["b_sum"], low.name: p["b_min"], high.name: p["b_max"]}
+        for p in inserts
+    ]
+    try:
+        with session.begin_nested():
+            session.execute(insert(t), new_rows)
+    except IntegrityError:
+        # request khác vừa tạo cùng (trẻ, giờ) -> làm từng dòng
+        for p, row in zip(inserts, new_rows):
+            if session.execute(stmt, p).rowcount == 0:
+                session.execute(insert(t), [row])
+
+
+def bump_behavior(session, rows) -> None:
+    bump(session, ROLLUP_BY_NAME["behavior"], rows)
+
+
+def bump_alerts(session, rows) -> None:
+    bump(session, ROLLUP_BY_NAME["alerts"], rows)
+
+
+def status(engine) -> dict:
+    result = {"last_refresh": last_refresh or None, "interval_seconds": ROLLUP_INTERVAL_SECONDS,
+              "lookback_hours": ROLLUP_LOOKBACK_HOURS, "tables": {}}
+    with engine.connect() as conn:
+        for rollup in ROLLUPS:
+            dst = rollup.target.__table__
+            rows, newest = conn.execute(select(func.count(), func.max(dst.c.hour_start))).one()
+            result["tables"][rollup.name] = {"rows": rows, "latest_hour": newest.isoformat() if newest else None}
+    return result
+
+
+def start_scheduler(engine):
+    """Refresh định kỳ mỗi SAFENEST_ROLLUP_INTERVAL_SECONDS giây (0 = tắt) trên thread nền"""
+    if ROLLUP_INTERVAL_SECONDS <= 0:
+        return None
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(ROLLUP_INTERVAL_SECONDS):
+            try:
+                refresh(engine)
+            except Exception as e:
+                print("Rollup refresh failed:", e)  # lượt sau chạy lại
+
+    threading.Thread(target=loop, name="rollups", daemon=True).start()
+    return stop
+
+
+def main(argv):
+    from apiSQL import engine
+    command = argv[1] if len(argv) > 1 else "status"
+    if command == "refresh":
+        print(refresh(engine, int(argv[2]) if len(argv) > 2 else ROLLUP_LOOKBACK_HOURS))
+    elif command == "rebuild":
+        with engine.begin() as conn:
+            print(rebuild(conn))
+    else:
+        print(status(engine))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,176 @@
+"""Thời gian / số dòng của từng câu SQL (gộp theo câu đã chuẩn hóa) và log câu chậm.
+
+Câu SQL được chuẩn hóa: gộp khoảng trắng, danh sách IN (?, ?, ...) và VALUES nhiều dòng,
+nên cùng một truy vấn với số tham số khác nhau chỉ là một dòng thống kê. Tham số chỉ được
+ghi dạng kiểu (shape), không ghi giá trị.
+
+    SAFENEST_SLOW_QUERY_MS=200    # ngưỡng log câu chậm (0 = tắt)
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+from query_counter import current_request
+
+SLOW_QUERY_MS = float(os.getenv("SAFENEST_SLOW_QUERY_MS", "200"))
+# số câu khác nhau tối đa được theo dõi, phần dư gộp vào "(other)"
+SQL_STATS_MAX_STATEMENTS = int(os.getenv("SAFENEST_SQL_STATS_MAX_STATEMENTS", "500"))
+SLOW_QUERY_HISTORY = 100
+MAX_ROUTES_PER_STATEMENT = 20
+
+_WHITESPACE = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+
+
+def normalize(statement: str) -> str:
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _PARAM_LIST.sub("?, ...", sql)
+    return _ROW_LIST.sub(r"\1, ...", sql)
+
+
+def _shape(params) -> str:
+    values = params.values() if isinstance(params, dict) else (params or ())
+    groups = []
+    for v in values:
+        name = type(v).__name__
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return "(" + ", ".join(name if n == 1 else f"{name} x{n}" for name, n in groups) + ")"
+
+
+def param_shape(parameters, executemany: bool) -> str:
+    if executemany:
+        return f"{len(parameters)} rows of {_shape(parameters[0]) if parameters else '()'}"
+    return _shape(parameters)
+
+
+class SQLStats:
+    def __init__(self, max_statements: int = SQL_STATS_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self.started_at = time.time()
+        self._statements = {}
+        self._slow = deque(maxlen=SLOW_QUERY_HISTORY)
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, elapsed: float, route, rows: int = 0) -> dict:
+        with self._lock:
+            entry = self._statements.get(sql)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    sql = "(other)"
+                    entry = self._statements.get(sql)
+                if entry is None:
+                    entry = self._statements[sql] = {
+                        "sql": sql, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "routes": {},
+                    }
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["max_ms"] = max(entry["max_ms"], elapsed * 1000)
+            entry["rows"] += rows
+            route = route or "(no request)"
+            if route in entry["routes"] or len(entry["routes"]) < MAX_ROUTES_PER_STATEMENT:
+                entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            return entry
+
+    def add_rows(self, entry: dict, rows: int):
+        with self._lock:
+            entry["rows"] += rows
+
+    def slow(self, sql: str, shape: str, elapsed: float, route):
+        item = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ms": round(elapsed * 1000, 1),
+            "route": route,
+            "sql": sql,
+            "params": shape,
+        }
+        with self._lock:
+            self._slow.append(item)
+        print(f"Slow query ({item['ms']} ms, {route or 'no request'}): {sql} params={shape}")
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> dict:
+        with self._lock:
+            entries = [
+                {**e, "total_ms": round(e["total_ms"], 1), "max_ms": round(e["max_ms"], 1),
+                 "avg_ms": round(e["total_ms"] / e["calls"], 3), "routes": dict(e["routes"])}
+                for e in self._statements.values()
+            ]
+            slow = list(self._slow)
+        entries.sort(key=lambda e: e[order_by], reverse=True)
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "distinct_statements": len(entries),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "statements": entries[:limit],
+            "recent_slow_queries": slow[::-1],
+        }
+
+
+sql_stats = SQLStats()
+
+
+class _CountingCursor:
+    """Bọc DBAPI cursor của câu SELECT để đếm số dòng thực sự được fetch"""
+
+    def __init__(self, cursor, entry: dict):
+        self._cursor = cursor
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _count(self, rows):
+        if rows:
+            sql_stats.add_rows(self._entry, len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            sql_stats.add_rows(self._entry, 1)
+        return row
+
+    def fetchmany(self, *args):
+        return self._count(self._cursor.fetchmany(*args))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+    def __iter__(self):
+        for row in self._cursor:
+            sql_stats.add_rows(self._entry, 1)
+            yield row
+
+
+def attach_sql_stats(engine):
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        request = current_request()
+        route = request.route if request is not None else None
+        if request is not None:
+            request.db_seconds += elapsed
+        sql = normalize(statement)
+        returns_rows = not executemany and cursor.description is not None
+        entry = sql_stats.record(sql, elapsed, route, rows=0 if returns_rows else max(cursor.rowcount, 0))
+        if returns_rows and context is not None:
+            context.cursor = _CountingCursor(cursor, entry)
+        if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+            sql_stats.slow(sql, param_shape(parameters, executemany), elapsed, route)
+
+    @event.listens_for(target, "handle_error")
+    def _failed(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
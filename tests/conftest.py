@@ -0,0 +1,113 @@
+"""Fixture chung cho test qua HTTP: app chạy trên một file SQLite tạm, bcrypt 4 rounds và
+SAFENEST_QUERY_BUDGET_STRICT=1 (request vượt @query_budget -> QueryBudgetExceeded).
+
+Cấu hình đọc lúc import nên biến môi trường phải đặt trước khi import apiSQL. SAFENEST_DB_ASYNC
+giữ theo môi trường để chạy được cả hai đường (threadpool / aiosqlite).
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="safenest-tests-")
+os.environ["SAFENEST_DB_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.pop("SAFENEST_ASYNC_DB_URL", None)
+os.environ["SAFENEST_QUERY_BUDGET_STRICT"] = "1"
+os.environ["SAFENEST_BCRYPT_ROUNDS"] = "4"
+os.environ["SAFENEST_AUTO_MIGRATE"] = "1"
+os.environ["SAFENEST_ROLLUP_INTERVAL_SECONDS"] = "0"
+os.environ["SAFENEST_RETENTION_INTERVAL_HOURS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    from fastapi.testclient import TestClient
+    import apiSQL
+    with TestClient(apiSQL.app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app_client):
+    """Cache lạnh ở đầu mỗi test -> số câu SQL đo được là trường hợp xấu nhất"""
+    import apiSQL
+    import reports
+    apiSQL.principal_cache.clear()
+    apiSQL.token_cache.clear()
+    apiSQL.dashboard_counters.invalidate()
+    reports.report_cache.clear()
+    reports.alerts_by_class_cache.clear()
+    return app_client
+
+
+@pytest.fixture
+def login(client):
+    def headers(email: str, password: str = PASSWORD) -> dict:
+        response = client.post("/api/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return headers
+
+
+def add_user(session, email: str, role: str, password: str = PASSWORD):
+    from models import User
+    from passwords import pwd_context
+    user = User(email=email, full_name=email.split("@")[0], hashed_password=pwd_context.hash(password), role=role)
+    session.add(user)
+    session.flush()
+    return user
+
+
+@pytest.fixture(scope="session")
+def school(app_client):
+    """Một giáo viên có 2 lớp, 2 phụ huynh; mỗi quan hệ có nhiều dòng (lớp -> camera / trẻ,
+    trẻ -> cảnh báo / hành vi) để N+1 lộ ra thành số câu SQL tăng theo số dòng."""
+    import apiSQL
+    import rollups
+    from sqlmodel import Session
+    from models import Alert, BehaviorLog, Camera, Child, ClassRoom, DangerZone
+
+    now = datetime.utcnow()
+    with Session(apiSQL.engine) as session:
+        admin = add_user(session, "budget-admin@example.com", "admin")
+        teacher = add_user(session, "budget-teacher@example.com", "teacher")
+        parents = [add_user(session, f"budget-parent{i}@example.com", "parent") for i in range(2)]
+        classes = [ClassRoom(name=f"Budget {i}", teacher_id=teacher.id) for i in range(2)]
+        session.add_all(classes)
+        session.flush()
+        cameras, children = [], []
+        for n, classroom in enumerate(classes):
+            cameras += [Camera(name=f"Cam {n}.{i}", class_id=classroom.id, active=i == 0) for i in range(2)]
+            children += [
+                Child(name=f"Kid {n}.{i}", class_id=classroom.id, parent_id=parents[i % 2].id,
+                      date_of_birth=datetime(2019 + i, 1 + n, 1))
+                for i in range(3)
+            ]
+        session.add_all(cameras + children)
+        session.add_all([DangerZone(name=f"Zone {i}", coords_json="[]", severity=1 + i) for i in range(2)])
+        session.flush()
+        alerts = []
+        for i, child in enumerate(children):
+            for hours in range(3):
+                created = now - timedelta(hours=hours, minutes=i)
+                alerts.append(Alert(child_id=child.id, camera_id=cameras[0].id, alert_type="fall",
+                                    severity=1 + hours, created_at=created))
+                session.add(BehaviorLog(child_id=child.id, camera_id=cameras[0].id, behavior_type="sitting",
+                                        confidence=0.5, timestamp=created))
+        session.add_all(alerts)
+        session.commit()
+        ids = {
+            "admin": admin.email,
+            "teacher": teacher.email,
+            "parent": parents[0].email,
+            "child": children[0].id,  # của parents[0], lớp classes[0]
+            "alert": alerts[0].id,  # của children[0]
+        }
+    with apiSQL.engine.begin() as conn:
+        rollups.rebuild(conn)
+    return ids
@@ -0,0 +1,67 @@
+"""Phân trang keyset (created_at, id) của feed cảnh báo: nhiều cảnh báo trùng created_at nằm vắt qua
+ranh giới trang vẫn phải ra đủ, mỗi cảnh báo đúng một lần, theo (created_at, id) giảm dần."""
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session
+
+import apiSQL
+from models import Alert, Child
+from conftest import add_user
+
+# 3 mốc, mỗi mốc nhiều cảnh báo -> với limit 2 / 3 cursor luôn rơi vào giữa một nhóm trùng giờ
+TIMESTAMPS = [datetime(2026, 3, 1, 8, 0)] * 4 + [datetime(2026, 3, 1, 9, 30)] * 3 + [datetime(2026, 3, 2, 7, 15)] * 2
+
+
+@pytest.fixture(scope="module")
+def feed_parent(app_client):
+    with Session(apiSQL.engine) as session:
+        parent = add_user(session, "feed-parent@example.com", "parent")
+        children = [Child(name=f"Feed {i}", parent_id=parent.id) for i in range(2)]
+        session.add_all(children)
+        session.flush()
+        alerts = [
+            Alert(child_id=children[i % 2].id, alert_type="fall" if i % 3 else "run", severity=1 + i % 2, created_at=ts)
+            for i, ts in enumerate(TIMESTAMPS)
+        ]
+        session.add_all(alerts)
+        session.commit()
+        return parent.email, [(a.created_at, a.id, a.alert_type) for a in alerts]
+
+
+def _walk(client, headers, query: str) -> list:
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f"/api/parent/alerts?{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        pages += 1
+        assert pages <= len(TIMESTAMPS) + 1
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4])
+def test_pages_through_duplicate_timestamps(client, login, feed_parent, limit):
+    email, alerts = feed_parent
+    expected = [alert_id for _, alert_id, _ in sorted(alerts, reverse=True)]
+
+    ids = _walk(client, login(email), f"limit={limit}")
+
+    assert ids == expected
+    assert len(set(ids)) == len(TIMESTAMPS)
+
+
+def test_filter_applies_on_every_page(client, login, feed_parent):
+    email, alerts = feed_parent
+    expected = [alert_id for created_at, alert_id, kind in sorted(alerts, reverse=True) if kind == "fall"]
+
+    assert _walk(client, login(email), "limit=2&alert_type=fall") == expected
+
+
+def test_rejects_a_malformed_cursor(client, login, feed_parent):
+    response = client.get("/api/parent/alerts?cursor=not-a-cursor", headers=login(feed_parent[0]))
+    assert response.status_code == 400
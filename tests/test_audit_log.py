@@ -0,0 +1,120 @@
+"""AuditWriter khi DB lỗi: lô thử lại nguyên vẹn với backoff tăng dần (không ghi từng dòng), lỗi dữ liệu
+thì ghi từng dòng trên một connection với savepoint, quá max_attempts thì bỏ lô và đếm `abandoned`."""
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from audit_log import AuditWriter
+from models import AuditLog, User
+
+
+class FailingEngine:
+    """Bọc engine thật: `failures` lần begin() đầu ném OperationalError (DB mất kết nối)"""
+
+    def __init__(self, engine, failures: int = 0):
+        self.engine = engine
+        self.failures = failures
+        self.connections = 0
+
+    def begin(self):
+        self.connections += 1
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("INSERT INTO AuditLog", {}, ConnectionError("database is down"))
+        return self.engine.begin()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    event.listen(engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+    SQLModel.metadata.create_all(engine, tables=[User.__table__, AuditLog.__table__])
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(id=1, email="a@example.com", full_name="A", hashed_password="x", role="admin"))
+    return engine
+
+
+def _writer(engine, **options) -> AuditWriter:
+    writer = AuditWriter(**{"flush_ms": 100, "max_attempts": 3, "max_backoff_ms": 350, **options})
+    writer._engine = engine
+    return writer
+
+
+def _rows(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(AuditLog.__table__)).scalar()
+
+
+def _log(writer, n: int, user_id=1) -> list:
+    for i in range(n):
+        writer.log(user_id, "login", f"event {i}")
+    return writer._take()
+
+
+def test_db_failure_retries_the_whole_batch_with_growing_backoff(engine):
+    stub = FailingEngine(engine, failures=2)
+    writer = _writer(stub, max_attempts=5)
+    batch = _log(writer, 50)
+
+    assert writer._write(batch) is False
+    assert writer._backoff() == pytest.approx(0.2)
+    assert writer._write(writer._take()) is False
+    assert writer._backoff() == pytest.approx(0.35)  # 0.4 bị chặn ở max_backoff
+    # lô được giữ lại nguyên vẹn và thử lại trước sự kiện mới
+    writer.log(1, "later")
+    assert writer._take() is batch
+
+    assert writer._write(batch) is True
+    # mỗi lần thử là một connection cho cả lô, không phải một connection mỗi dòng
+    assert stub.connections == 3
+    assert _rows(engine) == 50
+    stats = writer.stats()
+    assert (stats["written"], stats["failed_batches"], stats["retry_pending"], stats["abandoned"]) == (50, 2, 0, 0)
+    assert writer._backoff() == pytest.approx(0.1)
+
+
+def test_data_error_falls_back_to_row_by_row_savepoints(engine):
+    stub = FailingEngine(engine)
+    writer = _writer(stub)
+    batch = _log(writer, 3) + _log(writer, 1, user_id=999) + _log(writer, 2)  # user 999 không tồn tại
+
+    assert writer._write(batch) is True
+
+    # lô lỗi + một connection cho mọi dòng
+    assert stub.connections == 2
+    assert _rows(engine) == 5
+    stats = writer.stats()
+    assert (stats["written"], stats["rejected"], stats["failed_batches"], stats["retry_pending"]) == (5, 1, 0, 0)
+
+
+def test_batch_is_abandoned_after_max_attempts(engine):
+    stub = FailingEngine(engine, failures=100)
+    writer = _writer(stub, max_attempts=3)
+    batch = _log(writer, 7)
+
+    for attempt in range(3):
+        assert writer._write(writer._take() if attempt else batch) is False
+
+    stats = writer.stats()
+    assert (stats["abandoned"], stats["retry_pending"], stats["failed_batches"]) == (7, 0, 3)
+    assert stub.connections == 3
+    # lô sau bắt đầu lại từ lần thử đầu tiên
+    assert writer._take() == []
+    writer.log(1, "next")
+    assert writer._write(writer._take()) is False
+    assert writer.stats()["abandoned"] == 7
+
+
+def test_stop_does_not_spin_while_the_db_is_down(engine):
+    stub = FailingEngine(engine, failures=1000)
+    writer = AuditWriter(flush_ms=10, max_attempts=1000, max_backoff_ms=60000)
+    writer.log(1, "login")
+    writer.start(stub)
+    assert not writer.flush(timeout=0.3)
+    writer.stop(timeout=5)
+
+    # backoff 20, 40, 80, 160 ms... -> vài lần thử trong 0.3s, không phải hàng chục
+    assert 1 <= stub.connections <= 6
+    assert writer.stats()["running"] is False
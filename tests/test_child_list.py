@@ -0,0 +1,81 @@
+"""Phân trang keyset danh sách trẻ (admin): ngày sinh / tên trùng nhau và trẻ chưa có ngày sinh
+(đoạn NULL luôn ở cuối khi sắp theo tuổi) không được làm mất hay lặp dòng nào giữa các trang."""
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session
+
+import apiSQL
+from models import Child, ClassRoom
+
+DOBS = [datetime(2020, 5, 1)] * 3 + [None] * 3 + [datetime(2018, 1, 9)] * 2 + [datetime(2021, 7, 30)]
+NAMES = ["Minh", "An", "Minh", "Binh", "An", "Minh", "Chi", "An", "Binh"]
+
+
+@pytest.fixture(scope="module")
+def roster(app_client):
+    with Session(apiSQL.engine) as session:
+        classroom = ClassRoom(name="Paging")
+        session.add(classroom)
+        session.flush()
+        children = [Child(name=name, date_of_birth=dob, class_id=classroom.id) for name, dob in zip(NAMES, DOBS)]
+        session.add_all(children)
+        session.commit()
+        return classroom.id, [(c.id, c.name, c.date_of_birth) for c in children]
+
+
+def _expected(children: list, sort: str) -> list:
+    dated = [c for c in children if c[2] is not None]
+    undated = [c for c in children if c[2] is None]
+    order = {
+        # tuổi tăng dần = ngày sinh giảm dần; trẻ chưa có ngày sinh luôn ở cuối, theo id
+        "age": sorted(dated, key=lambda c: (c[2], c[0]), reverse=True) + sorted(undated, reverse=True),
+        "-age": sorted(dated, key=lambda c: (c[2], c[0])) + sorted(undated),
+        "name": sorted(children, key=lambda c: (c[1], c[0])),
+        "-name": sorted(children, key=lambda c: (c[1], c[0]), reverse=True),
+        "id": sorted(children),
+        "-id": sorted(children, reverse=True),
+    }[sort]
+    return [c[0] for c in order]
+
+
+def _walk(client, headers, query: str) -> list:
+    ids, cursor = [], None
+    for _ in range(len(NAMES) + 1):
+        url = f"/api/admin/children?{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+    pytest.fail("paging did not terminate")
+
+
+@pytest.mark.parametrize("sort", ["age", "-age", "name", "-name", "id", "-id"])
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_pages_cover_every_child_once(client, login, school, roster, sort, limit):
+    class_id, children = roster
+
+    ids = _walk(client, login(school["admin"]), f"class_id={class_id}&sort={sort}&limit={limit}")
+
+    assert ids == _expected(children, sort)
+
+
+def test_age_filter_excludes_children_without_birth_date(client, login, school, roster):
+    class_id, children = roster
+    undated = {c[0] for c in children if c[2] is None}
+
+    ids = _walk(client, login(school["admin"]), f"class_id={class_id}&sort=age&limit=2&min_age=0")
+
+    assert ids == [child_id for child_id in _expected(children, "age") if child_id not in undated]
+
+
+def test_cursor_from_another_sort_is_rejected(client, login, school, roster):
+    headers = login(school["admin"])
+    cursor = client.get(f"/api/admin/children?class_id={roster[0]}&sort=name&limit=1", headers=headers).json()["next_cursor"]
+
+    response = client.get(f"/api/admin/children?class_id={roster[0]}&sort=age&cursor={cursor}", headers=headers)
+
+    assert response.status_code == 400
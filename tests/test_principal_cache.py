@@ -0,0 +1,78 @@
+"""Cache principal của get_current_user: request sau dùng User đã cache (không SELECT lại), còn mọi thay
+đổi tới user (hồ sơ, vai trò, mật khẩu, xóa) phải làm cache mất hiệu lực ngay, không đợi TTL."""
+from sqlalchemy import update
+from sqlmodel import Session
+
+import apiSQL
+from models import User
+from conftest import add_user
+
+
+def _new_user(email: str, role: str = "parent") -> int:
+    with Session(apiSQL.engine) as session:
+        user = add_user(session, email, role)
+        session.commit()
+        return user.id
+
+
+def test_cached_principal_skips_the_user_lookup(client, login):
+    user_id = _new_user("cache-hit@example.com")
+    headers = login("cache-hit@example.com")
+
+    cold = client.get("/api/parent/children", headers=headers)
+    warm = client.get("/api/parent/children", headers=headers)
+
+    assert apiSQL.principal_cache.get(user_id) is not None
+    assert int(warm.headers["x-query-count"]) == int(cold.headers["x-query-count"]) - 1
+
+
+def test_profile_update_is_visible_on_the_next_request(client, login, school):
+    _new_user("cache-profile@example.com")
+    headers = login("cache-profile@example.com")
+    assert "cache-profile" in client.get("/api/parent/dashboard", headers=headers).json()["msg"]
+
+    response = client.put("/api/admin/parents/cache-profile@example.com", data={"full_name": "Renamed"},
+                          headers=login(school["admin"]))
+    assert response.status_code == 200, response.text
+
+    assert "Renamed" in client.get("/api/parent/dashboard", headers=headers).json()["msg"]
+
+
+def test_role_change_takes_effect_once_invalidated(client, login):
+    user_id = _new_user("cache-role@example.com")
+    headers = login("cache-role@example.com")
+    assert client.get("/api/parent/children", headers=headers).status_code == 200
+
+    with Session(apiSQL.engine) as session:
+        session.execute(update(User).where(User.id == user_id).values(role="teacher"))
+        session.commit()
+    apiSQL.invalidate_principal(user_id)
+
+    assert client.get("/api/parent/children", headers=headers).status_code == 403
+    assert client.get("/api/teacher/classes", headers=headers).status_code == 200
+
+
+def test_password_reset_drops_the_cached_principal(client, login):
+    user_id = _new_user("cache-reset@example.com")
+    headers = login("cache-reset@example.com")
+    client.get("/api/parent/children", headers=headers)
+    old_hash = apiSQL.principal_cache.get(user_id).hashed_password
+
+    token = client.post("/api/auth/forgot-password", data={"email": "cache-reset@example.com"}).json()["reset_token"]
+    assert client.put("/api/auth/reset-password", json={"token": token, "newPassword": "changed123"}).status_code == 200
+
+    assert apiSQL.principal_cache.get(user_id) is None
+    client.get("/api/parent/children", headers=headers)
+    assert apiSQL.principal_cache.get(user_id).hashed_password != old_hash
+    login("cache-reset@example.com", "changed123")
+
+
+def test_deleted_user_is_rejected_immediately(client, login, school):
+    _new_user("cache-delete@example.com")
+    headers = login("cache-delete@example.com")
+    assert client.get("/api/parent/children", headers=headers).status_code == 200
+
+    response = client.delete("/api/admin/parents/cache-delete@example.com", headers=login(school["admin"]))
+    assert response.status_code == 200, response.text
+
+    assert client.get("/api/parent/children", headers=headers).status_code == 401
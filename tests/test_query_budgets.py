@@ -0,0 +1,58 @@
+"""Mọi route có @query_budget chạy trong SAFENEST_QUERY_BUDGET_STRICT=1 với nhiều dòng cho mỗi quan hệ:
+một N+1 mới làm số câu SQL vượt ngân sách và request ném QueryBudgetExceeded."""
+import pytest
+
+import apiSQL
+import query_counter
+
+# route -> (role trong fixture school, đường dẫn đã điền tham số)
+REQUESTS = {
+    "/api/parent/dashboard": ("parent", "/api/parent/dashboard"),
+    "/api/parent/children": ("parent", "/api/parent/children"),
+    "/api/parent/children/{child_id}": ("parent", "/api/parent/children/{child}"),
+    "/api/parent/alerts": ("parent", "/api/parent/alerts?limit=2"),
+    "/api/parent/alerts/{alert_id}": ("parent", "/api/parent/alerts/{alert}"),
+    "/api/admin/dashboard": ("admin", "/api/admin/dashboard"),
+    "/api/admin/children": ("admin", "/api/admin/children?sort=age&limit=2&include_total=true"),
+    "/api/admin/parents": ("admin", "/api/admin/parents"),
+    "/api/admin/teachers": ("admin", "/api/admin/teachers"),
+    "/api/admin/classes": ("admin", "/api/admin/classes"),
+    "/api/admin/cameras": ("admin", "/api/admin/cameras"),
+    "/api/admin/danger-zones": ("admin", "/api/admin/danger-zones"),
+    "/api/admin/reports": ("admin", "/api/admin/reports?type=alerts&timeRange=30d&group_by=class"),
+    "/api/admin/alerts-by-class": ("admin", "/api/admin/alerts-by-class?timeRange=7d&dimensions=severity"),
+    "/api/admin/alerts": ("admin", "/api/admin/alerts?limit=2"),
+    "/api/teacher/dashboard": ("teacher", "/api/teacher/dashboard"),
+    "/api/teacher/classes": ("teacher", "/api/teacher/classes"),
+    "/api/teacher/children": ("teacher", "/api/teacher/children"),
+    "/api/teacher/children/{child_id}": ("teacher", "/api/teacher/children/{child}"),
+    "/api/teacher/cameras": ("teacher", "/api/teacher/cameras"),
+    "/api/teacher/alerts": ("teacher", "/api/teacher/alerts?limit=2"),
+}
+
+
+def _budgeted_routes() -> dict:
+    routes = {}
+    for route in apiSQL.app.routes:
+        # router được include -> các route gốc nằm trong original_router
+        for r in getattr(getattr(route, "original_router", None), "routes", [route]):
+            budget = getattr(getattr(r, "endpoint", None), "query_budget", None)
+            if budget:
+                routes[r.path] = budget
+    return routes
+
+
+def test_every_budgeted_route_is_exercised():
+    assert query_counter.QUERY_BUDGET_STRICT
+    assert sorted(_budgeted_routes()) == sorted(REQUESTS)
+
+
+@pytest.mark.parametrize("route", sorted(REQUESTS))
+def test_route_stays_within_budget(route, client, login, school):
+    role, path = REQUESTS[route]
+    headers = login(school[role])
+
+    response = client.get(path.format(**school), headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert int(response.headers["x-query-count"]) <= _budgeted_routes()[route]
@@ -0,0 +1,52 @@
+"""reports.ReportQuery: phần đọc từ rollup và phần đọc từ bảng gốc ghép lại phải khớp đếm trực tiếp."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine
+
+import reports
+import rollups
+from models import Alert, Child, ClassRoom
+
+
+def _query(**params) -> reports.ReportQuery:
+    defaults = dict(type="alerts", timeRange=None, start=None, end=None, bucket=None,
+                    group_by="none", class_id=None, top=20)
+    return reports.ReportQuery(**{**defaults, **params})
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        classroom = ClassRoom(name="Class A")
+        session.add(classroom)
+        session.commit()
+        child = Child(name="An", class_id=classroom.id)
+        session.add(child)
+        session.commit()
+        child_id = child.id
+    with engine.begin() as conn:
+        conn.execute(insert(Alert.__table__), [
+            {"child_id": child_id, "alert_type": "fall", "severity": 2, "created_at": datetime(2026, 1, 5, 13, 30)},
+            {"child_id": child_id, "alert_type": "fall", "severity": 3, "created_at": datetime(2026, 1, 5, 14, 15, 9)},
+        ])
+        rollups.rebuild(conn)
+    return engine
+
+
+@pytest.mark.parametrize("end, expected", [
+    (datetime(2026, 1, 5, 14, 15, 4), 1),   # giờ lẻ cuối: alert 14:15:09 nằm sau end
+    (datetime(2026, 1, 5, 14, 15, 10), 2),
+    (datetime(2026, 1, 5, 14, 0), 1),
+    (datetime(2026, 1, 5, 15, 0), 2),
+])
+def test_end_not_on_the_hour_reads_partial_hour_from_raw(engine, end, expected):
+    query = _query(start=datetime(2026, 1, 1), end=end)
+    assert query.use_cube
+    with Session(engine) as session:
+        report = reports.run(session, query)
+    assert report["source"] == "rollup+raw"
+    assert report["total"] == expected
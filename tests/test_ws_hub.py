@@ -0,0 +1,82 @@
+"""Hub websocket với socket giả: subscriber chậm (hàng đợi đầy / gửi quá hạn) bị ngắt với close 1013
+và gỡ khỏi hub, còn người nhận khác vẫn nhận đủ tin."""
+import asyncio
+
+from ws_hub import Hub
+
+
+class FakeSocket:
+    def __init__(self, stall: bool = False, broken: bool = False):
+        self.stall = stall
+        self.broken = broken
+        self.received = []
+        self.close_code = None
+        self.gate = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.broken:
+            raise RuntimeError("socket closed")
+        if self.stall:
+            await self.gate.wait()
+        self.received.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_full_queue_evicts_only_the_slow_subscriber():
+    async def scenario():
+        hub = Hub("test", queue_size=2, send_timeout=5)
+        slow, fast = FakeSocket(stall=True), FakeSocket()
+        await hub.connect(slow, ["class:1"])
+        await hub.connect(fast, ["class:1", "all"])
+
+        for i in range(4):
+            hub.publish(["class:1"], {"n": i})
+            await _settle()
+
+        assert slow.close_code == 1013
+        assert fast.close_code is None
+        assert fast.received == [f'{{"n":{i}}}' for i in range(4)]
+        assert "class:1" in hub.topics and len(hub.topics["class:1"]) == 1
+        assert hub.stats()["evicted"] == 1
+        assert hub.stats()["connections"] == 1
+        await hub.close()
+    asyncio.run(scenario())
+
+
+def test_send_timeout_evicts():
+    async def scenario():
+        hub = Hub("test", queue_size=10, send_timeout=0.05)
+        slow = FakeSocket(stall=True)
+        await hub.connect(slow, ["parent:7"])
+
+        assert hub.publish(["parent:7"], "ping") == 1
+        await asyncio.sleep(0.2)
+
+        assert slow.close_code == 1013
+        assert hub.subscribers == set() and hub.topics == {}
+        assert hub.stats()["evicted"] == 1
+        assert hub.publish(["parent:7"], "ping") == 0
+    asyncio.run(scenario())
+
+
+def test_dead_socket_is_dropped_without_eviction():
+    async def scenario():
+        hub = Hub("test", queue_size=10, send_timeout=5)
+        await hub.connect(FakeSocket(broken=True), ["all"])
+
+        hub.publish(["all"], "ping")
+        await _settle()
+
+        stats = hub.stats()
+        assert (stats["connections"], stats["send_errors"], stats["evicted"]) == (0, 1, 0)
+    asyncio.run(scenario())
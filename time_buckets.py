@@ -0,0 +1,78 @@
+"""Làm tròn datetime xuống đầu giờ / ngày / tuần (thứ Hai) ngay trong SQL, cho từng dialect.
+
+Trên SQLite kết quả có cùng định dạng chuỗi mà SQLAlchemy dùng để lưu DateTime,
+nên so sánh/khóa chính với giá trị Python vẫn khớp.
+"""
+from datetime import timedelta
+from sqlalchemy import func, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import DateTime
+
+
+class _floor(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+
+class hour_floor(_floor):
+    name = "hour_floor"
+    inherit_cache = True
+
+
+class day_floor(_floor):
+    name = "day_floor"
+    inherit_cache = True
+
+
+class week_floor(_floor):
+    name = "week_floor"
+    inherit_cache = True
+
+
+BUCKETS = {"hour": hour_floor, "day": day_floor, "week": week_floor}
+
+_SQLITE = {
+    "hour_floor": ("%Y-%m-%d %H:00:00.000000",),
+    "day_floor": ("%Y-%m-%d 00:00:00.000000",),
+    "week_floor": ("%Y-%m-%d 00:00:00.000000", "weekday 0", "-6 days"),
+}
+# ngày 0 của SQL Server là 1900-01-01 (thứ Hai)
+_MSSQL = {
+    "hour_floor": "DATEADD(hour, DATEDIFF(hour, 0, {}), 0)",
+    "day_floor": "DATEADD(day, DATEDIFF(day, 0, {}), 0)",
+    "week_floor": "DATEADD(day, (DATEDIFF(day, 0, {}) / 7) * 7, 0)",
+}
+_DEFAULT = {
+    "hour_floor": "date_trunc('hour', {})",
+    "day_floor": "date_trunc('day', {})",
+    "week_floor": "date_trunc('week', {})",
+}
+
+
+def _render(templates):
+    def render(element, compiler, **kw):
+        return templates[element.name].format(compiler.process(element.clauses, **kw))
+    return render
+
+
+def _render_sqlite(element, compiler, **kw):
+    fmt, *modifiers = _SQLITE[element.name]
+    args = [literal_column(f"'{fmt}'"), *element.clauses, *[literal_column(f"'{m}'") for m in modifiers]]
+    return compiler.process(func.strftime(*args), **kw)
+
+
+for _cls in BUCKETS.values():
+    compiles(_cls, "sqlite")(_render_sqlite)
+    compiles(_cls, "mssql")(_render(_MSSQL))
+    compiles(_cls)(_render(_DEFAULT))
+
+
+def floor_datetime(value, unit: str):
+    """Bản Python của cùng phép làm tròn"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if unit in ("day", "week"):
+        value = value.replace(hour=0)
+    if unit == "week":
+        value -= timedelta(days=value.weekday())
+    return value
@@ -0,0 +1,164 @@
+"""Pub/sub cho websocket. Mỗi kết nối đăng ký một số topic (parent:<id>, class:<id>, camera:<id>, all)
+và có hàng đợi gửi riêng (SAFENEST_WS_QUEUE_SIZE tin) với một task writer.
+
+publish() không await socket nào: chỉ đặt tin vào hàng đợi của từng subscriber, các writer gửi song song,
+nên một điện thoại mạng chậm không làm trễ cảnh báo của người khác. Subscriber đọc không kịp (hàng đợi
+đầy) hoặc một lần gửi quá SAFENEST_WS_SEND_TIMEOUT giây thì bị ngắt (close 1013) và gỡ khỏi hub; socket
+đã chết cũng được gỡ ngay ở lần gửi lỗi. Mọi thao tác chạy trên event loop: ghi DB trong run_sync rồi
+publish() từ handler async (vd. ai_create_alert), không gọi từ thread khác.
+"""
+import asyncio
+import os
+from typing import Dict, Iterable, Optional, Set
+from fastapi import WebSocket
+from fast_json import dumps
+
+WS_QUEUE_SIZE = int(os.getenv("SAFENEST_WS_QUEUE_SIZE", "100"))
+WS_SEND_TIMEOUT = float(os.getenv("SAFENEST_WS_SEND_TIMEOUT", "5"))
+ALL_TOPIC = "all"
+_CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def parent_topic(user_id: int) -> str:
+    return f"parent:{user_id}"
+
+
+def class_topic(class_id: int) -> str:
+    return f"class:{class_id}"
+
+
+def camera_topic(camera_id: int) -> str:
+    return f"camera:{camera_id}"
+
+
+def alert_topics(parent_id: Optional[int], class_id: Optional[int], camera_id: Optional[int]) -> list:
+    """Ai nhận một cảnh báo: phụ huynh của trẻ, lớp của trẻ, camera phát hiện và admin (all)"""
+    topics = [ALL_TOPIC]
+    if parent_id is not None:
+        topics.append(parent_topic(parent_id))
+    if class_id is not None:
+        topics.append(class_topic(class_id))
+    if camera_id is not None:
+        topics.append(camera_topic(camera_id))
+    return topics
+
+
+class Subscriber:
+    __slots__ = ("ws", "topics", "queue", "task", "sent", "closed")
+
+    def __init__(self, ws: WebSocket, topics: Set[str], maxsize: int):
+        self.ws = ws
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.closed = False
+
+
+class Hub:
+    def __init__(self, name: str, queue_size: int = WS_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT):
+        self.name = name
+        self.queue_size = max(1, queue_size)
+        self.send_timeout = send_timeout
+        self.subscribers: Set[Subscriber] = set()
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.send_errors = 0
+
+    async def connect(self, ws: WebSocket, topics: Iterable[str]) -> Subscriber:
+        await ws.accept()
+        sub = Subscriber(ws, set(topics), self.queue_size)
+        self.subscribers.add(sub)
+        for topic in sub.topics:
+            self.topics.setdefault(topic, set()).add(sub)
+        sub.task = asyncio.create_task(self._writer(sub), name=f"ws-{self.name}-writer")
+        return sub
+
+    def disconnect(self, sub: Subscriber):
+        if sub.closed:
+            return
+        sub.closed = True
+        self.subscribers.discard(sub)
+        for topic in sub.topics:
+            subs = self.topics.get(topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.topics[topic]
+        if sub.task is not None and sub.task is not asyncio.current_task():
+            sub.task.cancel()
+
+    def send(self, sub: Subscriber, message: str) -> bool:
+        """Đặt tin vào hàng đợi của một subscriber; hàng đợi đầy -> ngắt subscriber đó"""
+        if sub.closed:
+            return False
+        try:
+            sub.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._evict(sub, "queue full")
+            return False
+        return True
+
+    def publish(self, topics: Iterable[str], payload) -> int:
+        """Gửi tới mọi subscriber của các topic (mỗi người một lần); trả số hàng đợi đã nhận tin"""
+        message = payload if isinstance(payload, str) else dumps(payload).decode()
+        targets: Set[Subscriber] = set()
+        for topic in topics:
+            targets.update(self.topics.get(topic, ()))
+        self.published += 1
+        return sum(self.send(sub, message) for sub in targets)
+
+    def _evict(self, sub: Subscriber, reason: str):
+        self.evicted += 1
+        print(f"Websocket {self.name}: evicting subscriber ({reason})")
+        self.disconnect(sub)
+        task = asyncio.get_running_loop().create_task(self._close(sub.ws))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, ws: WebSocket):
+        try:
+            await asyncio.wait_for(ws.close(code=_CLOSE_TRY_AGAIN_LATER), self.send_timeout)
+        except Exception:
+            pass  # socket đã hỏng / client đã đi
+
+    async def _writer(self, sub: Subscriber):
+        try:
+            while True:
+                message = await sub.queue.get()
+                await asyncio.wait_for(sub.ws.send_text(message), self.send_timeout)
+                sub.sent += 1
+                self.delivered += 1
+        except asyncio.TimeoutError:
+            self._evict(sub, "send timeout")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.send_errors += 1
+            self.disconnect(sub)
+
+    async def close(self):
+        """Shutdown: ngắt mọi kết nối"""
+        for sub in list(self.subscribers):
+            self.disconnect(sub)
+            await self._close(sub.ws)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.subscribers),
+            "topics": len(self.topics),
+            "queued": sum(sub.queue.qsize() for sub in self.subscribers),
+            "queue_size": self.queue_size,
+            "send_timeout_seconds": self.send_timeout,
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "send_errors": self.send_errors,
+        }
+
+
+alerts_hub = Hub("alerts")
+camera_hub = Hub("camera")